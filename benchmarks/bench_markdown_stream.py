@@ -0,0 +1,67 @@
+"""
+流式 Markdown 渲染基准：整篇重渲染 vs 增量渲染
+用法: python benchmarks/bench_markdown_stream.py [段落数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown2
+
+from core.markdown_stream import IncrementalMarkdown, MARKDOWN_EXTRAS
+
+CHUNK_SIZE = 4  # 接近一个 token 的平均字符数
+
+
+def build_answer(paragraphs):
+    parts = []
+    for i in range(paragraphs):
+        parts.append(f"## 第 {i + 1} 部分\n")
+        parts.append(f"The sentence **number {i}** uses the present perfect tense; "
+                     f"主语是 *I*，谓语是 `have finished`。\n这一行由 break-on-newline 处理。\n")
+        if i % 3 == 0:
+            parts.append("```text\nI have finished my homework.\n```\n")
+    return "\n".join(parts)
+
+
+def run(answer, render_chunk):
+    """返回每个 chunk 的耗时 (秒)"""
+    costs = []
+    for i in range(0, len(answer), CHUNK_SIZE):
+        start = time.perf_counter()
+        render_chunk(answer[i:i + CHUNK_SIZE])
+        costs.append(time.perf_counter() - start)
+    return costs
+
+
+def full_render_chunk():
+    collected = []
+
+    def render_chunk(delta):
+        collected.append(delta)
+        markdown2.markdown("".join(collected), extras=MARKDOWN_EXTRAS)
+    return render_chunk
+
+
+def summarize(name, costs):
+    n = max(len(costs) // 10, 1)
+    head = sum(costs[:n]) / n * 1000
+    tail = sum(costs[-n:]) / n * 1000
+    total = sum(costs) * 1000
+    print(f"{name:<12} chunks={len(costs):<6} 前10%={head:8.3f}ms  后10%={tail:8.3f}ms  "
+          f"增长={tail / head:6.1f}x  总计={total:9.1f}ms")
+
+
+def main():
+    paragraphs = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    answer = build_answer(paragraphs)
+    print(f"答案长度: {len(answer)} 字符, chunk={CHUNK_SIZE} 字符")
+
+    summarize("full", run(answer, full_render_chunk()))
+    summarize("incremental", run(answer, IncrementalMarkdown().feed))
+
+
+if __name__ == "__main__":
+    main()
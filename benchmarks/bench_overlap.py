@@ -0,0 +1,108 @@
+"""
+取词与请求准备并行的基准：假剪贴板 + 模拟前台程序的复制延迟 + 本地假服务 (新连接握手延迟、空闲连接被关闭)
+对比 overlap_setup 关 / 开时从热键到首 token 的时间，并画出一次任务的各阶段时间线。
+
+用法:
+    python benchmarks/bench_overlap.py
+    python benchmarks/bench_overlap.py --copy-latency 0.3 --connect-delay 0.15 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))  # fake_openai_server
+
+from core.ai_client import ClientPool
+from core.capture import TextCapture
+from core.clipboard import FakeClipboard
+from core.config import ConfigManager
+from core.hardware import RecordingBackend
+from core.metrics import MetricsRegistry
+from core.response_cache import InflightRequests
+from core.scheduler import Task
+from core.workflow import Workflow, WorkflowServices
+from fake_openai_server import FakeOpenAIServer
+
+SELECTION = "I has finished my homework yesterday."
+KEEPALIVE = 0.3  # 假服务关闭空闲连接的时间 (真实服务通常是几秒到几十秒)
+WIDTH = 60  # 时间线的字符宽度
+
+
+class SlowCopyApp(RecordingBackend):
+    """模拟前台程序：收到任意按键后过 latency 秒把选中文本写进剪贴板"""
+
+    def __init__(self, clipboard, latency):
+        super().__init__()
+        self.clipboard = clipboard
+        self.latency = latency
+
+    def send(self, inputs, count):
+        super().send(inputs, count)
+        self.clipboard.copy_after(SELECTION, self.latency)
+
+
+def run_once(cfg, services, copy_latency):
+    clipboard = services.clipboard
+    app = SlowCopyApp(clipboard, copy_latency)
+    capture = TextCapture(clipboard, keyboard=app, log=lambda msg: None)
+    task = Task(1, "grammar", time.monotonic())
+    trace = MetricsRegistry().trace(start=task.submitted_at)
+    Workflow(cfg, task, services, trace, capture=capture.capture).run()
+    if trace.outcome != "ok":
+        raise RuntimeError(f"运行失败: {trace.outcome}")
+    stages = dict(trace.stages())
+    return sum(stages.get(stage, 0) for stage in ("queue", "capture", "setup", "ttft")), trace
+
+
+def draw_timeline(trace):
+    rows = trace.timeline()
+    end = max(row[2] for row in rows) or 1e-9
+    for stage, begin, finish in rows:
+        left = int(begin / end * WIDTH)
+        bar = max(1, int(finish / end * WIDTH) - left)
+        print(f"  {stage:<10}{' ' * left}{'█' * bar:<{WIDTH - left}} {begin * 1000:7.1f} → {finish * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copy-latency", type=float, default=0.3, help="前台程序响应复制按键的延迟 (秒)")
+    parser.add_argument("--connect-delay", type=float, default=0.15, help="新连接的握手延迟 (秒)")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(tokens=["## 分析\n\n", "<fixed>I have finished.</fixed>"],
+                              first_token_delay=args.first_token_delay, connect_delay=args.connect_delay,
+                              keepalive_timeout=KEEPALIVE).start()
+    pool = ClientPool(rewarm_after=KEEPALIVE * 0.8)
+    cfg = ConfigManager(os.path.join(tempfile.gettempdir(), "syntaxlens-bench-none.json"))
+    cfg.config.update({"base_url": server.base_url, "api_key": "sk-bench", "model": "fake-model",
+                       "cache_enabled": False, "hedge_enabled": False, "stream_fps": 0})
+    services = WorkflowServices(FakeClipboard(""), pool, InflightRequests())
+    pool.warm_up(server.base_url, "sk-bench")  # 与应用一致：启动时预热过
+
+    print(f"复制延迟 {args.copy_latency * 1000:.0f}ms，握手延迟 {args.connect_delay * 1000:.0f}ms，"
+          f"首 token {args.first_token_delay * 1000:.0f}ms；每次任务前连接都已空闲断开")
+    try:
+        for overlap in (False, True):
+            cfg.config["overlap_setup"] = overlap
+            results = []
+            for _ in range(args.repeat):
+                time.sleep(KEEPALIVE * 1.5)  # 让服务端关闭空闲连接
+                results.append(run_once(cfg, services, args.copy_latency))
+            ttft = [seconds for seconds, _ in results]
+            print(f"\noverlap_setup={overlap}: 热键 -> 首 token 中位数 {statistics.median(ttft) * 1000:.1f}ms "
+                  f"(最小 {min(ttft) * 1000:.1f} / 最大 {max(ttft) * 1000:.1f})")
+            draw_timeline(results[-1][1])
+    finally:
+        pool.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+端到端流式管线基准：本地假 SSE 服务 -> core.workflow.Workflow (与 WorkflowThread.run 同一套逻辑) -> 渲染
+统计端到端延迟、首 token / 首帧、每帧渲染耗时、峰值内存和信号数量，结果写入 benchmarks/results/ 方便对比。
+
+用法:
+    python benchmarks/bench_pipeline.py                                  # short / medium / long 三种回答
+    python benchmarks/bench_pipeline.py --token-rate 50 --chunk-size 2 --first-token-delay 0.8
+    python benchmarks/bench_pipeline.py --popup                          # 同时把每帧应用到弹窗 (需要 PyQt6)
+    python benchmarks/bench_pipeline.py --record rec.jsonl               # 用 config.json 里的真实服务录制一次回答
+    python benchmarks/bench_pipeline.py --replay rec.jsonl               # 按录制的节奏回放
+    python benchmarks/bench_pipeline.py --compare benchmarks/results/xxx.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))  # fake_openai_server
+
+from benchmarks.bench_markdown_stream import build_answer
+from core.ai_client import ClientPool, build_messages, stream_chat
+from core.clipboard import FakeClipboard
+from core.config import ConfigManager
+from core.markdown_stream import IncrementalMarkdown  # noqa: F401  与应用的 preload_heavy_libs 一样提前导入
+from core.metrics import MetricsRegistry
+from core.response_cache import InflightRequests
+from core.scheduler import Task
+from core.workflow import Workflow, WorkflowServices
+from fake_openai_server import FakeOpenAIServer, load_recording, save_recording
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+SCENARIOS = {"short": 60, "medium": 600, "long": 6000}  # 回答的 token 数
+TOKEN_CHARS = 4  # 接近一个 token 的平均字符数
+SELECTION = "I has finished my homework yesterday."
+
+
+def synthetic_tokens(count):
+    answer = build_answer(count * TOKEN_CHARS // 150 + 1)
+    while len(answer) < count * TOKEN_CHARS:
+        answer += "\n" + answer
+    answer = answer[:count * TOKEN_CHARS] + "\n\n<fixed>I have finished my homework.</fixed>\n"
+    return [answer[i:i + TOKEN_CHARS] for i in range(0, len(answer), TOKEN_CHARS)]
+
+
+def make_popup_sink():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from ui.popup import PopupResult
+
+    app = QApplication.instance() or QApplication([])
+    popup = PopupResult()
+    popup.show_loading()
+    return app, popup
+
+
+def percentile_ms(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000, 3)
+
+
+def run_once(cfg, services, name, use_popup):
+    frames = []  # 每帧 on_stream 结束的时刻
+    gui_costs = []
+    logs = []
+    popup = None
+    if use_popup:
+        _, popup = make_popup_sink()
+
+    def on_stream(frozen_html, tail_html):
+        if popup is not None:
+            start = time.perf_counter()
+            popup.append_stream(frozen_html, tail_html)
+            gui_costs.append(time.perf_counter() - start)
+        frames.append(time.monotonic())
+
+    metrics = MetricsRegistry()
+    task = Task(1, "grammar", time.monotonic())
+    trace = metrics.trace(start=task.submitted_at, task=name)
+    workflow = Workflow(cfg, task, services, trace, on_stream=on_stream, on_log=logs.append,
+                        on_error=logs.append, capture=lambda: SELECTION)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    workflow.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    if trace.outcome != "ok" or not frames:
+        raise RuntimeError(f"{name}: 运行失败 {logs[-1:]}")
+
+    stages = dict(trace.stages())
+    render = workflow.render_seconds
+    return {
+        "e2e_ms": round((frames[-1] - task.submitted_at) * 1000, 3),
+        "ttft_ms": round((stages.get("setup", 0) + stages.get("ttft", 0)) * 1000, 3),
+        "first_frame_ms": round((frames[0] - task.submitted_at) * 1000, 3),
+        "render_total_ms": round(sum(render) * 1000, 3),
+        "render_per_chunk_ms": round(sum(render) / max(workflow.chunks_received, 1) * 1000, 4),
+        "render_frame_p95_ms": percentile_ms(render, 0.95),
+        "render_frame_max_ms": percentile_ms(render, 1.0),
+        "gui_frame_p95_ms": percentile_ms(gui_costs, 0.95),
+        "gui_frame_max_ms": percentile_ms(gui_costs, 1.0),
+        "peak_memory_kb": round(peak / 1024, 1),
+        "chunks": workflow.chunks_received,
+        "signals": len(frames),
+        "log_signals": len(logs),
+        "answer_chars": len(workflow.text),
+    }
+
+
+def run_scenario(name, tokens, args):
+    cfg = ConfigManager(os.path.join(tempfile.gettempdir(), "syntaxlens-bench-none.json"))
+    server = FakeOpenAIServer(tokens=tokens, first_token_delay=args.first_token_delay,
+                              token_rate=args.token_rate, chunk_size=args.chunk_size).start()
+    pool = ClientPool()
+    try:
+        cfg.config.update({"base_url": server.base_url, "api_key": "sk-bench", "model": "fake-model",
+                           "cache_enabled": False, "hedge_enabled": False, "auto_copy_grammar": True,
+                           "stream_fps": args.fps})
+        services = WorkflowServices(FakeClipboard(""), pool, InflightRequests())
+        pool.warm_up(server.base_url, "sk-bench")  # 与应用一致：连接已预热
+
+        runs = [run_once(cfg, services, name, args.popup) for _ in range(args.repeat)]
+    finally:
+        pool.close()
+        server.stop()
+
+    # 多次运行取中位数
+    result = {key: statistics.median(r[key] for r in runs) if runs[0][key] is not None else None
+              for key in runs[0]}
+    result["runs"] = len(runs)
+    return result
+
+
+def record(path):
+    """用 config.json 里的服务真实请求一次，按相对时间保存每个增量"""
+    cfg = ConfigManager()
+    pool = ClientPool()
+    client = pool.get(cfg.get("base_url"), cfg.get("api_key"))
+    events = []
+    start = time.monotonic()
+    for content in stream_chat(client, cfg.get("model"), build_messages(cfg.get("prompt_grammar"), SELECTION)):
+        events.append((time.monotonic() - start, content))
+    save_recording(path, events)
+    pool.close()
+    print(f"已录制 {len(events)} 个增量 -> {path}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def latest_result(exclude=None):
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, "pipeline-*.json")) if p != exclude)
+    return paths[-1] if paths else None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n对比 {os.path.basename(baseline_path)} (rev {baseline.get('revision')}):")
+    for name, result in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ("e2e_ms", "render_per_chunk_ms", "peak_memory_kb", "signals"):
+            if result.get(key) is not None and old.get(key):
+                deltas.append(f"{key} {(result[key] - old[key]) / old[key] * 100:+.1f}%")
+        print(f"  {name:<8} " + "  ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔: short,medium,long")
+    parser.add_argument("--token-rate", type=float, default=1000.0, help="每秒 token 数")
+    parser.add_argument("--chunk-size", type=int, default=1, help="每个 SSE 事件的 token 数")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="首 token 延迟 (秒)")
+    parser.add_argument("--fps", type=int, default=30, help="stream_fps 配置")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--popup", action="store_true", help="同时测量弹窗 (QTextDocument) 的每帧耗时")
+    parser.add_argument("--replay", help="回放录制的流 (JSONL)，作为 replay 场景")
+    parser.add_argument("--record", help="向 config.json 配置的服务请求一次并录制到该文件后退出")
+    parser.add_argument("--compare", help="与指定的结果文件对比，默认对比 results 目录里最近一次")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return
+
+    scenarios = {}
+    for name in filter(None, args.scenarios.split(",")):
+        scenarios[name] = synthetic_tokens(SCENARIOS[name])
+    if args.replay:
+        scenarios["replay"] = load_recording(args.replay)
+
+    current = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"token_rate": args.token_rate, "chunk_size": args.chunk_size,
+                   "first_token_delay": args.first_token_delay, "fps": args.fps, "popup": args.popup},
+        "scenarios": {},
+    }
+    header = f"{'场景':<8}{'chunks':>7}{'信号':>6}{'端到端ms':>11}{'首token ms':>11}{'渲染/chunk ms':>14}" \
+             f"{'帧p95 ms':>10}{'峰值KB':>10}"
+    print(header)
+    for name, tokens in scenarios.items():
+        result = run_scenario(name, tokens, args)
+        current["scenarios"][name] = result
+        print(f"{name:<8}{result['chunks']:>7}{result['signals']:>6}{result['e2e_ms']:>11.1f}"
+              f"{result['ttft_ms']:>11.1f}{result['render_per_chunk_ms']:>14.4f}"
+              f"{result['render_frame_p95_ms']:>10.3f}{result['peak_memory_kb']:>10.1f}")
+
+    saved = None
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        saved = os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(saved, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {saved}")
+
+    baseline = args.compare or latest_result(exclude=saved)
+    if baseline:
+        compare(current, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+相似选区索引基准：不同条目数下的插入 / 命中查询 / 未命中查询耗时，以及和线性扫描的对比
+用法:
+    python benchmarks/bench_similar_cache.py
+    python benchmarks/bench_similar_cache.py --max-entries 10000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.similar_cache import SimilarIndex, shingles, signature, similarity, similarity_scope
+
+SCOPE = similarity_scope("deepseek-chat", "https://api.deepseek.com", "prompt")
+QUERIES = 1000
+
+
+def build_corpus(count, rng):
+    # 合成词表，句长接近日常选中的一两句话
+    vocab = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(8000)]
+    return [" ".join(rng.choice(vocab) for _ in range(rng.randint(8, 30))) + "." for _ in range(count)], vocab
+
+
+def near_duplicate(text, rng):
+    """模拟 Home / Shift+End 多带的标点、换行或一两个词"""
+    variant = rng.randrange(3)
+    if variant == 0:
+        return text.rstrip(".") + "!\n"
+    if variant == 1:
+        return text.replace(" ", "\n", 1)
+    return text + " " + text.split()[0]
+
+
+def per_call_ms(fn, items):
+    start = time.perf_counter()
+    results = [fn(item) for item in items]
+    return (time.perf_counter() - start) / len(items) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-entries", type=int, default=50000, help="最大条目数 (依次测 1000 / 1 万 / 5 万 / 10 万中不超过它的)")
+    args = parser.parse_args()
+    max_entries = args.max_entries
+    rng = random.Random(42)
+    corpus, vocab = build_corpus(max_entries, rng)
+    print(f"签名长度 64 / 16 带，查询 {QUERIES} 次")
+    print(f"{'条目数':>8}{'插入':>10}{'命中查询':>12}{'未命中查询':>12}{'命中率':>8}{'线性扫描':>12}")
+
+    sizes = [n for n in (1000, 10000, 50000, 100000) if n <= max_entries] or [max_entries]
+    for size in sizes:
+        texts = corpus[:size]
+        index = SimilarIndex(":memory:", max_entries=size)
+        insert_ms, _ = per_call_ms(lambda item: index.add(SCOPE, item[1], f"k{item[0]}"), list(enumerate(texts)))
+
+        hits = [near_duplicate(rng.choice(texts), rng) for _ in range(QUERIES)]
+        misses = [" ".join(rng.choice(vocab) for _ in range(rng.randint(8, 30))) for _ in range(QUERIES)]
+        hit_ms, found = per_call_ms(lambda text: index.lookup(SCOPE, text), hits)
+        miss_ms, _ = per_call_ms(lambda text: index.lookup(SCOPE, text), misses)
+        recall = sum(f is not None for f in found) / len(found)
+
+        # 对照：不分桶，逐条比较签名
+        signatures = list(index._entries.values())
+
+        def scan(text):
+            query = signature(shingles(text))
+            return max(similarity(query, sig) for _, _, sig in signatures)
+
+        scan_ms, _ = per_call_ms(scan, hits[:20])
+        print(f"{size:>8}{insert_ms:>9.3f}ms{hit_ms:>10.3f}ms{miss_ms:>10.3f}ms{recall:>8.1%}{scan_ms:>10.1f}ms")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
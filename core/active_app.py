@@ -0,0 +1,42 @@
+import ctypes
+import os
+
+UNKNOWN_APP = "unknown"
+
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+def foreground_app_id():
+    """
+    返回前台窗口所属进程的 exe 名 (小写)，拿不到进程名时退回窗口类名
+    非 Windows 平台返回 "unknown"
+    """
+    try:
+        user32 = ctypes.windll.user32
+        kernel32 = ctypes.windll.kernel32
+    except AttributeError:
+        return UNKNOWN_APP
+
+    try:
+        hwnd = user32.GetForegroundWindow()
+        if not hwnd:
+            return UNKNOWN_APP
+
+        pid = ctypes.c_ulong(0)
+        user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+        if handle:
+            try:
+                buf = ctypes.create_unicode_buffer(260)
+                size = ctypes.c_ulong(len(buf))
+                if kernel32.QueryFullProcessImageNameW(handle, 0, buf, ctypes.byref(size)):
+                    return os.path.basename(buf.value).lower()
+            finally:
+                kernel32.CloseHandle(handle)
+
+        buf = ctypes.create_unicode_buffer(256)
+        if user32.GetClassNameW(hwnd, buf, len(buf)):
+            return f"class:{buf.value}"
+    except Exception:
+        pass
+    return UNKNOWN_APP
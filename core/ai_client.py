@@ -0,0 +1,187 @@
+import json
+import socket
+import threading
+import time
+
+# httpx 默认的空闲连接保留时间，超过后连接池里的连接会被关掉；空闲接近这个时间就重新预热
+KEEPALIVE_SECONDS = 5.0
+REWARM_AFTER = KEEPALIVE_SECONDS * 0.8
+
+
+def build_messages(system_prompt, text):
+    # 拼接 user 内容
+    user_content = f"待分析数据：\n```text\n{text}\n```"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+
+
+class ClientPool:
+    """
+    长期持有的 OpenAI 客户端池
+    按 (base_url, api_key) 复用同一个客户端及其 keep-alive 连接池，
+    避免每次热键都重新做 DNS 解析和 TLS 握手。
+    """
+
+    def __init__(self, rewarm_after=REWARM_AFTER, clock=time.monotonic):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._used = {}  # (base_url, api_key) -> 最近一次请求 / 预热的时刻
+        self.rewarm_after = rewarm_after
+        self._clock = clock
+
+    def get(self, base_url, api_key):
+        key = (base_url, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=api_key, base_url=base_url)
+                self._clients[key] = client
+            self._used[key] = self._clock()
+            return client
+
+    def is_idle(self, base_url, api_key):
+        """
+        用过、但空闲太久 (keep-alive 连接可能已被关闭)
+        从没用过的客户端由启动时的预热负责，返回 False
+        """
+        with self._lock:
+            used = self._used.get((base_url, api_key))
+        return used is not None and self._clock() - used >= self.rewarm_after
+
+    def warm_up(self, base_url, api_key, timeout=5):
+        """
+        预热：创建客户端并发一个轻量请求，让连接提前建立好并留在连接池里
+        返回是否成功建立连接 (即使服务端返回 401/404，连接也已经建立)
+        """
+        from openai import APIStatusError
+
+        client = self.get(base_url, api_key)
+        try:
+            client.with_options(max_retries=0, timeout=timeout).models.list()
+        except APIStatusError:
+            pass
+        except Exception:
+            return False
+        return True
+
+    def retain(self, keys):
+        """配置变更后只保留仍在使用的客户端，其余的关闭连接"""
+        keys = set(keys)
+        with self._lock:
+            stale = [key for key in self._clients if key not in keys]
+            closing = [self._clients.pop(key) for key in stale]
+            for key in stale:
+                self._used.pop(key, None)
+        for client in closing:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def close(self):
+        self.retain(())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+
+class Abort:
+    """
+    从别的线程打断阻塞中的流式读取 (任务被取消、对冲请求输了)
+    读取方登记打断函数，abort() 时逐个调用；只检查取消标志的话要等到下一行数据才会发现。
+    子 Abort 可以把自己的 abort 登记到父 Abort 上。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.aborted = False
+
+    def register(self, callback):
+        with self._lock:
+            if not self.aborted:
+                self._callbacks.append(callback)
+                return
+        _call_quietly(callback)  # 已经中断过：立即执行
+
+    def unregister(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def abort(self):
+        with self._lock:
+            if self.aborted:
+                return
+            self.aborted = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            _call_quietly(callback)
+
+
+def _call_quietly(callback):
+    try:
+        callback()
+    except Exception:
+        pass
+
+
+def _interrupter(response):
+    """
+    打断正在 recv 的读取：只 close() 响应不会唤醒阻塞的线程，要 shutdown 底层 socket
+    (连接随之作废，不会回到连接池)
+    """
+    def interrupt():
+        stream = response.http_response.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            response.close()
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    return interrupt
+
+
+def stream_chat(client, model, messages, timeout=20, abort=None):
+    """
+    流式请求，逐个 yield 文本增量
+    直接读取 SSE 行并读完整个响应体，连接才能回到 keep-alive 池
+    (openai 的 Stream 读到 [DONE] 就关闭响应，会把连接丢掉)
+    :param abort: 可选的 Abort，中断时立即打断阻塞中的读取
+    """
+    if abort is not None and abort.aborted:
+        return
+    with client.chat.completions.with_streaming_response.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            timeout=timeout
+    ) as response:
+        interrupt = _interrupter(response)
+        if abort is not None:
+            abort.register(interrupt)
+        try:
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if not data or data == "[DONE]":
+                    continue
+                payload = json.loads(data)
+                if payload.get("error"):
+                    error = payload["error"]
+                    raise RuntimeError(error.get("message") if isinstance(error, dict) else str(error))
+                choices = payload.get("choices") or []
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        finally:
+            if abort is not None:
+                abort.unregister(interrupt)
@@ -0,0 +1,185 @@
+"""
+无界面批处理：用 ConfigManager 里的提示词批量处理文件中的句子 / 段落
+python main.py batch --task grammar --in sentences.txt --out results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+from core.ai_client import build_messages
+from core.config import ConfigManager, CONFIG_FILE
+
+PROMPT_KEYS = {"grammar": "prompt_grammar", "translate": "prompt_translate"}
+
+
+def read_items(path, split="line"):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if split == "paragraph":
+        parts = re.split(r"\n\s*\n", content)
+    else:
+        parts = content.splitlines()
+    return [part.strip() for part in parts if part.strip()]
+
+
+def resume_point(path, items):
+    """
+    统计输出文件开头已经完整、成功且与输入对应的记录数，并截掉其后的内容
+    (半行、报错的记录以及之后的内容都会重新处理)
+    """
+    if not os.path.exists(path):
+        return 0
+
+    count = 0
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n") or count >= len(items):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if record.get("index") != count or record.get("input") != items[count] or "error" in record:
+                break
+            count += 1
+            valid_bytes += len(line)
+
+    with open(path, "r+b") as f:
+        f.truncate(valid_bytes)
+    return count
+
+
+class BatchRunner:
+    """
+    :param max_ahead: 最多领先下一条待写入记录多少条提交请求 (默认 4 倍并发)；
+        前面有一条很慢时，后面完成的结果在内存里等它，不限制的话缓冲区会涨到整个输入那么大
+    """
+
+    def __init__(self, client, model, system_prompt, task, concurrency=16, timeout=60, max_ahead=None):
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.task = task
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.max_ahead = max(1, max_ahead or self.concurrency * 4)
+
+        self.max_buffered = 0  # 等待按顺序写入的结果数的峰值
+        self.completed = 0
+        self.failed = 0
+        self.completion_tokens = 0
+        self.elapsed = 0.0
+
+    async def process(self, index, text):
+        start = time.perf_counter()
+        record = {"index": index, "input": text, "task": self.task, "model": self.model}
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=build_messages(self.system_prompt, text),
+                timeout=self.timeout
+            )
+            output = response.choices[0].message.content or ""
+            record["output"] = output
+            if self.task == "grammar":
+                match = re.search(r'<fixed>(.*?)</fixed>', output, re.DOTALL)
+                record["fixed"] = match.group(1).strip() if match else None
+            if response.usage is not None:
+                record["completion_tokens"] = response.usage.completion_tokens
+                self.completion_tokens += response.usage.completion_tokens or 0
+            self.completed += 1
+        except Exception as e:
+            record["error"] = str(e)
+            self.failed += 1
+        record["latency"] = round(time.perf_counter() - start, 3)
+        return record
+
+    async def run(self, items, out_file, start_index=0):
+        """并发处理 items[start_index:]，结果按输入顺序逐行写入 out_file"""
+        pending = iter(range(start_index, len(items)))
+        results = {}
+        next_index = start_index
+        window = asyncio.Condition()  # 写入推进时唤醒等着提交的 worker
+        started = time.perf_counter()
+
+        async def flush():
+            nonlocal next_index
+            while next_index in results:
+                out_file.write(json.dumps(results.pop(next_index), ensure_ascii=False) + "\n")
+                next_index += 1
+            out_file.flush()
+            async with window:
+                window.notify_all()
+
+        async def worker():
+            for index in pending:
+                # 下标按顺序领取，next_index 那条总是已经在处理，不会互相等死
+                async with window:
+                    await window.wait_for(lambda: index - next_index < self.max_ahead)
+                results[index] = await self.process(index, items[index])
+                self.max_buffered = max(self.max_buffered, len(results))
+                await flush()
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.elapsed = time.perf_counter() - started
+
+    def summary(self):
+        elapsed = self.elapsed or 1e-9
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "items_per_s": round((self.completed + self.failed) / elapsed, 2),
+            "tokens_per_s": round(self.completion_tokens / elapsed, 2),
+        }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py batch", description="SyntaxLens 批处理模式 (无界面)")
+    parser.add_argument("--task", choices=sorted(PROMPT_KEYS), default="grammar")
+    parser.add_argument("--in", dest="input", required=True, help="输入文件 (UTF-8)")
+    parser.add_argument("--out", dest="output", required=True, help="输出 JSONL，已存在时从断点继续")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--split", choices=["line", "paragraph"], default="line",
+                        help="按行 (句子列表) 或按空行 (整篇文档的段落) 切分输入")
+    parser.add_argument("--config", default=CONFIG_FILE, help="配置文件路径")
+    parser.add_argument("--timeout", type=float, default=60)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    cfg = ConfigManager(args.config)
+    if not cfg.get("api_key"):
+        print("❌ 配置中没有 api_key", file=sys.stderr)
+        return 2
+
+    from openai import AsyncOpenAI
+
+    items = read_items(args.input, args.split)
+    start_index = resume_point(args.output, items)
+    if start_index:
+        print(f"↩️ 从第 {start_index + 1} 条继续 (共 {len(items)} 条)")
+
+    client = AsyncOpenAI(api_key=cfg.get("api_key"), base_url=cfg.get("base_url"))
+    runner = BatchRunner(client, cfg.get("model"), cfg.get(PROMPT_KEYS[args.task]), args.task,
+                         concurrency=args.concurrency, timeout=args.timeout)
+
+    async def run():
+        try:
+            with open(args.output, "a", encoding="utf-8") as out_file:
+                await runner.run(items, out_file, start_index)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+
+    summary = runner.summary()
+    print(f"✅ 完成 {summary['completed']} 条，失败 {summary['failed']} 条，用时 {summary['elapsed']}s")
+    print(f"📊 吞吐: {summary['items_per_s']} items/s, {summary['tokens_per_s']} tokens/s")
+    return 1 if runner.failed else 0
@@ -0,0 +1,140 @@
+import time
+
+from core.active_app import UNKNOWN_APP
+from core.capture_stats import MIN_SAMPLES
+from core.hardware import KeySequence, DIK_HOME, DIK_END, DIK_LSHIFT, DIK_LCONTROL, DIK_C, DIK_INSERT
+
+# (策略名, 默认等待超时秒)，顺序即没有历史数据时的尝试顺序
+DEFAULT_STRATEGIES = [
+    ("ctrl_insert", 0.4),  # 方案 A: 强力复制 (Ctrl + Insert)，针对 PyCharm/IdeaVim 优化
+    ("ctrl_c", 0.4),  # 方案 B: 标准复制 (Ctrl + C)
+    ("select_line", 0.6),  # 方案 C: 自动全选兜底 (Home -> Shift+End -> Ctrl + C)
+]
+
+STRATEGY_LOGS = {
+    "ctrl_insert": "⚡ 尝试强力复制 (Ctrl+Insert)...",
+    "ctrl_c": "🔄 尝试标准复制 (Ctrl+C)...",
+    "select_line": "⚠️ 未选中，尝试自动全选...",
+}
+
+
+# 预编译的按键序列，每种只构造一次 INPUT 数组
+COPY_CTRL_INSERT = KeySequence.chord(DIK_LCONTROL, DIK_INSERT)
+COPY_CTRL_C = KeySequence.chord(DIK_LCONTROL, DIK_C)
+SELECT_LINE = KeySequence.tap(DIK_HOME) + KeySequence.chord(DIK_LSHIFT, DIK_END)  # 先松开 End 再松开 Shift
+RELEASE_ALL = KeySequence.release_all(DIK_LCONTROL, DIK_LSHIFT, DIK_INSERT, DIK_C)
+
+
+class TextCapture:
+    """
+    模拟复制按键取词 (Ctrl+Insert -> Ctrl+C -> Home/Shift+End 兜底)
+    剪贴板读写、按键发送和前台程序识别都可以替换，方便在无界面的 Linux 上测试取词延迟。
+    传入 stats 时按前台程序的历史记录调整策略顺序和等待超时。
+    """
+
+    def __init__(self, clipboard, keyboard=None, key_delay=0.0, log=print, sleep=time.sleep,
+                 stats=None, active_app=None):
+        """
+        :param keyboard: core.hardware 的发送后端，None 表示使用全局后端
+        :param key_delay: 每个按键边沿之后的等待秒数，0 表示整个序列一次批量发送
+        """
+        self.clipboard = clipboard
+        self.keyboard = keyboard
+        self.log = log
+        self.sleep = sleep
+        self.stats = stats
+        self.active_app = active_app
+        self.last_strategy = None
+
+        if key_delay > 0:
+            self.sequences = {
+                "ctrl_insert": COPY_CTRL_INSERT.with_delay(key_delay),
+                "ctrl_c": COPY_CTRL_C.with_delay(key_delay),
+                "select_line": SELECT_LINE.with_delay(key_delay),
+            }
+        else:
+            self.sequences = {"ctrl_insert": COPY_CTRL_INSERT, "ctrl_c": COPY_CTRL_C, "select_line": SELECT_LINE}
+
+    def capture(self):
+        try:
+            original_clipboard = self.clipboard.get_text()
+        except Exception:
+            original_clipboard = ""
+
+        app_id = UNKNOWN_APP
+        tried = []
+        self.last_strategy = None
+        try:
+            if self.active_app is not None:
+                app_id = self.active_app()
+            plan = self._plan(app_id)
+            if plan[0][0] != DEFAULT_STRATEGIES[0][0]:
+                self.log(f"🧠 {app_id}: 优先尝试 {plan[0][0]} (等待 {plan[0][1] * 1000:.0f}ms)")
+
+            self.sleep(0.05)  # 稍微缩短初始等待
+
+            for name, timeout in plan:
+                self.log(STRATEGY_LOGS[name])
+                token = getattr(self, f"_send_{name}")()
+                start = time.monotonic()
+                text = self.clipboard.wait_for_text(token, timeout)
+                if text:
+                    self.last_strategy = name
+                    self._record(app_id, tried, name, time.monotonic() - start)
+                    return text
+                tried.append(name)
+
+            self._record(app_id, tried, None, None)
+            return None
+
+        except Exception as e:
+            self.log(f"❌ 取词错误: {e}")
+            return None
+
+        finally:
+            # === 🛡️ 绝对防御 (兜底释放) ===
+            # 无论上面发生了什么（报错、return、断电），这里都会执行
+            # 确保按键一定被松开！
+            RELEASE_ALL.send(self.keyboard)
+
+            # ⚠️ 恢复剪贴板原始内容
+            try:
+                self.clipboard.set_text(original_clipboard)
+            except Exception as e:
+                self.log(f"⚠️ 恢复剪贴板失败: {e}")
+
+    def _plan(self, app_id):
+        if self.stats is None:
+            return DEFAULT_STRATEGIES
+        plan = self.stats.plan(app_id, DEFAULT_STRATEGIES)
+        # 自动全选会覆盖用户的选区，只有前两种方案在该程序下从没成功过才允许提前
+        for name, _ in DEFAULT_STRATEGIES[:-1]:
+            entry = self.stats.get(app_id, name)
+            if not entry or entry["success"] or entry["fail"] < MIN_SAMPLES:
+                fallback = [step for step in plan if step[0] == "select_line"]
+                return [step for step in plan if step[0] != "select_line"] + fallback
+        return plan
+
+    def _record(self, app_id, failed, succeeded, latency):
+        if self.stats is None:
+            return
+        for name in failed:
+            self.stats.record(app_id, name, False)
+        if succeeded:
+            self.stats.record(app_id, succeeded, True, latency)
+        self.stats.save()
+
+    def _send_ctrl_insert(self):
+        token = self.clipboard.begin_watch()
+        self.sequences["ctrl_insert"].send(self.keyboard, self.sleep)
+        return token
+
+    def _send_ctrl_c(self):
+        token = self.clipboard.begin_watch()
+        self.sequences["ctrl_c"].send(self.keyboard, self.sleep)
+        return token
+
+    def _send_select_line(self):
+        # Home -> Shift + End，全选后再 Ctrl + C
+        self.sequences["select_line"].send(self.keyboard, self.sleep)
+        return self._send_ctrl_c()
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+
+from core.config import CONFIG_FILE
+
+# 与 config.json 放在同一目录
+STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "capture_stats.json")
+
+MAX_SAMPLES = 50  # 每个策略只保留最近的延迟样本
+MIN_SAMPLES = 3  # 样本太少时仍使用默认超时
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class CaptureStats:
+    """
+    按前台程序记录每种复制策略的成败和剪贴板响应延迟，并持久化到 capture_stats.json
+    plan() 给出该程序下的尝试顺序和每个策略的等待超时 (p95 * 1.5 + 余量)
+    record() 只改内存，调用方在一次取词结束后 save()
+    """
+
+    def __init__(self, path=STATS_FILE, margin=0.05, min_timeout=0.15):
+        self.path = path
+        self.margin = margin
+        self.min_timeout = min_timeout
+        self._lock = threading.Lock()
+        self._apps = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Capture stats load error: {e}")
+            return {}
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self._apps, ensure_ascii=False)
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Capture stats save error: {e}")
+
+    def record(self, app_id, strategy, success, latency=None):
+        with self._lock:
+            entry = self._apps.setdefault(app_id, {}).setdefault(
+                strategy, {"success": 0, "fail": 0, "latencies": []})
+            if success:
+                entry["success"] += 1
+                if latency is not None:
+                    entry["latencies"] = (entry["latencies"] + [round(latency, 4)])[-MAX_SAMPLES:]
+            else:
+                entry["fail"] += 1
+
+    def get(self, app_id, strategy):
+        with self._lock:
+            entry = self._apps.get(app_id, {}).get(strategy)
+            return json.loads(json.dumps(entry)) if entry else None
+
+    def plan(self, app_id, strategies):
+        """
+        :param strategies: [(策略名, 默认超时秒)]，顺序即默认顺序
+        :return: 排序后的 [(策略名, 超时秒)]
+        """
+        with self._lock:
+            app = self._apps.get(app_id, {})
+            ranked = []
+            for index, (name, default_timeout) in enumerate(strategies):
+                entry = app.get(name)
+                if not entry:
+                    rate, latency, timeout = 0.5, default_timeout, default_timeout
+                else:
+                    # 拉普拉斯平滑后的成功率，没试过的策略记为 0.5
+                    rate = (entry["success"] + 1) / (entry["success"] + entry["fail"] + 2)
+                    samples = entry["latencies"]
+                    latency = percentile(samples, 0.5) if samples else default_timeout
+                    timeout = default_timeout
+                    if len(samples) >= MIN_SAMPLES:
+                        learned = percentile(samples, 0.95) * 1.5 + self.margin
+                        timeout = min(default_timeout, max(self.min_timeout, learned))
+                ranked.append((-rate, latency, index, name, timeout))
+        ranked.sort()
+        return [(name, timeout) for _, _, _, name, timeout in ranked]
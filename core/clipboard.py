@@ -0,0 +1,120 @@
+import threading
+import time
+
+
+class ClipboardBackend:
+    """
+    剪贴板后端接口
+    取词流程：begin_watch() -> 发送复制按键 -> wait_for_text(token, timeout)
+    """
+
+    def get_text(self):
+        raise NotImplementedError
+
+    def set_text(self, text):
+        raise NotImplementedError
+
+    def begin_watch(self):
+        """在发送复制按键之前调用，返回交给 wait_for_text 的标记"""
+        raise NotImplementedError
+
+    def wait_for_text(self, token, timeout):
+        """等待剪贴板出现新的非空文本，返回去掉首尾空白的文本，超时返回 None"""
+        raise NotImplementedError
+
+
+class PyperclipBackend(ClipboardBackend):
+    """
+    旧的轮询实现：先清空剪贴板，再每 20ms paste() 一次
+    Linux 下每次调用都会启动 xclip/xsel 子进程，只作为兜底
+    """
+
+    def __init__(self, interval=0.02):
+        import pyperclip
+        self._pyperclip = pyperclip
+        self.interval = interval
+
+    def get_text(self):
+        return self._pyperclip.paste()
+
+    def set_text(self, text):
+        self._pyperclip.copy(text)
+
+    def begin_watch(self):
+        self._pyperclip.copy("")
+        return None
+
+    def wait_for_text(self, token, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            text = self._pyperclip.paste()
+            if text.strip(): return text.strip()
+            time.sleep(self.interval)
+        return None
+
+
+class EventClipboardBackend(ClipboardBackend):
+    """
+    基于变化通知的后端：剪贴板每变化一次序号 +1 并唤醒等待者，不需要轮询也不需要先清空
+    子类在收到变化通知时调用 _publish()
+    """
+
+    def __init__(self, text=""):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._text = text
+
+    def _publish(self, text):
+        with self._cond:
+            self._seq += 1
+            self._text = text
+            self._cond.notify_all()
+
+    def get_text(self):
+        with self._cond:
+            return self._text
+
+    def begin_watch(self):
+        with self._cond:
+            return self._seq
+
+    def wait_for_text(self, token, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._seq != token and self._text.strip():
+                    return self._text.strip()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+class FakeClipboard(EventClipboardBackend):
+    """
+    确定性的假剪贴板 (测试 / 基准用)
+    copy_after() 模拟目标程序在收到复制按键 delay 秒后写入剪贴板
+    """
+
+    def __init__(self, text=""):
+        super().__init__(text)
+        self.writes = []
+        self._timers = []
+
+    def set_text(self, text):
+        self.writes.append(text)
+        self._publish(text)
+
+    def copy_after(self, text, delay=0.0):
+        if delay <= 0:
+            self._publish(text)
+            return
+        timer = threading.Timer(delay, self._publish, args=(text,))
+        timer.daemon = True
+        self._timers.append(timer)
+        timer.start()
+
+    def cancel_pending(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._timers.clear()
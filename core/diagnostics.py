@@ -0,0 +1,193 @@
+"""
+按需的性能诊断：接下来 N 次任务在 cProfile + tracemalloc 下运行
+每次任务写出 <名字>.prof (可用 snakeviz / pstats 打开) 和 <名字>.txt (配置哈希、各阶段耗时、
+最耗时的函数、分配最多的代码行)，目录总大小超过上限时删除最旧的文件。
+没有待诊断的任务时只比较一个整数，不导入也不启动任何分析器。
+
+无界面运行时用环境变量开启：SYNTAXLENS_PROFILE_RUNS=5
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from core.config import CONFIG_FILE
+
+DIAGNOSTICS_DIR = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "diagnostics")
+ENV_RUNS = "SYNTAXLENS_PROFILE_RUNS"
+TOP_FUNCTIONS = 30
+TOP_ALLOCATIONS = 25
+# 不参与配置哈希的字段
+SECRET_KEYS = ("api_key",)
+
+
+def config_hash(config):
+    """配置的指纹：同一个哈希说明两次诊断是在相同配置下跑的 (密钥不参与)"""
+    def scrub(value):
+        if isinstance(value, dict):
+            return {k: scrub(v) for k, v in value.items() if k not in SECRET_KEYS}
+        if isinstance(value, list):
+            return [scrub(v) for v in value]
+        return value
+
+    raw = json.dumps(scrub(config), ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def runs_from_env(environ=os.environ):
+    try:
+        return max(0, int(environ.get(ENV_RUNS) or 0))
+    except ValueError:
+        return 0
+
+
+class Profiler:
+    """
+    arm(n) 之后的 n 次 run() 会被诊断；可以跨线程调用
+    同一时刻只诊断一次任务：Python 3.12+ 的 cProfile 基于进程级的 sys.monitoring，
+    同时 enable() 第二个会报错。正在诊断时其他任务照常运行，不占用次数。
+    """
+
+    def __init__(self, directory=DIAGNOSTICS_DIR, max_bytes=50 * 1024 * 1024, log=None, clock=time.time):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.log = log
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._active = threading.Lock()  # 正在诊断的任务持有
+        self.remaining = 0
+        self._owns_tracing = False  # tracemalloc 是不是我们启动的 (别人已经在用时不去停它)
+        self._seq = 0
+
+    def arm(self, runs):
+        with self._lock:
+            self.remaining = max(0, runs)
+
+    def take(self):
+        """这次运行是否需要诊断 (需要时扣掉一次)"""
+        if not self.remaining:  # 关闭时的唯一开销
+            return False
+        with self._lock:
+            if not self.remaining:
+                return False
+            self.remaining -= 1
+            return True
+
+    def run(self, fn, name="task", config=None, trace=None):
+        """
+        执行 fn()；需要诊断时在分析器下执行并写出报告
+        :param config: 配置字典，报告里记录它的哈希
+        :param trace: core.metrics.Trace，报告里记录各阶段耗时
+        """
+        if not self.remaining or not self._active.acquire(blocking=False):
+            return fn()
+        try:
+            if not self.take():
+                return fn()
+            return self._profile(fn, name, config, trace)
+        finally:
+            self._active.release()
+
+    def _profile(self, fn, name, config, trace):
+        import cProfile
+
+        self._start_tracemalloc()
+        profile = cProfile.Profile()
+        enabled = False
+        started = time.perf_counter()
+        try:
+            try:
+                profile.enable()
+                enabled = True
+            except ValueError as e:  # 调试器等其他分析工具占用着 sys.monitoring
+                if self.log:
+                    self.log(f"⚠️ 无法启动性能分析: {e}")
+            try:
+                return fn()
+            finally:
+                if enabled:
+                    profile.disable()
+        finally:
+            elapsed = time.perf_counter() - started
+            snapshot, peak = self._stop_tracemalloc()
+            if enabled:
+                try:
+                    self._write(name, profile, snapshot, peak, elapsed, config, trace)
+                except OSError as e:
+                    if self.log:
+                        self.log(f"⚠️ 写出性能诊断失败: {e}")
+
+    def _start_tracemalloc(self):
+        import tracemalloc
+
+        self._owns_tracing = not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+
+    def _stop_tracemalloc(self):
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        peak = tracemalloc.get_traced_memory()[1] if snapshot is not None else None
+        if self._owns_tracing:
+            tracemalloc.stop()
+        return snapshot, peak
+
+    def _write(self, name, profile, snapshot, peak, elapsed, config, trace):
+        import pstats
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._clock()))
+        base = os.path.join(self.directory, f"{stamp}-{seq:03d}-{name}")
+        profile.dump_stats(base + ".prof")
+
+        lines = [f"任务: {name}", f"时间: {stamp}", f"总耗时: {elapsed * 1000:.1f}ms"]
+        if peak is not None:
+            lines.append(f"内存峰值: {peak / 1024:.1f} KB (诊断期间新分配)")
+        if config is not None:
+            lines.append(f"配置哈希: {config_hash(config)}")
+        if trace is not None:
+            lines.append(f"结果: {trace.outcome}")
+            lines.append("")
+            lines.append("阶段时间线 (ms):")
+            for stage, begin, end in trace.timeline():
+                lines.append(f"  {stage:<12}{begin * 1000:>9.1f} → {end * 1000:>9.1f}  ({(end - begin) * 1000:.1f})")
+
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        lines += ["", f"累计耗时最多的 {TOP_FUNCTIONS} 个函数:", stream.getvalue().strip()]
+
+        if snapshot is not None:
+            lines += ["", f"分配最多的 {TOP_ALLOCATIONS} 处代码 (诊断结束时仍未释放):"]
+            for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 1024:>9.1f} KB {stat.count:>7} 个  {frame.filename}:{frame.lineno}")
+
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.prune()
+        if self.log:
+            self.log(f"🩺 已写出性能诊断: {base}.prof")
+
+    def prune(self):
+        """目录总大小超过上限时从最旧的文件开始删除"""
+        try:
+            entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        except FileNotFoundError:
+            return
+        files = sorted((os.path.getmtime(path), os.path.getsize(path), path)
+                       for path in entries if os.path.isfile(path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
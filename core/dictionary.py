@@ -0,0 +1,276 @@
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+from core.config import CONFIG_FILE
+
+# 与 config.json 放在同一目录
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "dictionary.sldx")
+
+# 索引文件格式 (小端)：
+#   头部   magic, 版本, 词条数, 源文件大小, 源文件修改时间, 源文件路径的哈希
+#   偏移表 每个词条一个 u64，指向记录 (按规范化词头的 UTF-8 字节排序，用于二分查找)
+#   记录   u16 词头长度 + 词头 + u32 释义长度 + 释义
+MAGIC = b"SLDICT\x00\x01"
+VERSION = 2
+_HEADER = struct.Struct("<8sIIQd8s")
+_OFFSET = struct.Struct("<Q")
+_KEY_LEN = struct.Struct("<H")
+_VALUE_LEN = struct.Struct("<I")
+
+_PUNCTUATION = "\"'“”‘’.,;:!?()[]{}<>«»「」『』，。；：！？（）"
+
+
+def normalize(word):
+    """查词用的规范化：去掉首尾标点、折叠空白、忽略大小写"""
+    return " ".join(word.strip().strip(_PUNCTUATION).split()).casefold()
+
+
+def _candidates(word):
+    """原词查不到时依次尝试的词形 (简单的英文屈折变化还原)"""
+    key = normalize(word)
+    forms = [key]
+    if " " in key or not key.isascii():
+        return forms
+    if key.endswith("'s"):
+        forms.append(key[:-2])
+    if key.endswith("ies") and len(key) > 4:
+        forms.append(key[:-3] + "y")
+    if key.endswith("es") and len(key) > 3:
+        forms.extend([key[:-1], key[:-2]])  # 先保留 e: notes -> note，查不到再 boxes -> box
+    if key.endswith("s") and not key.endswith("ss") and len(key) > 2:
+        forms.append(key[:-1])
+    if key.endswith("ied") and len(key) > 4:
+        forms.append(key[:-3] + "y")
+    if key.endswith("ed") and len(key) > 3:
+        forms.extend([key[:-1], key[:-2]])  # hoped -> hope，查不到再 walked -> walk
+        if len(key) > 4 and key[-3] == key[-4]:
+            forms.append(key[:-3])  # stopped -> stop
+    if key.endswith("ing") and len(key) > 4:
+        stem = key[:-3]
+        # 以 "单个元音 + 辅音" 结尾又没有双写辅音，多半是去掉了 e: hoping -> hope, using -> use
+        forms.extend([stem + "e", stem] if _dropped_e(stem) else [stem, stem + "e"])
+        if len(key) > 5 and key[-4] == key[-5]:
+            forms.append(key[:-4])  # running -> run
+    return list(dict.fromkeys(forms))
+
+
+def _dropped_e(stem):
+    vowels = "aeiou"
+    return (len(stem) >= 2 and stem[-1] not in vowels + "wxy" and stem[-2] in vowels
+            and (len(stem) == 2 or stem[-3] not in vowels))
+
+
+def is_short_selection(text, max_words):
+    """单词或短语才查本地词典 (按空白分词；不含空白的中日文按字符数算)"""
+    text = text.strip()
+    if not text or max_words <= 0 or "\n" in text:
+        return False
+    words = text.split()
+    if len(words) == 1 and not text.isascii():
+        return len(text) <= max_words * 4
+    return len(words) <= max_words
+
+
+def read_tsv(path):
+    """每行 "词头<TAB>释义"，释义里的 \\n 表示换行，# 开头的行是注释"""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#") or "\t" not in line:
+                continue
+            word, definition = line.split("\t", 1)
+            yield word, definition.replace("\\n", "\n")
+
+
+def read_stardict(ifo_path):
+    """StarDict 导出 (.ifo + .idx + .dict / .dict.dz，dictzip 与 gzip 兼容)"""
+    base = ifo_path[:-len(".ifo")]
+    info = {}
+    with open(ifo_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if "=" in line:
+                key, value = line.rstrip("\r\n").split("=", 1)
+                info[key] = value
+    offset_format = ">Q" if info.get("idxoffsetbits") == "64" else ">I"
+    offset_size = struct.calcsize(offset_format)
+
+    if os.path.exists(base + ".idx.gz"):
+        with gzip.open(base + ".idx.gz", "rb") as f:
+            index = f.read()
+    else:
+        with open(base + ".idx", "rb") as f:
+            index = f.read()
+    if os.path.exists(base + ".dict.dz"):
+        with gzip.open(base + ".dict.dz", "rb") as f:
+            data = f.read()
+    else:
+        with open(base + ".dict", "rb") as f:
+            data = f.read()
+
+    pos = 0
+    while pos < len(index):
+        end = index.index(b"\0", pos)
+        word = index[pos:end].decode("utf-8", errors="replace")
+        pos = end + 1
+        (offset,) = struct.unpack_from(offset_format, index, pos)
+        (size,) = struct.unpack_from(">I", index, pos + offset_size)
+        pos += offset_size + 4
+        yield word, data[offset:offset + size].decode("utf-8", errors="replace").strip("\0")
+
+
+def read_entries(path):
+    if path.lower().endswith(".ifo"):
+        return read_stardict(path)
+    return read_tsv(path)
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    path_hash = hashlib.sha256(os.path.normcase(os.path.abspath(path)).encode("utf-8")).digest()[:8]
+    return stat.st_size, stat.st_mtime, path_hash
+
+
+def build_index(source_path, index_path=INDEX_FILE):
+    """
+    把词典源文件编译成排好序的索引文件 (先写同目录下唯一的临时文件再替换，同时重建也不会写坏)
+    同一词头出现多次时释义合并
+    :return: 词条数
+    """
+    merged = {}
+    for word, definition in read_entries(source_path):
+        key = normalize(word).encode("utf-8")[:0xFFFF]
+        definition = definition.strip()
+        if not key or not definition:
+            continue
+        if key in merged:
+            merged[key] = merged[key] + "\n\n" + definition
+        else:
+            merged[key] = definition
+
+    keys = sorted(merged)
+    size, mtime, path_hash = _source_signature(source_path)
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(index_path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(os.path.abspath(index_path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(keys), size, mtime, path_hash))
+            offset = _HEADER.size + _OFFSET.size * len(keys)
+            offsets = bytearray()
+            records = []
+            for key in keys:
+                value = merged[key].encode("utf-8")
+                record = _KEY_LEN.pack(len(key)) + key + _VALUE_LEN.pack(len(value)) + value
+                offsets += _OFFSET.pack(offset)
+                records.append(record)
+                offset += len(record)
+            f.write(offsets)
+            for record in records:
+                f.write(record)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(keys)
+
+
+class MmapDictionary:
+    """
+    只读的本地词典：索引文件整个 mmap，查词是偏移表上的二分查找
+    只有被访问到的页才会读进内存，查一次只需要几微秒
+    """
+
+    def __init__(self, index_path=INDEX_FILE):
+        self.path = index_path
+        self._file = open(index_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # 空文件
+            self._file.close()
+            raise ValueError(f"词典索引无效: {index_path}")
+        if len(self._map) < _HEADER.size:
+            self.close()
+            raise ValueError(f"词典索引无效: {index_path}")
+        (magic, version, self.count, self.source_size, self.source_mtime,
+         self.source_path_hash) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"词典索引无效: {index_path}")
+
+    def __len__(self):
+        return self.count
+
+    def _key_at(self, i):
+        (offset,) = _OFFSET.unpack_from(self._map, _HEADER.size + _OFFSET.size * i)
+        (key_len,) = _KEY_LEN.unpack_from(self._map, offset)
+        start = offset + _KEY_LEN.size
+        return self._map[start:start + key_len], start + key_len
+
+    def _find(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            current, value_offset = self._key_at(middle)
+            if current == key:
+                (value_len,) = _VALUE_LEN.unpack_from(self._map, value_offset)
+                start = value_offset + _VALUE_LEN.size
+                return self._map[start:start + value_len].decode("utf-8")
+            if current < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def lookup(self, word):
+        """
+        :return: (命中的词头, 释义)，查不到时返回 None
+        """
+        for form in _candidates(word):
+            definition = self._find(form.encode("utf-8"))
+            if definition is not None:
+                return form, definition
+        return None
+
+    def matches_source(self, source_path):
+        try:
+            signature = (self.source_size, self.source_mtime, self.source_path_hash)
+            return signature == _source_signature(source_path)
+        except OSError:
+            return False
+
+    def close(self):
+        mapped = getattr(self, "_map", None)
+        if mapped is not None:
+            mapped.close()
+        self._file.close()
+
+
+def load_dictionary(source_path, index_path=INDEX_FILE, log=None):
+    """打开索引；不存在或源文件变化时先重建"""
+    dictionary = None
+    if os.path.exists(index_path):
+        try:
+            dictionary = MmapDictionary(index_path)
+        except (OSError, ValueError):
+            dictionary = None
+        if dictionary is not None and not dictionary.matches_source(source_path):
+            dictionary.close()
+            dictionary = None
+    if dictionary is None:
+        count = build_index(source_path, index_path)
+        if log:
+            log(f"📖 已建立本地词典索引: {count} 个词条")
+        dictionary = MmapDictionary(index_path)
+    return dictionary
+
+
+def format_entry(headword, definition):
+    """弹窗里显示的 Markdown"""
+    lines = definition.splitlines()
+    return f"📖 **{headword}**\n\n" + "  \n".join(lines) + "\n"
@@ -0,0 +1,78 @@
+OPEN_TAG = "<fixed>"
+CLOSE_TAG = "</fixed>"
+
+
+class FixedTagScanner:
+    """
+    在流式增量上识别 <fixed>...</fixed>：标签可能被拆在两个 chunk 之间
+    feed() 返回去掉标签后用于显示的文本，以及这次刚闭合的 <fixed> 内容；
+    末尾可能是半个标签的 "<..." 先留着，等下一个 chunk 再决定
+    """
+
+    def __init__(self):
+        self.inside = False
+        self._pending = ""
+        self._current = []
+
+    def feed(self, delta):
+        """
+        :return: (显示文本, [刚闭合的 fixed 内容])
+        """
+        text = self._pending + delta
+        self._pending = ""
+        shown = []
+        closed = []
+        pos = 0
+        while True:
+            start, tag = _find_tag(text, pos)
+            if tag is None:
+                rest = text[pos:]
+                # 只留下可能是标签开头的尾巴
+                cut = rest.rfind("<")
+                if cut >= 0 and _is_tag_prefix(rest[cut:]):
+                    self._pending = rest[cut:]
+                    rest = rest[:cut]
+                self._take(rest, shown)
+                break
+            self._take(text[pos:start], shown)
+            if tag == OPEN_TAG:
+                self.inside = True
+                self._current = []
+            elif self.inside:
+                closed.append("".join(self._current))
+                self.inside = False
+                self._current = []
+            pos = start + len(tag)
+        return "".join(shown), closed
+
+    def flush(self):
+        """流结束：留着的半个标签其实是普通文本，原样交出"""
+        rest, self._pending = self._pending, ""
+        if self.inside:
+            self._current.append(rest)
+        return rest
+
+    def _take(self, text, shown):
+        if text:
+            shown.append(text)
+            if self.inside:
+                self._current.append(text)
+
+
+def _find_tag(text, pos):
+    open_at = text.find(OPEN_TAG, pos)
+    close_at = text.find(CLOSE_TAG, pos)
+    if open_at < 0 and close_at < 0:
+        return -1, None
+    if close_at < 0 or 0 <= open_at < close_at:
+        return open_at, OPEN_TAG
+    return close_at, CLOSE_TAG
+
+
+def _is_tag_prefix(text):
+    return OPEN_TAG.startswith(text) or CLOSE_TAG.startswith(text)
+
+
+def strip_tags(text):
+    """整段文本去掉 <fixed> 标签 (历史记录等非流式显示)"""
+    return text.replace(OPEN_TAG, "").replace(CLOSE_TAG, "")
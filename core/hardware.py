@@ -39,6 +39,131 @@ class Input(ctypes.Structure):
                 ("ii", Input_I)]
 
 
+# 0x0008: KEYEVENTF_SCANCODE, 0x0002: KEYEVENTF_KEYUP, 0x0001: KEYEVENTF_EXTENDEDKEY
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+INPUT_KEYBOARD = 1
+
+# 扩展键 (Home, End, Arrows等)
+EXTENDED_KEYS = (0x47, 0x4F, 0x48, 0x50, 0x4B, 0x4D, 0x1D, 0x52, 0x53)
+
+_EXTRA = ctypes.c_ulong(0)
+
+
+def _fill_input(x, hexKeyCode, is_press):
+    flags = KEYEVENTF_SCANCODE
+    if not is_press:
+        flags |= KEYEVENTF_KEYUP
+    if hexKeyCode in EXTENDED_KEYS:
+        flags |= KEYEVENTF_EXTENDEDKEY
+
+    x.type = INPUT_KEYBOARD
+    x.ii.ki = KeyBdInput(0, hexKeyCode, flags, 0, ctypes.pointer(_EXTRA))
+
+
+def decode_input(x):
+    """把 Input 结构还原成 (扫描码, 是否按下)"""
+    return x.ii.ki.wScan, not (x.ii.ki.dwFlags & KEYEVENTF_KEYUP)
+
+
+# --- 发送后端 (可替换) ---
+class SendInputBackend:
+    """真正调用 user32.SendInput，一次调用提交整个数组"""
+
+    def send(self, inputs, count):
+        ctypes.windll.user32.SendInput(count, inputs, ctypes.sizeof(Input))
+
+
+class RecordingBackend:
+    """记录每次批量发送的按键 (测试用，不依赖 Windows)"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.batches = []  # [(时间戳, [(扫描码, 是否按下), ...])]
+
+    @property
+    def events(self):
+        return [event for _, batch in self.batches for event in batch]
+
+    def send(self, inputs, count):
+        self.batches.append((self._clock(), [decode_input(inputs[i]) for i in range(count)]))
+
+
+_backend = SendInputBackend()
+
+
+def get_backend():
+    return _backend
+
+
+def set_backend(backend):
+    """替换全局发送后端，返回旧的后端"""
+    global _backend
+    old, _backend = _backend, backend
+    return old
+
+
+# --- 预编译的按键序列 ---
+class KeySequence:
+    """
+    声明一次、编译成可复用的 INPUT 数组，用一次 SendInput 批量发送
+    每一步可以带一个之后的等待时间，有等待的位置会把数组切成多段分别发送
+    """
+
+    def __init__(self, steps, delay=0.0):
+        """
+        :param steps: [(扫描码, 是否按下)] 或 [(扫描码, 是否按下, 之后等待秒)]
+        :param delay: 没有单独指定等待时间的步骤使用的默认等待
+        """
+        self.steps = tuple((step[0], bool(step[1]), step[2] if len(step) > 2 else delay) for step in steps)
+        self._segments = self._compile()
+
+    @classmethod
+    def chord(cls, *codes, delay=0.0):
+        """组合键：依次按下，逆序松开 (例如 Ctrl + C)"""
+        return cls([(code, True) for code in codes] + [(code, False) for code in reversed(codes)], delay)
+
+    @classmethod
+    def tap(cls, code, delay=0.0):
+        return cls([(code, True), (code, False)], delay)
+
+    @classmethod
+    def release_all(cls, *codes):
+        return cls([(code, False) for code in codes])
+
+    def __add__(self, other):
+        return KeySequence(self.steps + other.steps)
+
+    def with_delay(self, delay):
+        """返回每一步之后都等待 delay 秒的新序列"""
+        return KeySequence([(code, is_press) for code, is_press, _ in self.steps], delay)
+
+    def _compile(self):
+        segments = []
+        start = 0
+        for i, (_, _, delay) in enumerate(self.steps):
+            if delay > 0 or i == len(self.steps) - 1:
+                segment = self.steps[start:i + 1]
+                inputs = (Input * len(segment))()
+                for x, (code, is_press, _) in zip(inputs, segment):
+                    _fill_input(x, code, is_press)
+                segments.append((inputs, len(segment), delay))
+                start = i + 1
+        return segments
+
+    @property
+    def batch_count(self):
+        return len(self._segments)
+
+    def send(self, backend=None, sleep=time.sleep):
+        backend = backend or _backend
+        for inputs, count, delay in self._segments:
+            backend.send(inputs, count)
+            if delay > 0:
+                sleep(delay)
+
+
 # --- 核心发送函数 ---
 def send_scan_code(hexKeyCode, is_press):
     """
@@ -46,22 +171,9 @@ def send_scan_code(hexKeyCode, is_press):
     :param hexKeyCode: 扫描码
     :param is_press: True按下, False松开
     """
-    extra = ctypes.c_ulong(0)
-    ii_ = Input_I()
-
-    # 0x0008: KEYEVENTF_SCANCODE
-    flags = 0x0008
-
-    if not is_press:
-        flags |= 0x0002  # KEYEVENTF_KEYUP
-
-    # 处理扩展键 (Home, End, Arrows等)
-    if hexKeyCode in [0x47, 0x4F, 0x48, 0x50, 0x4B, 0x4D, 0x1D, 0x52, 0x53]:
-        flags |= 0x0001
-
-    ii_.ki = KeyBdInput(0, hexKeyCode, flags, 0, ctypes.pointer(extra))
-    x = Input(ctypes.c_ulong(1), ii_)
-    ctypes.windll.user32.SendInput(1, ctypes.pointer(x), ctypes.sizeof(x))
+    x = Input()
+    _fill_input(x, hexKeyCode, is_press)
+    _backend.send(ctypes.pointer(x), 1)
 
 
 # --- 常用扫描码映射 ---
@@ -0,0 +1,210 @@
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+
+from core.ai_client import Abort
+from core.capture_stats import percentile
+
+DEFAULT_HEDGE_DELAY = 2.0  # 没有首 token 统计时的对冲等待 (秒)
+MIN_HEDGE_DELAY = 0.25
+MAX_HEDGE_DELAY = 4.0
+MIN_SAMPLES = 5
+MAX_SAMPLES = 50
+
+
+def provider_key(provider):
+    return f"{provider['base_url']}|{provider['model']}"
+
+
+def configured_providers(cfg):
+    """
+    主配置 (base_url / api_key / model) 排第一，之后是 providers 里按顺序配置的备用服务
+    备用服务没写 api_key / model 时沿用主配置的
+    """
+    primary = {"base_url": cfg.get("base_url"), "api_key": cfg.get("api_key"), "model": cfg.get("model")}
+    providers = [primary]
+    for entry in cfg.get("providers") or []:
+        if not entry.get("base_url"):
+            continue
+        providers.append({
+            "name": entry.get("name"),
+            "base_url": entry["base_url"],
+            "api_key": entry.get("api_key") or primary["api_key"],
+            "model": entry.get("model") or primary["model"],
+        })
+    for provider in providers:
+        if not provider.get("name"):
+            provider["name"] = urlparse(provider["base_url"] or "").hostname or provider["base_url"]
+    return providers
+
+
+class TTFTStats:
+    """
+    每个服务最近的首 token 延迟 (内存中)，用于自动决定对冲等待时间
+    hedge_delay = p90 首 token 延迟，限制在 [MIN_HEDGE_DELAY, MAX_HEDGE_DELAY]
+    """
+
+    def __init__(self, default_delay=DEFAULT_HEDGE_DELAY, min_delay=MIN_HEDGE_DELAY, max_delay=MAX_HEDGE_DELAY):
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples[key] = (self._samples.get(key, []) + [round(seconds, 4)])[-MAX_SAMPLES:]
+
+    def samples(self, key):
+        with self._lock:
+            return list(self._samples.get(key, []))
+
+    def hedge_delay(self, key):
+        samples = self.samples(key)
+        if len(samples) < MIN_SAMPLES:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, percentile(samples, 0.9)))
+
+    def stats(self):
+        with self._lock:
+            return {key: {"count": len(samples),
+                          "p50_ms": round(percentile(samples, 0.5) * 1000),
+                          "p90_ms": round(percentile(samples, 0.9) * 1000)}
+                    for key, samples in self._samples.items() if samples}
+
+
+class _Attempt(threading.Thread):
+    """
+    在后台线程里读一个服务的流，把增量放进共享队列
+    取消时通过 abort 立即打断阻塞中的读取 (输掉的请求可能一直等不到首 token)，连接不再占着
+    """
+
+    def __init__(self, index, provider, open_stream, events):
+        super().__init__(daemon=True)
+        self.index = index
+        self.provider = provider
+        self.open_stream = open_stream
+        self.events = events
+        self.cancel_event = threading.Event()
+        self.abort = Abort()
+        self.started_at = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.abort.abort()
+
+    def run(self):
+        stream = None
+        try:
+            stream = self.open_stream(self.provider, self.abort)
+            for content in stream:
+                if self.cancel_event.is_set():
+                    break
+                self.events.put((self, "token", content))
+            self.events.put((self, "done", None))
+        except Exception as e:
+            self.events.put((self, "error", e))
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+def hedged_stream(providers, open_stream, stats=None, delay=None, log=None, clock=time.monotonic,
+                  abort=None, on_winner=None):
+    """
+    对冲请求：先请求第一个服务，若在对冲等待时间内没有首 token，再把同样的请求发给下一个服务，
+    哪个先出首 token 就用哪个的流，其余的取消。某个服务直接报错时立即启用下一个。
+    :param open_stream: open_stream(provider, abort) -> 文本增量迭代器，abort 是这次尝试的 ai_client.Abort
+    :param stats: TTFTStats，记录首 token 延迟并自动决定对冲等待时间
+    :param delay: 固定的对冲等待秒数，None 表示由 stats 决定
+    :param abort: 可选的 Abort，中断时取消所有尝试
+    :param on_winner: 可选，on_winner(provider)，选定回答的服务时调用 (历史、缓存按它记录模型)
+    """
+    events = queue.Queue()
+    attempts = []
+    winner = None
+    last_error = None
+
+    def delay_for(provider):
+        if delay is not None:
+            return delay
+        if stats is not None:
+            return stats.hedge_delay(provider_key(provider))
+        return DEFAULT_HEDGE_DELAY
+
+    def launch():
+        attempt = _Attempt(len(attempts), providers[len(attempts)], open_stream, events)
+        attempt.started_at = clock()
+        attempts.append(attempt)
+        if abort is not None:
+            abort.register(attempt.cancel)
+        attempt.start()
+        return clock() + delay_for(attempt.provider)
+
+    def running():
+        return [a for a in attempts if not a.cancel_event.is_set()]
+
+    try:
+        next_hedge = launch()
+        while True:
+            timeout = None
+            if winner is None and len(attempts) < len(providers):
+                timeout = max(0.0, next_hedge - clock())
+            try:
+                attempt, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                if log:
+                    log(f"⏱️ {attempts[-1].provider['name']} 未在 {delay_for(attempts[-1].provider) * 1000:.0f}ms "
+                        f"内返回首 token，同时请求 {providers[len(attempts)]['name']}")
+                next_hedge = launch()
+                continue
+
+            if winner is None:
+                if kind == "token":
+                    winner = attempt
+                    ttft = clock() - attempt.started_at
+                    for other in attempts:
+                        if other is not winner and not other.cancel_event.is_set():
+                            # 输掉的请求没有真实的首 token 延迟 (被截断的时间会把主服务的 p90 越推越高、
+                            # 把刚启动的备用服务拉到接近 0)，不记录
+                            other.cancel()
+                    if stats is not None:
+                        stats.record(provider_key(winner.provider), ttft)
+                    if on_winner is not None:
+                        on_winner(winner.provider)
+                    if log and len(attempts) > 1:
+                        log(f"🏁 {winner.provider['name']} 抢先返回 (首 token {ttft * 1000:.0f}ms)")
+                else:
+                    # 报错或空回答：这个服务出局，没有其他在跑的请求时马上启用下一个
+                    attempt.cancel()
+                    if kind == "error":
+                        last_error = value
+                        if log:
+                            log(f"⚠️ {attempt.provider['name']} 请求失败: {value}")
+                    if not running():
+                        if len(attempts) < len(providers):
+                            next_hedge = launch()
+                            continue
+                        if last_error is not None:
+                            raise last_error
+                        return
+                    continue
+
+            if attempt is not winner:
+                continue
+            if kind == "token":
+                yield value
+            elif kind == "done":
+                return
+            else:
+                raise value
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+            if abort is not None:
+                abort.unregister(attempt.cancel)
@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.config import CONFIG_FILE
+
+# 与 config.json 放在同一目录
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "history.db")
+
+PREVIEW_CHARS = 120
+# trigram 分词器按 3 个字符切分，中文也能做子串搜索；更短的关键词退回 LIKE
+MIN_FTS_CHARS = 3
+
+
+def _fts_query(query):
+    """每个关键词加引号 (转义其中的引号)，多个关键词之间是 AND"""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+
+class HistoryStore:
+    """
+    结果历史 (SQLite + FTS5 全文索引)
+    按保留天数和总大小上限淘汰最旧的记录
+    """
+
+    def __init__(self, path=HISTORY_FILE, max_bytes=100 * 1024 * 1024, retention_days=180, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.retention_days = retention_days
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL + NORMAL：每条记录的提交不会等 fsync，界面线程写入也不卡
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY,
+                created REAL NOT NULL,
+                task TEXT NOT NULL,
+                model TEXT NOT NULL,
+                source TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                timings TEXT NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_created ON history (created);
+        """)
+        self.fts_enabled = self._create_fts()
+        self._db.commit()
+        # 总大小和最旧记录的时间只在打开时查一次，之后随增删维护；add 不用每次扫全表
+        self._total, self._oldest = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0), MIN(created) FROM history").fetchone()
+
+    def _create_fts(self):
+        # 外部内容表：索引只存分词结果，原文还在 history 表里；触发器保持同步
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._db.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+                        source, answer, content='history', content_rowid='id', tokenize='{tokenizer}')
+                """)
+                break
+            except sqlite3.OperationalError:
+                continue
+        else:
+            return False  # 编译时没带 FTS5，只能用 LIKE 搜索
+        self._db.executescript("""
+            CREATE TRIGGER IF NOT EXISTS history_ai AFTER INSERT ON history BEGIN
+                INSERT INTO history_fts (rowid, source, answer) VALUES (new.id, new.source, new.answer);
+            END;
+            CREATE TRIGGER IF NOT EXISTS history_ad AFTER DELETE ON history BEGIN
+                INSERT INTO history_fts (history_fts, rowid, source, answer)
+                VALUES ('delete', old.id, old.source, old.answer);
+            END;
+        """)
+        return True
+
+    def add(self, task, model, source, answer, timings=None):
+        """
+        :param timings: {阶段: 秒}
+        :return: 新记录的 id
+        """
+        now = self._clock()
+        size = len(source.encode("utf-8")) + len(answer.encode("utf-8"))
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO history (created, task, model, source, answer, timings, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (now, task, model or "", source, answer, json.dumps(timings or {}), size))
+            self._total += size
+            if self._oldest is None:
+                self._oldest = now
+            self._prune(now)
+            self._db.commit()
+            return cursor.lastrowid
+
+    def _prune(self, now):
+        cutoff = now - self.retention_days * 86400 if self.retention_days else None
+        if cutoff is not None and self._oldest is not None and self._oldest < cutoff:
+            expired = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM history WHERE created < ?",
+                                       (cutoff,)).fetchone()[0]
+            self._db.execute("DELETE FROM history WHERE created < ?", (cutoff,))
+            self._total -= expired
+            self._oldest = self._db.execute("SELECT MIN(created) FROM history").fetchone()[0]
+        if self._total <= self.max_bytes:
+            return
+        # 从最旧的开始删，直到总大小回到上限以内 (每次只取一小批，不读整张表)
+        while self._total > self.max_bytes:
+            rows = self._db.execute("SELECT id, size FROM history ORDER BY id LIMIT 32").fetchall()
+            if not rows:
+                self._total = 0
+                break
+            for row_id, size in rows:
+                if self._total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM history WHERE id = ?", (row_id,))
+                self._total -= size
+        self._oldest = self._db.execute("SELECT MIN(created) FROM history").fetchone()[0]
+
+    def search(self, query="", limit=50, before_id=None):
+        """
+        按时间倒序返回一页记录 (不含完整回答)，翻页时传入上一页最后一条的 id
+        :return: [{"id", "created", "task", "model", "preview"}]
+        """
+        query = query.strip()
+        conditions = []
+        params = []
+        if before_id is not None:
+            conditions.append("h.id < ?")
+            params.append(before_id)
+        if query:
+            if self.fts_enabled and all(len(term) >= MIN_FTS_CHARS for term in query.split()):
+                conditions.append("h.id IN (SELECT rowid FROM history_fts WHERE history_fts MATCH ?)")
+                params.append(_fts_query(query))
+            else:
+                for term in query.split():
+                    pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                    conditions.append("(h.source LIKE ? ESCAPE '\\' OR h.answer LIKE ? ESCAPE '\\')")
+                    params.extend([pattern, pattern])
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        sql = (f"SELECT h.id, h.created, h.task, h.model, substr(h.source, 1, {PREVIEW_CHARS}) "
+               f"FROM history h {where} ORDER BY h.id DESC LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+        return [{"id": row[0], "created": row[1], "task": row[2], "model": row[3], "preview": row[4]}
+                for row in rows]
+
+    def get(self, entry_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, created, task, model, source, answer, timings FROM history WHERE id = ?",
+                (entry_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "created": row[1], "task": row[2], "model": row[3], "source": row[4],
+                "answer": row[5], "timings": json.loads(row[6])}
+
+    def delete(self, entry_id):
+        with self._lock:
+            row = self._db.execute("SELECT size FROM history WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                return
+            self._db.execute("DELETE FROM history WHERE id = ?", (entry_id,))
+            self._db.commit()
+            self._total -= row[0]
+            self._oldest = self._db.execute("SELECT MIN(created) FROM history").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM history")
+            self._db.commit()
+            self._total, self._oldest = 0, None
+            self._db.execute("VACUUM")
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM history").fetchone()
+        return {"items": count, "bytes": total, "fts": self.fts_enabled}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,145 @@
+"""
+连接正在运行的 SyntaxLens，复用它已经预热的 AI 客户端和回答缓存
+
+    from core.ipc_client import IpcClient
+
+    with IpcClient() as client:
+        for delta in client.analyze("I has a pen.", task="grammar"):
+            print(delta, end="", flush=True)
+        print(client.stats())
+"""
+import itertools
+import os
+import socket
+import sys
+from collections import deque
+
+from core.ipc_protocol import IPC_SERVER_NAME, FrameDecoder, encode_frame
+
+
+class IpcError(Exception):
+    pass
+
+
+def socket_path(name):
+    """QLocalServer 的监听地址：Windows 上是命名管道，其他系统是 Qt 临时目录下的 Unix socket"""
+    if sys.platform == "win32":
+        return r"\\.\pipe" + "\\" + name
+    # 与 QDir::tempPath() 一致
+    return os.path.join((os.environ.get("TMPDIR") or "/tmp").rstrip("/") or "/", name)
+
+
+class _PipeConnection:
+    def __init__(self, path):
+        self._file = open(path, "r+b", buffering=0)
+
+    def send(self, data):
+        self._file.write(data)
+
+    def recv(self):
+        return self._file.read(65536)
+
+    def close(self):
+        self._file.close()
+
+
+class _SocketConnection:
+    def __init__(self, path, timeout):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(path)
+
+    def send(self, data):
+        self._socket.sendall(data)
+
+    def recv(self):
+        return self._socket.recv(65536)
+
+    def close(self):
+        self._socket.close()
+
+
+class IpcClient:
+    """
+    一个连接上可以同时进行多个请求，响应按请求 id 分发
+    不是线程安全的：多线程并发请求时每个线程用自己的 IpcClient
+    """
+
+    def __init__(self, name=IPC_SERVER_NAME, timeout=30.0):
+        path = socket_path(name)
+        try:
+            if sys.platform == "win32":
+                self._conn = _PipeConnection(path)
+            else:
+                self._conn = _SocketConnection(path, timeout)
+        except OSError as e:
+            raise IpcError(f"SyntaxLens 没有在运行 ({path}): {e}")
+        self._decoder = FrameDecoder()
+        self._inbox = {}  # 请求 id -> 还没取走的响应
+        self._ids = itertools.count(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def _request(self, cmd, **fields):
+        request_id = next(self._ids)
+        self._inbox[request_id] = deque()
+        self._conn.send(encode_frame(dict(fields, id=request_id, cmd=cmd)))
+        return request_id
+
+    def _next(self, request_id):
+        inbox = self._inbox[request_id]
+        while not inbox:
+            data = self._conn.recv()
+            if not data:
+                raise IpcError("连接已断开")
+            for message in self._decoder.feed(data):
+                # 已经结束 (被丢弃) 的请求的迟到响应直接忽略
+                queue = self._inbox.get(message.get("id"))
+                if queue is not None:
+                    queue.append(message)
+        return inbox.popleft()
+
+    def _reply(self, request_id):
+        message = self._next(request_id)
+        del self._inbox[request_id]
+        if message.get("event") == "error":
+            raise IpcError(message.get("message"))
+        return message
+
+    def start_analyze(self, text, task="grammar"):
+        """发出请求但不等待，返回请求 id，之后用 stream(id) 读取"""
+        return self._request("analyze", text=text, task=task)
+
+    def stream(self, request_id):
+        """逐个返回回答的 Markdown 增量"""
+        try:
+            while True:
+                message = self._next(request_id)
+                event = message.get("event")
+                if event == "delta":
+                    yield message["text"]
+                elif event == "done":
+                    return
+                elif event == "error":
+                    raise IpcError(message.get("message"))
+        finally:
+            self._inbox.pop(request_id, None)
+
+    def analyze(self, text, task="grammar"):
+        return self.stream(self.start_analyze(text, task))
+
+    def cancel(self, request_id):
+        self._reply(self._request("cancel", target=request_id))
+
+    def stats(self):
+        return self._reply(self._request("stats"))["stats"]
+
+    def show(self):
+        self._reply(self._request("show"))
@@ -0,0 +1,64 @@
+import json
+import struct
+
+# 单实例检测和外部工具共用的本地 socket 名 (Windows 上是命名管道)
+IPC_SERVER_NAME = "SyntaxLens_IPC_Server_v002"
+
+# 帧格式：4 字节大端长度 + UTF-8 JSON
+#   请求  {"id": n, "cmd": "analyze", "text": "...", "task": "grammar" | "translate"}
+#         {"id": n, "cmd": "cancel", "target": 要取消的请求 id}
+#         {"id": n, "cmd": "stats"} / {"id": n, "cmd": "show"}
+#   响应  {"id": n, "event": "delta", "text": "..."} ... {"id": n, "event": "done", "chars": 总字符数}
+#         {"id": n, "event": "error", "message": "..."} / {"id": n, "event": "ok"}
+#         {"id": n, "event": "stats", "stats": {...}}
+_LENGTH = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+
+# 旧版本第二个实例发送的裸命令 (没有长度前缀)
+LEGACY_SHOW = b"SHOW"
+
+TASKS = ("grammar", "translate")
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(message):
+    body = json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(body) > MAX_FRAME:
+        raise ProtocolError(f"frame too large: {len(body)} bytes")
+    return _LENGTH.pack(len(body)) + body
+
+
+class FrameDecoder:
+    """增量拆帧：feed() 任意长度的字节，返回其中完整的消息"""
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= _LENGTH.size:
+            (length,) = _LENGTH.unpack_from(self._buffer, 0)
+            if length > self.max_frame:
+                raise ProtocolError(f"frame too large: {length} bytes")
+            end = _LENGTH.size + length
+            if len(self._buffer) < end:
+                break
+            body = bytes(self._buffer[_LENGTH.size:end])
+            del self._buffer[:end]
+            try:
+                message = json.loads(body.decode("utf-8"))
+            except ValueError as e:
+                raise ProtocolError(f"invalid frame: {e}")
+            if not isinstance(message, dict):
+                raise ProtocolError("frame is not an object")
+            messages.append(message)
+        return messages
+
+    @property
+    def pending_bytes(self):
+        return len(self._buffer)
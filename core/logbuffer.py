@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import deque
+
+INFO = "INFO"
+WARNING = "WARNING"
+ERROR = "ERROR"
+
+
+def guess_level(message):
+    """现有日志都以表情开头，按前缀推断级别"""
+    if message.startswith(("❌", "错误")):
+        return ERROR
+    if message.startswith("⚠️"):
+        return WARNING
+    return INFO
+
+
+class LogRecord:
+    __slots__ = ("seq", "created", "level", "message")
+
+    def __init__(self, seq, created, level, message):
+        self.seq = seq
+        self.created = created
+        self.level = level
+        self.message = message
+
+    def format(self, date=False):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S" if date else "%H:%M:%S", time.localtime(self.created))
+        if date:
+            return f"{stamp} {self.level:<7} {self.message}"
+        return f"{stamp} {self.message}"
+
+
+class LogBuffer:
+    """
+    线程安全的日志环形缓冲：任意线程都可以 log()，界面按定时器批量取走新记录
+    配置了 path 时，flush_file() 把新记录追加到文件，超过 max_bytes 时轮转 (path.1 ... path.N)
+    """
+
+    def __init__(self, capacity=2000, path=None, max_bytes=1024 * 1024, backups=3, clock=time.time):
+        self.capacity = capacity
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=capacity)
+        self._unwritten = deque(maxlen=capacity)  # 还没写进文件的记录 (同样有上限)
+        self._seq = 0
+
+    @property
+    def last_seq(self):
+        with self._lock:
+            return self._seq
+
+    def log(self, message, level=None):
+        with self._lock:
+            self._seq += 1
+            record = LogRecord(self._seq, self._clock(), level or guess_level(message), message)
+            self._records.append(record)
+            if self.path:
+                self._unwritten.append(record)
+        return record
+
+    def since(self, seq):
+        """seq 之后的记录 (已被环形缓冲覆盖的不再返回)"""
+        with self._lock:
+            if not self._records or self._records[-1].seq <= seq:
+                return []
+            skip = max(0, seq - self._records[0].seq + 1)
+            return [self._records[i] for i in range(skip, len(self._records))]
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._records)
+
+    def set_path(self, path, max_bytes=None, backups=None):
+        with self._lock:
+            self.path = path or None
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if backups is not None:
+                self.backups = backups
+            if not self.path:
+                self._unwritten.clear()
+
+    def flush_file(self):
+        """把新记录一次性追加到日志文件；没有配置文件或没有新记录时什么都不做"""
+        with self._lock:
+            if not self.path or not self._unwritten:
+                return 0
+            records = list(self._unwritten)
+            self._unwritten.clear()
+            path, max_bytes, backups = self.path, self.max_bytes, self.backups
+
+        data = "".join(record.format(date=True) + "\n" for record in records).encode("utf-8")
+        if max_bytes and os.path.exists(path) and os.path.getsize(path) + len(data) > max_bytes:
+            self._rotate(path, backups)
+        with open(path, "ab") as f:
+            f.write(data)
+        return len(records)
+
+    @staticmethod
+    def _rotate(path, backups):
+        if backups <= 0:
+            os.remove(path)
+            return
+        for i in range(backups - 1, 0, -1):
+            older = f"{path}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
@@ -0,0 +1,179 @@
+import queue
+import re
+import threading
+
+# 句末标点 (英文句号后面要跟空白或结尾，避免把 3.14 / e.g. 中间切开)
+_SENTENCE_END = re.compile(r'[.!?]+["\'”’)\]]*(?=\s|$)|[。！？；]+["”’」』）]*')
+_PARAGRAPH_GAP = re.compile(r'\n[ \t]*\n\s*')
+_FIXED = re.compile(r'<fixed>(.*?)</fixed>', re.DOTALL)
+
+SEGMENT_SEPARATOR = "\n\n---\n\n"
+
+
+def _trim(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _paragraph_spans(text):
+    spans = []
+    pos = 0
+    for match in _PARAGRAPH_GAP.finditer(text):
+        spans.append((pos, match.start()))
+        pos = match.end()
+    spans.append((pos, len(text)))
+    return spans
+
+
+def _sentence_spans(text, start, end):
+    spans = []
+    pos = start
+    for match in _SENTENCE_END.finditer(text, start, end):
+        spans.append((pos, match.end()))
+        pos = match.end()
+    spans.append((pos, end))
+    return spans
+
+
+def _hard_spans(text, start, end, max_chars):
+    """没有句末标点的超长句：尽量在空白处切，实在没有就硬切"""
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+
+def split_text(text, max_chars):
+    """
+    在段落 / 句子边界把长文本切成不超过 max_chars 的片段 (相邻的短段落会合并到同一片段)
+    :return: [(前面的间隔文本, 片段)]，依次拼接即为原文 (去掉首尾空白)
+    """
+    units = []
+    for p_start, p_end in _paragraph_spans(text):
+        p_start, p_end = _trim(text, p_start, p_end)
+        if p_start == p_end:
+            continue
+        if p_end - p_start <= max_chars:
+            units.append((p_start, p_end))
+            continue
+        for s_start, s_end in _sentence_spans(text, p_start, p_end):
+            s_start, s_end = _trim(text, s_start, s_end)
+            if s_start < s_end:
+                units.extend(_hard_spans(text, s_start, s_end, max_chars))
+
+    segments = []
+    for start, end in units:
+        if segments and end - segments[-1][0] <= max_chars:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+
+    result = []
+    previous_end = None
+    for start, end in segments:
+        gap = "" if previous_end is None else text[previous_end:start]
+        result.append((gap, text[start:end]))
+        previous_end = end
+    return result
+
+
+def _join_gap(gap):
+    # 拼接纠错结果时把原文的间隔规整成 段落 / 换行 / 空格 / 无
+    if "\n\n" in gap or gap.count("\n") > 1:
+        return "\n\n"
+    if "\n" in gap:
+        return "\n"
+    return " " if gap else ""
+
+
+def combine_fixed(segments, answers):
+    """
+    把每段回答里的 <fixed> 结果按原文顺序拼成完整的纠错文本
+    某段没有 <fixed> 时用原文代替
+    """
+    parts = []
+    for (gap, original), answer in zip(segments, answers):
+        matches = _FIXED.findall(answer or "")
+        fixed = matches[-1].strip() if matches else original
+        parts.append((_join_gap(gap) if parts else "") + fixed)
+    return "".join(parts)
+
+
+def ordered_merge(factories, max_workers=4, separator=SEGMENT_SEPARATOR, on_error=None):
+    """
+    并发运行多个流 (最多 max_workers 个同时进行)，按原顺序输出：
+    第一段实时输出，后面的段先在后台缓冲，轮到它时先吐出缓冲再接着实时输出。
+    :param factories: [无参函数 -> 文本增量迭代器]
+    :param on_error: on_error(index, exception) -> 替代文本；None 表示直接抛出
+    提前关闭生成器会通知所有后台线程停止。
+    """
+    count = len(factories)
+    events = queue.Queue()
+    cancel_event = threading.Event()
+    pending = iter(range(count))
+    pending_lock = threading.Lock()
+
+    def worker():
+        while not cancel_event.is_set():
+            with pending_lock:
+                index = next(pending, None)
+            if index is None:
+                return
+            error = None
+            stream = None
+            try:
+                stream = factories[index]()
+                for delta in stream:
+                    if cancel_event.is_set():
+                        break
+                    events.put((index, "delta", delta))
+            except Exception as e:
+                error = e
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    try:
+                        close()
+                    except Exception:
+                        pass
+            events.put((index, "done", error))
+
+    for _ in range(max(1, min(max_workers, count))):
+        threading.Thread(target=worker, daemon=True).start()
+
+    buffers = [[] for _ in range(count)]
+    done = [False] * count
+    errors = [None] * count
+    current = 0
+    try:
+        while current < count:
+            index, kind, value = events.get()
+            if kind == "delta":
+                buffers[index].append(value)
+            else:
+                done[index] = True
+                errors[index] = value
+
+            while current < count:
+                if buffers[current]:
+                    pending_deltas, buffers[current] = buffers[current], []
+                    yield from pending_deltas
+                if not done[current]:
+                    break
+                if errors[current] is not None:
+                    if on_error is None:
+                        raise errors[current]
+                    yield on_error(current, errors[current])
+                current += 1
+                if current < count:
+                    yield separator
+    finally:
+        cancel_event.set()
@@ -0,0 +1,127 @@
+import re
+
+# 与 WorkflowThread 原先的一次性渲染保持同样的扩展
+MARKDOWN_EXTRAS = ["break-on-newline", "fenced-code-blocks"]
+
+# markdown2 的围栏代码块：行首可缩进，3 个以上反引号，闭合行必须与开头完全一致
+_FENCE_OPEN_RE = re.compile(r"^([ \t]*`{3,})\s*([\w+-]+)?\s*$")
+# 列表项 / 引用 / 缩进 / HTML 开头的行 (以及还没写完的序号) 可能与上一块合并，不能作为冻结边界
+_LIST_ITEM_RE = re.compile(r"^([-*+]|\d+[.)])(\s|$)")
+# 引用式链接定义会影响整篇文档，出现后退回整篇渲染
+_LINK_DEF_RE = re.compile(r"^[ ]{0,3}\[[^\]\n]+\]:", re.M)
+
+
+class IncrementalMarkdown:
+    """
+    流式 Markdown 增量渲染器
+    已完成的块 (段落、标题、闭合的代码块) 渲染一次后冻结，每个 chunk 只重渲染末尾未完成的块。
+    任意时刻 html 都与对全文一次性调用 markdown2.markdown 的结果一致。
+    """
+
+    def __init__(self, extras=None):
+        import markdown2
+        self._markdown = markdown2.markdown
+        self.extras = list(extras or MARKDOWN_EXTRAS)
+
+        self._frozen_text = []  # 已冻结的原文片段
+        self._frozen_html = []  # 对应的 HTML 片段 (除第一个外均带块间分隔符)
+        self._pending = ""  # 尚未冻结的尾部原文
+        self._tail_html = ""
+        self._full_mode = False  # 出现链接定义后退化为整篇渲染
+
+    @property
+    def text(self):
+        return "".join(self._frozen_text) + self._pending
+
+    @property
+    def frozen_html(self):
+        return "".join(self._frozen_html)
+
+    @property
+    def tail_html(self):
+        return self._tail_html
+
+    @property
+    def html(self):
+        return self.frozen_html + self._tail_separator() + self._tail_html
+
+    @property
+    def frozen_blocks(self):
+        return len(self._frozen_html)
+
+    def feed(self, delta):
+        """
+        追加一段流式文本
+        :return: (本次新冻结的 HTML, 当前尾部 HTML)
+        """
+        self._pending += delta
+
+        if not self._full_mode and _LINK_DEF_RE.search(self._pending):
+            # 链接定义可能被前面已冻结的块引用，全部解冻
+            self._full_mode = True
+            self._pending = self.text
+            self._frozen_text.clear()
+            self._frozen_html.clear()
+
+        new_frozen = []
+        if not self._full_mode:
+            cut = self._find_boundary(self._pending)
+            if cut:
+                block = self._pending[:cut]
+                self._pending = self._pending[cut:]
+                html = self._markdown(block, extras=self.extras)
+                if self._frozen_html:
+                    html = "\n" + html
+                self._frozen_text.append(block)
+                self._frozen_html.append(html)
+                new_frozen.append(html)
+
+        # 只有空行的尾部在整篇渲染中不产生任何输出
+        self._tail_html = self._markdown(self._pending, extras=self.extras) if self._pending.strip() else ""
+        return "".join(new_frozen), self._tail_separator() + self._tail_html
+
+    def _tail_separator(self):
+        # markdown2 的块之间以空行分隔，每个块自带结尾换行
+        return "\n" if self._frozen_html and self._tail_html else ""
+
+    @staticmethod
+    def _is_safe_start(line):
+        if not line or line[0].isspace() or line[0] in "><" or line.isdigit():
+            return False
+        return not _LIST_ITEM_RE.match(line)
+
+    @classmethod
+    def _find_boundary(cls, text):
+        """返回最后一个可以安全切分的位置 (其之前的内容不会再变化)，没有则返回 0"""
+        cut = 0
+        pos = 0
+        fence = None
+        prev_blank = False
+        prev_closed_fence = False
+        # 缩进代码块会被 markdown2 折叠成一行，可能把后面的段落并入前面的引用块
+        last_indented = False
+
+        for line in text.splitlines(keepends=True):
+            content = line.rstrip("\r\n")
+            if pos and fence is None:
+                if (prev_blank or prev_closed_fence) and not last_indented and cls._is_safe_start(content):
+                    cut = pos
+            if not line.endswith("\n"):
+                break  # 末尾未写完的行只用来判断上一块是否结束
+
+            prev_closed_fence = False
+            if fence is not None:
+                if content.rstrip(" \t") == fence:
+                    prev_closed_fence = not fence[0].isspace()
+                    fence = None
+                prev_blank = False
+            else:
+                match = _FENCE_OPEN_RE.match(content)
+                if match:
+                    fence = match.group(1)
+                prev_blank = not content.strip()
+                if not prev_blank:
+                    last_indented = content[0].isspace()
+            pos += len(line)
+
+        return cut
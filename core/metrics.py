@@ -0,0 +1,228 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from core.capture_stats import percentile
+
+# 直方图桶上界 (秒)，覆盖 1ms ~ 30s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RESERVOIR_SIZE = 1024  # 分位数只看最近这么多个样本
+
+# 工作流各阶段 (按顺序)，每个阶段的耗时 = 本阶段结束时刻 - 上一个阶段结束时刻
+STAGES = ("queue", "capture", "dictionary", "setup", "cache", "ttft", "stream", "render")
+# 取词期间在后台并行执行的阶段
+PARALLEL_STAGES = ("prepare", "connect")
+
+STAGE_METRIC = "syntaxlens_stage_seconds"
+TASK_METRIC = "syntaxlens_tasks_total"
+
+
+class Histogram:
+    """累计桶计数 (导出 Prometheus 用) + 最近样本 (算 p50/p95/p99 用)"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantile(self, q):
+        return percentile(self.recent, q)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    进程内的延迟直方图和计数器 (线程安全)
+    导出为 JSON (to_json) 或 Prometheus 文本格式 (to_prometheus)
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.monotonic):
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}  # (name, labels) -> int
+        self.help = {
+            STAGE_METRIC: "Latency of each SyntaxLens workflow stage",
+            TASK_METRIC: "Finished SyntaxLens tasks by outcome",
+        }
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def trace(self, start=None, **labels):
+        return Trace(self, self.clock() if start is None else start, labels)
+
+    def summary(self, name, **labels):
+        with self._lock:
+            histogram = self._histograms.get((name, _label_key(labels)))
+            return histogram.summary() if histogram else None
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [{"name": name, "labels": dict(labels), **h.summary()}
+                          for (name, labels), h in sorted(self._histograms.items())]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {"histograms": histograms, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        with self._lock:
+            histograms = sorted((k, h.buckets, list(h.counts), h.count, h.sum) for k, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), buckets, counts, count, total in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """按扩展名写出快照：.prom / .txt 为 Prometheus 文本格式，其余为 JSON (先写临时文件再替换)"""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def format_table(self, name=STAGE_METRIC):
+        """统计页用的文本表格 (毫秒)"""
+        rows = [h for h in self.snapshot()["histograms"] if h["name"] == name]
+        if not rows:
+            return "暂无数据，完成一次取词后再来看看。"
+
+        order = {stage: i for i, stage in enumerate(STAGES + PARALLEL_STAGES + ("total",))}
+        rows.sort(key=lambda h: (h["labels"].get("task", ""), order.get(h["labels"].get("stage"), 99)))
+        lines = [f"{'任务':<10}{'阶段':<10}{'次数':>6}{'p50':>9}{'p95':>9}{'p99':>9}"]
+        for h in rows:
+            lines.append(f"{h['labels'].get('task', '-'):<10}{h['labels'].get('stage', '-'):<10}{h['count']:>6}"
+                         + "".join(f"{h[q] * 1000:>9.1f}" for q in ("p50", "p95", "p99")))
+        return "\n".join(lines)
+
+
+class Trace:
+    """
+    一次任务的各阶段时间戳 (可以跨线程 mark)
+    mark(stage) 表示该阶段在此刻结束；finish() 时才把各阶段耗时写进直方图，
+    被取消或出错的任务只计数，不进入延迟统计
+    """
+
+    def __init__(self, registry, start, labels):
+        self.registry = registry
+        self.start = start
+        self.labels = labels
+        self.marks = []
+        self.spans = []  # 与主流程并行的阶段 [(阶段, 开始时刻, 结束时刻)]
+        self.outcome = "ok"
+        self._finished = False
+
+    def mark(self, stage):
+        self.marks.append((stage, self.registry.clock()))
+
+    def now(self):
+        return self.registry.clock()
+
+    def span(self, stage, start, end=None):
+        """记录一个并行阶段 (例如取词期间后台建立连接)，start / end 取自 now()"""
+        self.spans.append((stage, start, self.registry.clock() if end is None else end))
+
+    def timeline(self):
+        """
+        :return: [(阶段, 相对任务开始的起点秒数, 终点秒数)]，顺序阶段和并行阶段按起点排序
+        """
+        rows = []
+        previous = self.start
+        for stage, at in self.marks:
+            rows.append((stage, previous - self.start, at - self.start))
+            previous = at
+        rows.extend((stage, begin - self.start, end - self.start) for stage, begin, end in self.spans)
+        rows.sort(key=lambda row: row[1])
+        return rows
+
+    def stages(self):
+        result = []
+        previous = self.start
+        for stage, at in self.marks:
+            result.append((stage, at - previous))
+            previous = at
+        return result
+
+    def finish(self, outcome=None):
+        if self._finished:
+            return
+        self._finished = True
+        if outcome is not None:
+            self.outcome = outcome
+        self.registry.inc(TASK_METRIC, outcome=self.outcome, **self.labels)
+        if self.outcome != "ok":
+            return
+        for stage, seconds in self.stages():
+            self.registry.observe(STAGE_METRIC, seconds, stage=stage, **self.labels)
+        for stage, begin, end in self.spans:
+            self.registry.observe(STAGE_METRIC, end - begin, stage=stage, **self.labels)
+        if self.marks:
+            self.registry.observe(STAGE_METRIC, self.marks[-1][1] - self.start, stage="total", **self.labels)
@@ -0,0 +1,270 @@
+import email.utils
+import random
+import threading
+import time
+
+from core.hedging import provider_key
+
+BURST_SECONDS = 10  # 令牌桶容量 = 这么多秒的配额，允许短时突发
+COMPLETION_TOKENS_GUESS = 512  # 流式响应拿不到 usage，按提示词长度 + 这个数预估 token
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+MAX_RETRY_AFTER = 60.0
+
+
+class TokenBucket:
+    """按 rate (每秒) 补充、最多 capacity 的令牌桶；rate <= 0 表示不限"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.level = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    @property
+    def unlimited(self):
+        return self.rate <= 0
+
+    def _refill(self):
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount):
+        """还要等多少秒才能取出 amount (超过容量的请求只要求桶是满的)"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if not self.unlimited:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """
+    单个 AI 服务的客户端限流：
+    - 请求数 / token 数令牌桶 (按每分钟配额补充)
+    - AIMD 并发上限：成功一次 +1/limit，被限流 (429) 时减半；Retry-After 期间暂停发出新请求
+    acquire() 阻塞到可以发出请求为止，返回的许可必须 release()
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_concurrency=4, min_concurrency=1, clock=time.monotonic):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.requests = TokenBucket(rpm / 60.0, rpm / 60.0 * BURST_SECONDS, clock)
+        self.tokens = TokenBucket(tpm / 60.0, tpm / 60.0 * BURST_SECONDS, clock)
+        self._clock = clock
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+
+        self.granted = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+    def acquire(self, cost=1, cancelled=None, poll=0.1):
+        """
+        :param cost: 预估的 token 数
+        :param cancelled: 无参函数，返回 True 时放弃等待并返回 False
+        """
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    if cancelled is not None and cancelled():
+                        return False
+                    now = self._clock()
+                    wait = max(self.paused_until - now, 0.0)
+                    if not wait and self.in_flight >= int(self.limit):
+                        wait = poll  # 等 release() 唤醒
+                    if not wait:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+                    if not wait:
+                        self.requests.take(1)
+                        self.tokens.take(cost)
+                        self.in_flight += 1
+                        self.granted += 1
+                        return True
+                    self._cond.wait(min(wait, poll))
+            finally:
+                self.waiting -= 1
+
+    def release(self, outcome="ok", retry_after=None):
+        """
+        :param outcome: "ok" 成功；"throttled" 被 429 限流；"error" 其他失败 (不影响并发上限)；
+                        "cancelled" 调用方中途放弃 (什么都不记)
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            elif outcome == "throttled":
+                self.throttled += 1
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, self._clock() + retry_after)
+            elif outcome == "error":
+                self.failures += 1
+            self._cond.notify_all()
+
+    def note_retry(self):
+        with self._cond:
+            self.retries += 1
+
+    def stats(self):
+        with self._cond:
+            self.requests._refill()
+            self.tokens._refill()
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "paused_ms": max(0, round((self.paused_until - self._clock()) * 1000)),
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "failures": self.failures,
+                "request_bucket": None if self.requests.unlimited else round(self.requests.level, 1),
+                "token_bucket": None if self.tokens.unlimited else round(self.tokens.level),
+            }
+
+
+class RateLimits:
+    """各服务各自的 RateLimiter，第一次用到时按当前配置创建"""
+
+    def __init__(self, cfg, clock=time.monotonic):
+        self.cfg = cfg
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._limiters = {}
+
+    def get(self, provider):
+        key = provider_key(provider)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = RateLimiter(
+                    rpm=self.cfg.get("rate_limit_rpm") or 0,
+                    tpm=self.cfg.get("rate_limit_tpm") or 0,
+                    max_concurrency=self.cfg.get("max_concurrent_requests") or 1,
+                    clock=self._clock)
+            return limiter
+
+    def reset(self):
+        """配置变化后重新按新配额创建 (正在进行的请求仍持有旧的限流器)"""
+        with self._lock:
+            self._limiters.clear()
+
+    def stats(self):
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {key: limiter.stats() for key, limiter in limiters.items()}
+
+    def format_table(self):
+        stats = self.stats()
+        if not stats:
+            return ""
+        lines = [f"{'服务':<32}{'并发上限':>8}{'进行中':>7}{'等待':>6}{'限流':>6}{'重试':>6}"]
+        for key, s in stats.items():
+            lines.append(f"{key[:31]:<32}{s['limit']:>8}{s['in_flight']:>7}{s['waiting']:>6}"
+                         f"{s['throttled']:>6}{s['retries']:>6}")
+        return "\n".join(lines)
+
+
+def estimate_tokens(messages):
+    # 粗略估计：每 3 个字符 1 个 token
+    return sum(len(m.get("content") or "") for m in messages) // 3 + COMPLETION_TOKENS_GUESS
+
+
+def parse_retry_after(headers):
+    """Retry-After (秒数或 HTTP 日期) / retry-after-ms，返回秒数或 None"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return min(MAX_RETRY_AFTER, max(0.0, float(value) / 1000))
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return min(MAX_RETRY_AFTER, max(0.0, float(value)))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return min(MAX_RETRY_AFTER, max(0.0, when.timestamp() - time.time()))
+
+
+def classify_error(error):
+    """
+    :return: (是否可以重试, 是否被限流, Retry-After 秒数)
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        response = getattr(error, "response", None)
+        retry_after = parse_retry_after(getattr(response, "headers", None))
+        return status in RETRYABLE_STATUS, status == 429, retry_after
+    try:
+        from openai import APIConnectionError
+    except ImportError:  # pragma: no cover
+        return False, False, None
+    # 连接失败 / 超时 (APITimeoutError 是它的子类)
+    return isinstance(error, APIConnectionError), False, None
+
+
+def limited_stream(limiter, open_stream, cost=1, max_retries=3, base_delay=0.5, cancelled=None, log=None,
+                   sleep=time.sleep, rng=random):
+    """
+    在限流器的许可下打开流；还没收到任何内容就失败 (429 / 5xx / 连接错误) 时带抖动退避重试。
+    已经输出过内容的流失败时直接抛出，不能重来。
+    :param open_stream: 无参函数 -> 文本增量迭代器
+    """
+    attempt = 0
+    while True:
+        if not limiter.acquire(cost, cancelled=cancelled):
+            return
+        streamed = False
+        outcome = "cancelled"  # 生成器被提前关闭时保持这个值
+        retry_after = None
+        stream = None
+        try:
+            stream = open_stream()
+            for content in stream:
+                streamed = True
+                yield content
+            outcome = "ok"
+            return
+        except Exception as e:
+            if cancelled is not None and cancelled():
+                return  # 任务取消时读取被打断，不算失败也不重试
+            retryable, throttled, retry_after = classify_error(e)
+            outcome = "throttled" if throttled else "error"
+            if streamed or not retryable or attempt >= max_retries:
+                raise
+            # Full jitter: 0 ~ base * 2^attempt，服务端给了 Retry-After 时至少等这么久
+            delay = max(rng.uniform(0, base_delay * (2 ** attempt)), retry_after or 0.0)
+            if log:
+                log(f"🔁 请求失败 ({e.__class__.__name__})，{delay * 1000:.0f}ms 后第 {attempt + 1} 次重试")
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            limiter.release(outcome, retry_after)
+
+        limiter.note_retry()
+        attempt += 1
+        sleep(delay)
+        if cancelled is not None and cancelled():
+            return
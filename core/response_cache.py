@@ -0,0 +1,331 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import CONFIG_FILE
+
+# 与 config.json 放在同一目录
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "response_cache.db")
+
+
+def normalize_text(text):
+    """只折叠空白，大小写和标点都会影响回答，保持原样"""
+    return " ".join(text.split())
+
+
+def cache_key(model, base_url, system_prompt, text):
+    raw = json.dumps([model, base_url, system_prompt, normalize_text(text)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    两级回答缓存：内存 LRU + SQLite 磁盘层 (带 TTL 和总大小上限)
+    """
+
+    def __init__(self, path=CACHE_FILE, memory_items=128, max_bytes=50 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600, clock=time.time):
+        self.path = path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (answer, created)
+        self._touched = {}  # key -> 最近访问时间，还没写进磁盘层 (下次 put / close 时一起写)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, created, now):
+        return self.ttl_seconds and now - created > self.ttl_seconds
+
+    def get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self._touch(key, now)
+                self.hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._db.execute("SELECT answer, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+
+            self._touch(key, now)
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def _touch(self, key, now):
+        # 磁盘层淘汰按最近访问时间进行，命中也要更新；先记在内存里，命中时不写盘
+        self._touched[key] = now
+
+    def _write_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                 [(accessed, key) for key, accessed in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key, answer):
+        now = self._clock()
+        size = len(answer.encode("utf-8"))
+        with self._lock:
+            self._remember(key, answer, now)
+            self._write_touched()  # 淘汰之前先写入最近的访问时间
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, answer, size, now, now))
+            self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key, answer, created):
+        self._memory[key] = (answer, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 按最近访问时间从旧到新淘汰
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {"hits": self.hits, "misses": self.misses, "memory_items": len(self._memory),
+                    "disk_items": count, "disk_bytes": total}
+
+    def close(self):
+        with self._lock:
+            self._write_touched()
+            self._db.commit()
+            self._db.close()
+
+
+class SharedStream:
+    """同一个上游流的增量记录，后加入的订阅者会先回放已收到的部分"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._deltas = []
+        self._done = False
+        self._error = None
+        self.subscribers = 0  # 由 InflightRequests 在它的锁里维护
+        self.abort = None  # leader 请求的 Abort，最后一个订阅者取消时用它打断阻塞的读取
+        self.provider = None  # 实际回答的服务 (对冲时可能是备用服务)，由 leader 的请求填写
+
+    def append(self, delta):
+        with self._cond:
+            self._deltas.append(delta)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def follow(self, stopped=None):
+        """
+        从头回放并等待新的增量
+        :param stopped: 可选的无参函数，返回 True 时停止等待 (配合 wake 使用)
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._deltas) and not self._done:
+                    if stopped is not None and stopped():
+                        return
+                    self._cond.wait()
+                pending = self._deltas[index:]
+                done, error = self._done, self._error
+            for delta in pending:
+                yield delta
+            index += len(pending)
+            if done and index >= len(self._deltas):
+                if error is not None:
+                    raise error
+                return
+
+    def __iter__(self):
+        return self.follow()
+
+
+class Subscription:
+    """
+    InflightRequests.stream 返回的增量迭代器
+    cancel() 可以从别的线程调用 (任务被取消)：立即退订，没有别的订阅者时打断上游的网络读取，
+    不必等阻塞在读取上的线程收到下一个增量
+    """
+
+    def __init__(self, inflight, key, shared):
+        self._inflight = inflight
+        self.key = key
+        self.shared = shared
+        self.attached = True  # 在 InflightRequests 的锁里修改，保证只退订一次
+        self.cancelled = False
+        self._iterator = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iterator)
+
+    def close(self):
+        self._iterator.close()
+
+    def cancel(self):
+        self.cancelled = True
+        if not self._inflight._detach(self) and self.shared.abort is not None:
+            self.shared.abort.abort()
+        self.shared.wake()
+
+
+class InflightRequests:
+    """
+    相同请求合并：第一个请求者 (leader) 真正发起上游请求，
+    期间到达的相同请求直接订阅 leader 的流，不再发第二个请求。
+    按订阅者计数：leader 中途放弃 (弹窗关闭、被取代) 而还有别的订阅者时，
+    上游交给后台线程继续读完；最后一个订阅者离开时才关闭上游。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._streams)
+
+    def stream(self, key, factory, abort=None):
+        """
+        :param factory: 无参函数，返回上游增量的迭代器 (只有 leader 会调用)
+        :param abort: factory 发出的请求所用的 Abort (ai_client.Abort)，可选
+        :return: Subscription 增量迭代器
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            is_leader = shared is None
+            if is_leader:
+                shared = self._streams[key] = SharedStream()
+                shared.abort = abort
+            shared.subscribers += 1
+
+        subscription = Subscription(self, key, shared)
+        if is_leader:
+            subscription._iterator = self._lead(subscription, factory)
+        else:
+            subscription._iterator = self._follow(subscription)
+        return subscription
+
+    def _follow(self, subscription):
+        try:
+            yield from subscription.shared.follow(stopped=lambda: subscription.cancelled)
+        finally:
+            self._detach(subscription)
+
+    def _lead(self, subscription, factory):
+        key, shared = subscription.key, subscription.shared
+        upstream = None
+        handed_off = False
+        error = None
+        try:
+            upstream = iter(factory())
+            for delta in upstream:
+                shared.append(delta)
+                yield delta
+        except GeneratorExit:
+            if self._detach(subscription):
+                # 还有别的请求者在等这个回答：在后台线程里把上游读完
+                handed_off = True
+                threading.Thread(target=self._pump, args=(key, shared, upstream), daemon=True).start()
+            else:
+                error = RuntimeError("上游请求已取消")
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not handed_off:
+                _close(upstream)
+                self._end(key, shared, error)
+
+    def _pump(self, key, shared, upstream):
+        error = None
+        try:
+            for delta in upstream:
+                shared.append(delta)
+                with self._lock:
+                    if not shared.subscribers:
+                        error = RuntimeError("上游请求已取消")
+                        break
+        except Exception as e:
+            error = e
+        finally:
+            _close(upstream)
+            self._end(key, shared, error)
+
+    def _detach(self, subscription):
+        """:return: 剩下的订阅者数；没有了就不再让新请求加入这个流"""
+        shared = subscription.shared
+        with self._lock:
+            if subscription.attached:
+                subscription.attached = False
+                shared.subscribers -= 1
+                if not shared.subscribers and self._streams.get(subscription.key) is shared:
+                    del self._streams[subscription.key]
+            return shared.subscribers
+
+    def _end(self, key, shared, error):
+        with self._lock:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+        shared.finish(error)
+
+
+def _close(stream):
+    # 关闭上游 (生成器会关掉 HTTP 响应，连接回到连接池)
+    close = getattr(stream, "close", None)
+    if close is not None:
+        close()
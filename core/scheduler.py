@@ -0,0 +1,249 @@
+import itertools
+import threading
+import time
+
+from core.capture_stats import percentile
+
+POLICIES = ("latest", "fifo")
+
+QUEUED, RUNNING, DONE, CANCELLED = "queued", "running", "done", "cancelled"
+
+MAX_WAIT_SAMPLES = 200
+
+
+class Task:
+    """
+    一次热键触发的任务
+    取消置位 cancel_event，工作线程在取词前、每个 chunk 之间和写剪贴板前检查它；
+    阻塞在网络读取上的线程等不到下一个 chunk，由 on_cancel 登记的回调 (中断请求) 唤醒
+    outbox 暂存还没轮到显示的输出，轮到它时再交给弹窗重放
+    """
+
+    def __init__(self, task_id, task_type, submitted_at):
+        self.id = task_id
+        self.task_type = task_type
+        self.state = QUEUED
+        self.submitted_at = submitted_at
+        self.started_at = None
+        self.finished_at = None
+        self.superseded = False
+        self.cancel_event = threading.Event()
+        self.outbox = []
+        self._on_cancel = []
+        self._cancel_lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def cancel(self):
+        with self._cancel_lock:
+            if self.cancel_event.is_set():
+                return
+            self.cancel_event.set()
+            callbacks, self._on_cancel = self._on_cancel, []
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback):
+        """登记取消时的回调 (在调用 cancel 的线程里执行)；已经取消时立即执行"""
+        with self._cancel_lock:
+            if not self.cancel_event.is_set():
+                self._on_cancel.append(callback)
+                return
+        callback()
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.task_type}, {self.state})"
+
+
+class TaskScheduler:
+    """
+    任务生命周期调度 (不依赖 Qt，由界面层在 GUI 线程里调用)
+    - latest: 新任务取代并取消所有未完成的任务，弹窗立即切到新任务
+    - fifo: 任务按提交顺序排队，超过 max_queue 个未开始的任务时拒绝新任务；
+      弹窗依次显示，关闭当前弹窗后才显示下一个
+    同时运行的任务最多 max_running 个，取词由 capture_lock 串行，网络请求和渲染可以重叠。
+    已取消但线程还没退出的任务不占 max_running 的名额 (否则连按几次热键，名额会被等待网络超时的旧任务占满)，
+    它们另有上限 max_cancelled，超过时新任务才等旧线程退出。
+    :param start: start(task) 回调，负责真正启动工作线程
+    """
+
+    def __init__(self, start, policy="latest", max_running=2, max_queue=4, max_cancelled=4, clock=time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy: {policy}")
+        self.start = start
+        self.policy = policy
+        self.max_running = max(1, max_running)
+        self.max_queue = max(0, max_queue)
+        self.max_cancelled = max(0, max_cancelled)
+        self.clock = clock
+        self.capture_lock = threading.Lock()
+
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._queue = []  # 还没开始的任务
+        self._running = []  # 工作线程还活着的任务
+        self._order = []  # 等待显示的任务 (提交顺序)，第一个就是当前显示的任务
+        self._waits = []
+
+        self.submitted = 0
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.superseded = 0
+        self.rejected = 0
+        self.max_depth = 0
+
+    @property
+    def displayed(self):
+        with self._lock:
+            return self._order[0] if self._order else None
+
+    @property
+    def queue_depth(self):
+        with self._lock:
+            return len(self._queue)
+
+    @property
+    def running_count(self):
+        with self._lock:
+            return len(self._running)
+
+    def submit(self, task_type):
+        """:return: 新任务，队列已满被拒绝时返回 None"""
+        with self._lock:
+            if self.policy == "latest":
+                for task in self._queue + self._running:
+                    if not task.cancelled:
+                        task.superseded = True
+                        self.superseded += 1
+                        self._cancel(task)
+                self._order = []
+            elif len(self._queue) >= self.max_queue and self._active_count() >= self.max_running:
+                self.rejected += 1
+                return None
+
+            task = Task(next(self._ids), task_type, self.clock())
+            self.submitted += 1
+            self._queue.append(task)
+            self._order.append(task)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            to_start = self._take_startable()
+        self._start_all(to_start)
+        return task
+
+    def finish(self, task):
+        """工作线程结束时调用 (不论成功、出错还是被取消)"""
+        with self._lock:
+            if task in self._running:
+                self._running.remove(task)
+            if task.finished:
+                return
+            task.finished_at = self.clock()
+            if task.cancelled:
+                task.state = CANCELLED
+            else:
+                task.state = DONE
+                self.completed += 1
+            to_start = self._take_startable()
+        self._start_all(to_start)
+
+    def cancel(self, task):
+        with self._lock:
+            self._cancel(task)
+            if task in self._order:
+                self._order.remove(task)
+            to_start = self._take_startable()
+        self._start_all(to_start)
+
+    def dismiss(self):
+        """
+        用户关闭了弹窗：取消当前显示的任务 (若还没结束)，返回接着要显示的任务或 None
+        """
+        with self._lock:
+            if self._order:
+                task = self._order.pop(0)
+                if not task.finished:
+                    self._cancel(task)
+            following = self._order[0] if self._order else None
+            to_start = self._take_startable()
+        self._start_all(to_start)
+        return following
+
+    def route(self, task, item):
+        """
+        决定任务的一条输出去哪：正在显示的任务返回 True (直接交给弹窗)，
+        排队等待显示的任务暂存到 outbox，已取消的任务丢弃
+        """
+        with self._lock:
+            if task.cancelled or task not in self._order:
+                return False
+            if self._order[0] is task:
+                return True
+            task.outbox.append(item)
+            return False
+
+    def take_outbox(self, task):
+        with self._lock:
+            items, task.outbox = task.outbox, []
+            return items
+
+    def stats(self):
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "policy": self.policy,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_depth,
+                "running": self._active_count(),
+                "cancelled_running": len(self._running) - self._active_count(),
+                "submitted": self.submitted,
+                "started": self.started,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "superseded": self.superseded,
+                "rejected": self.rejected,
+                "wait_p50_ms": round(percentile(waits, 0.5) * 1000, 1) if waits else None,
+                "wait_p95_ms": round(percentile(waits, 0.95) * 1000, 1) if waits else None,
+            }
+
+    def _cancel(self, task):
+        if task.cancelled or task.finished:
+            return
+        task.cancel()
+        self.cancelled += 1
+        if task in self._queue:
+            # 还没开始的任务直接结束
+            self._queue.remove(task)
+            task.state = CANCELLED
+            task.finished_at = self.clock()
+
+    def _active_count(self):
+        return sum(1 for task in self._running if not task.cancelled)
+
+    def _can_start(self):
+        if self._active_count() >= self.max_running:
+            return False
+        return len(self._running) - self._active_count() <= self.max_cancelled
+
+    def _take_startable(self):
+        to_start = []
+        while self._queue and self._can_start():
+            task = self._queue.pop(0)
+            task.state = RUNNING
+            task.started_at = self.clock()
+            self._waits = (self._waits + [task.started_at - task.submitted_at])[-MAX_WAIT_SAMPLES:]
+            self.started += 1
+            self._running.append(task)
+            to_start.append(task)
+        return to_start
+
+    def _start_all(self, tasks):
+        # 在锁外回调，start 里可以再调用调度器
+        for task in tasks:
+            self.start(task)
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+from core.config import CONFIG_FILE
+
+# 与 config.json 放在同一目录；只存签名和回答缓存的 key，回答本身仍在 response_cache.db
+SIMILAR_FILE = os.path.join(os.path.dirname(os.path.abspath(CONFIG_FILE)), "similar_index.db")
+
+NUM_PERM = 64  # MinHash 签名长度
+BANDS = 16  # LSH 分带数：16 带 x 4 行，相似度约 0.5 以上的才会成为候选
+SHINGLE_SIZE = 3  # 字符 n-gram，中英文都适用
+
+
+def normalize(text):
+    """忽略大小写、标点和空白差异 (复制时多带的句号、换行)"""
+    kept = []
+    for ch in text.lower():
+        category = unicodedata.category(ch)
+        if category[0] in "PS":
+            kept.append(" ")
+        else:
+            kept.append(ch)
+    return " ".join("".join(kept).split())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    text = normalize(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def signature(items, num_perm=NUM_PERM):
+    """
+    MinHash 签名：每个 shingle 用 SHAKE-128 一次产生 num_perm 个 32 位哈希，逐位取最小
+    :return: array('I')，空集合返回 None
+    """
+    rows = []
+    for item in items:
+        row = array("I")
+        row.frombytes(hashlib.shake_128(item.encode("utf-8")).digest(num_perm * 4))
+        rows.append(row)
+    if not rows:
+        return None
+    return array("I", map(min, *rows)) if len(rows) > 1 else rows[0]
+
+
+def similarity(a, b):
+    """两个签名相同位置的比例 ≈ Jaccard 相似度"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def similarity_scope(model, base_url, system_prompt):
+    """同一模型、服务和提示词下的回答才能互相替代"""
+    raw = json.dumps([model, base_url, system_prompt], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class SimilarIndex:
+    """
+    近似重复选区索引：MinHash 签名 + LSH 分桶，只在同一桶里的候选中比较签名
+    命中时返回之前那次请求的回答缓存 key。
+    索引常驻内存，签名同时写入 SQLite，启动时重建分桶。
+    """
+
+    def __init__(self, path=SIMILAR_FILE, num_perm=NUM_PERM, bands=BANDS, max_entries=20000, clock=time.time):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}  # id -> (回答缓存 key, scope, 签名)
+        self._ids = {}  # 回答缓存 key -> id
+        self._buckets = {}  # hash((scope, 带序号, 这一带的签名)) -> id 或 [id, ...]
+        self._next_id = 1
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL UNIQUE,
+                scope TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+        self._load()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _load(self):
+        for entry_id, key, scope, blob in self._db.execute(
+                "SELECT id, key, scope, signature FROM signatures ORDER BY id"):
+            sig = array("I")
+            sig.frombytes(blob)
+            if len(sig) != self.num_perm:
+                continue  # 旧的签名参数，重新查询时会再加入
+            self._insert(entry_id, key, scope, sig)
+            self._next_id = entry_id + 1
+
+    def _band_keys(self, scope, sig):
+        rows = self.rows
+        return [hash((scope, band, sig[band * rows:(band + 1) * rows].tobytes())) for band in range(self.bands)]
+
+    def _insert(self, entry_id, key, scope, sig):
+        self._entries[entry_id] = (key, scope, sig)
+        self._ids[key] = entry_id
+        buckets = self._buckets
+        for band_key in self._band_keys(scope, sig):
+            bucket = buckets.get(band_key)
+            if bucket is None:
+                buckets[band_key] = entry_id
+            elif isinstance(bucket, list):
+                bucket.append(entry_id)
+            else:
+                buckets[band_key] = [bucket, entry_id]
+
+    def _remove(self, entry_id):
+        key, scope, sig = self._entries.pop(entry_id)
+        self._ids.pop(key, None)
+        buckets = self._buckets
+        for band_key in self._band_keys(scope, sig):
+            bucket = buckets.get(band_key)
+            if bucket == entry_id:
+                del buckets[band_key]
+            elif isinstance(bucket, list) and entry_id in bucket:
+                bucket.remove(entry_id)
+                if len(bucket) == 1:
+                    buckets[band_key] = bucket[0]
+
+    def add(self, scope, text, key):
+        """记录这次选区对应的回答缓存 key"""
+        sig = signature(shingles(text), self.num_perm)
+        if sig is None:
+            return
+        with self._lock:
+            old = self._ids.get(key)
+            if old is not None:
+                self._remove(old)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._insert(entry_id, key, scope, sig)
+            self._db.execute("INSERT OR REPLACE INTO signatures (id, key, scope, signature, created) "
+                             "VALUES (?, ?, ?, ?, ?)", (entry_id, key, scope, sig.tobytes(), self._clock()))
+            # 超过上限时删除最早加入的
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._db.execute("DELETE FROM signatures WHERE id = ?", (oldest,))
+                self._remove(oldest)
+            self._db.commit()
+
+    def lookup(self, scope, text, threshold=0.8):
+        """
+        :return: (回答缓存 key, 估计的相似度)，没有足够相似的返回 None
+        """
+        sig = signature(shingles(text), self.num_perm)
+        if sig is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, sig):
+                bucket = self._buckets.get(band_key)
+                if bucket is None:
+                    continue
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                else:
+                    candidates.add(bucket)
+            best = None
+            for entry_id in candidates:
+                key, entry_scope, entry_sig = self._entries[entry_id]
+                if entry_scope != scope:
+                    continue  # 桶哈希碰撞
+                score = similarity(sig, entry_sig)
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (key, score)
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return best
+
+    def discard(self, key):
+        """回答缓存里已经没有这个 key 了 (过期 / 淘汰)"""
+        with self._lock:
+            entry_id = self._ids.get(key)
+            if entry_id is None:
+                return
+            self._remove(entry_id)
+            self._db.execute("DELETE FROM signatures WHERE id = ?", (entry_id,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "buckets": len(self._buckets),
+                    "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
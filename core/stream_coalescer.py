@@ -0,0 +1,98 @@
+import threading
+import time
+
+
+class FrameCoalescer:
+    """
+    按显示帧率合并流式增量
+    每个 token 都会 push 进来，但最多每帧放行一次 (合并后的文本)，结束时 flush 保证最后的状态一定发出。
+    - 不传 on_frame：push 返回该发的帧；没有新 chunk 到达时不会主动发帧，被压住的尾巴跟随下一个 chunk 或 flush 发出
+    - 传了 on_frame：所有帧都交给 on_frame(文本)；被压住的尾巴到了帧时间由后台线程发出，
+      上游卡住 (长时间没有下一个 chunk) 时已收到的内容也不会一直压着不显示。
+      on_frame 在锁内调用，帧按顺序、不会并发；flush 之后不再主动发帧
+    """
+
+    def __init__(self, fps=30, clock=time.monotonic, on_frame=None):
+        self.fps = fps
+        self.interval = 1.0 / fps if fps and fps > 0 else 0.0  # fps <= 0 表示不限速
+        self._clock = clock
+        self._lock = threading.Condition()
+        self._pending = []
+        self._last_emit = None
+        self._on_frame = on_frame
+        self._deadline = None  # 被压住的尾巴最晚什么时候发出
+        self._timer = None
+        self._closed = False
+
+        self.chunks_received = 0
+        self.frames_emitted = 0
+
+    def push(self, delta):
+        """
+        :return: 到了该发帧的时间则返回合并后的文本，否则返回 None
+        """
+        with self._lock:
+            self._pending.append(delta)
+            self.chunks_received += 1
+            now = self._clock()
+            if self._last_emit is not None and now - self._last_emit < self.interval:
+                if self._on_frame is not None and self._deadline is None:
+                    self._arm(self._last_emit + self.interval)
+                return None
+            batch = self._take(now)
+            if self._on_frame is None:
+                return batch
+            self._on_frame(batch)
+            return None
+
+    def flush(self):
+        """取出剩余的全部增量 (没有则返回 None)，并停止后台定时发帧"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+            if not self._pending:
+                return None
+            return self._take(self._clock())
+
+    def _take(self, now):
+        batch = "".join(self._pending)
+        self._pending.clear()
+        self._last_emit = now
+        self._deadline = None
+        self.frames_emitted += 1
+        return batch
+
+    def _arm(self, deadline):
+        self._deadline = deadline
+        if self._timer is None:
+            self._timer = threading.Thread(target=self._flush_when_due, daemon=True)
+            self._timer.start()
+        else:
+            self._lock.notify_all()
+
+    def _flush_when_due(self):
+        with self._lock:
+            while not self._closed:
+                if self._deadline is None:
+                    self._lock.wait()
+                    continue
+                remaining = self._deadline - self._clock()
+                if remaining > 0:
+                    self._lock.wait(remaining)
+                    continue
+                if self._pending:
+                    self._on_frame(self._take(self._clock()))
+                self._deadline = None
+
+    @property
+    def frames_saved(self):
+        return self.chunks_received - self.frames_emitted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fps": self.fps,
+                "chunks_received": self.chunks_received,
+                "frames_emitted": self.frames_emitted,
+                "frames_saved": self.chunks_received - self.frames_emitted,
+            }
@@ -0,0 +1,491 @@
+import threading
+import time
+
+from core.dictionary import format_entry, is_short_selection
+from core.fixed_tags import FixedTagScanner
+from core.hedging import configured_providers, hedged_stream
+from core.map_reduce import SEGMENT_SEPARATOR, combine_fixed, ordered_merge, split_text
+from core.rate_limit import estimate_tokens, limited_stream
+from core.similar_cache import similarity_scope
+
+# 相似命中时显示在回答前面，提醒这不是针对这次选区生成的
+SIMILAR_NOTICE = "> ≈ 与之前的选区相似 (相似度 {score:.2f})，下面是那次的回答\n\n"
+# 可以复用相似选区回答的任务：纠错时改一个词 (has -> have) 相似度依然很高，但结论完全不同
+SIMILAR_TASKS = ("translate",)
+
+
+def _ignore(*args):
+    pass
+
+
+class WorkflowServices:
+    """应用生命周期内共享、所有任务共用的对象"""
+
+    def __init__(self, clipboard, client_pool, inflight, capture_stats=None, response_cache=None, ttft_stats=None,
+                 capture_lock=None, dictionary=None, rate_limits=None):
+        self.clipboard = clipboard
+        self.client_pool = client_pool
+        self.inflight = inflight
+        self.capture_stats = capture_stats
+        self.response_cache = response_cache  # 可能为 None (缓存库打开失败)
+        self.ttft_stats = ttft_stats  # 各服务的首 token 延迟，决定对冲等待时间
+        # 保证同一时间只有一个任务在读写剪贴板
+        self.capture_lock = capture_lock or threading.Lock()
+        self.dictionary = dictionary  # core.dictionary.MmapDictionary，未配置本地词典时为 None
+        self.similar_index = None  # core.similar_cache.SimilarIndex，启用后在后台加载
+        self.rate_limits = rate_limits  # core.rate_limit.RateLimits，None 表示不限流也不重试
+
+
+class Workflow:
+    """
+    一次热键任务的完整流程：取词 -> 查缓存 / 请求 -> 按帧合并并增量渲染 -> 自动复制
+    不依赖 Qt，输出都通过回调交出去：界面层 (main.WorkflowThread) 把回调接到信号上，
+    基准测试直接在当前线程里跑。
+    """
+
+    def __init__(self, cfg, task, services, trace, on_stream=_ignore, on_log=_ignore, on_error=_ignore,
+                 capture=None, interrupted=None, on_delta=None, auto_copy=True):
+        """
+        :param task: core.scheduler.Task，取消状态由调度器统一管理
+        :param trace: core.metrics.Trace，记录各阶段结束时刻
+        :param on_stream: on_stream(新冻结的 HTML, 当前尾部 HTML)
+        :param on_delta: 可选，on_delta(每帧新增的 Markdown 原文)，给不需要 HTML 的调用方 (IPC)
+        :param auto_copy: False 时不写剪贴板 (外部工具的请求)
+        :param capture: 无参函数，返回选中的文本；None 表示模拟按键复制
+        :param interrupted: 无参函数，返回 True 时尽快停止
+        """
+        self.cfg = cfg
+        self.task = task
+        self.task_type = task.task_type  # "grammar" 或 "translate"
+        self.services = services
+        self.trace = trace
+        self.on_stream = on_stream
+        self.on_log = on_log
+        self.on_error = on_error
+        self.capture = capture or self.perform_copy_sequence
+        self.interrupted = interrupted
+        self.on_delta = on_delta
+        self.auto_copy = auto_copy
+
+        # 基准测试读取的计数
+        self.chunks_received = 0
+        self.frames_emitted = 0
+        self.render_seconds = []  # 每帧 Markdown 增量渲染耗时
+        self.source = ""  # 取到的原文
+        self.model = cfg.get("model")  # 实际回答的模型 (对冲时可能是备用服务的)
+        self.text = ""  # 完整回答原文 (保留 <fixed> 标签，缓存 / 历史用)
+        self.fixed_copied_at = None  # 纠错句子写入剪贴板的时刻 (time.monotonic)
+
+        # <fixed> 标签不显示；闭合时立即复制里面的句子
+        self._tags = FixedTagScanner()
+        self._raw = []
+        self._copy_on_close = False
+        self._to_copy = []  # 已闭合、等着复制的 <fixed> 句子
+        self._copy_lock = threading.Lock()
+        self._copier = None  # 按顺序复制 _to_copy 的线程
+        self._last_fixed = None
+        self._copied = None
+
+    @property
+    def cancelled(self):
+        return self.task.cancelled or (self.interrupted is not None and self.interrupted())
+
+    def run(self):
+        self.trace.mark("queue")
+        try:
+            self._run()
+        except Exception as e:
+            self.trace.outcome = "error"
+            self.on_error(f"错误: {str(e)}")
+
+    def _run(self):
+        services = self.services
+
+        # 1. 获取对应的提示词 (支持用户自定义)
+        if self.task_type == "grammar":
+            system_prompt = self.cfg.get("prompt_grammar")
+        else:
+            system_prompt = self.cfg.get("prompt_translate")
+
+        # 取词最长要 1 秒多，期间并行做与文本无关的准备：导入 AI 库、取客户端、重建空闲断开的连接
+        if self.cfg.get("overlap_setup"):
+            threading.Thread(target=self._prepare, daemon=True).start()
+
+        # 2. 执行取词 (后台执行，不卡UI；和其他任务的取词、写剪贴板串行)
+        with services.capture_lock:
+            if self.cancelled: return
+            text = self.capture()
+        self.trace.mark("capture")
+        if not text:
+            self.trace.outcome = "no_text"
+            self.on_error("未选中内容，请重试")
+            return
+
+        self.source = text
+        self.on_log(f"✅ 获取文本: {text[:15]}...")
+
+        # 3. 延迟加载 AI 库
+        from core.ai_client import build_messages
+        from core.markdown_stream import IncrementalMarkdown
+        from core.response_cache import cache_key
+        from core.stream_coalescer import FrameCoalescer
+
+        # 4. 准备 API
+        base_url = self.cfg.get("base_url")
+        model = self.cfg.get("model")
+
+        def key_for(provider):
+            # 回答按实际回答的服务记缓存，对冲时备用服务的回答不会记在主服务名下
+            return cache_key(provider["model"], provider["base_url"], system_prompt, text)
+
+        messages = build_messages(system_prompt, text)
+        providers = configured_providers(self.cfg)
+        key = key_for(providers[0])
+        use_cache = services.response_cache is not None and self.cfg.get("cache_enabled")
+        cached = None
+        if use_cache:
+            # 开启对冲时之前的回答可能来自任何一个服务，按顺序查
+            for provider in providers if self.cfg.get("hedge_enabled") else providers[:1]:
+                cached = services.response_cache.get(key_for(provider))
+                if cached is not None:
+                    break
+
+        # ≈ 翻译时和之前的选区只差标点、换行或几个词就复用那次的回答
+        similar = None
+        if use_cache and self.cfg.get("similar_cache_enabled") and self.task_type in SIMILAR_TASKS:
+            similar = services.similar_index
+        scope = similarity_scope(model, base_url, system_prompt)
+        refresh = False
+        similar_score = None
+        if cached is None and similar is not None:
+            cached, refresh, similar_score = self._lookup_similar(similar, scope, text)
+
+        # 已完成的块只渲染一次，每个 chunk 只重渲染末尾的块
+        renderer = IncrementalMarkdown()
+        auto_copy = (self.auto_copy and self.task_type == "grammar" and self.cfg.get("auto_copy_grammar"))
+        # 分段处理时各段的 <fixed> 只是局部结果，等最后合并的那个；缓存是一次性显示的，也只复制最后一个
+        segments = self._split(text)
+        self._copy_on_close = auto_copy and cached is None and len(segments) == 1
+
+        # 📖 单词 / 短语先查本地词典，立即显示
+        entry = self._lookup_dictionary(text)
+        prefix_len = 0
+        if entry is not None:
+            ask_ai = self.cfg.get("dictionary_ai")
+            self._emit(renderer, entry + SEGMENT_SEPARATOR if ask_ai else entry)
+            self.trace.mark("dictionary")
+            if not ask_ai:
+                self._flush_tags(renderer)
+                self.text = "".join(self._raw)
+                return
+            prefix_len = len(entry + SEGMENT_SEPARATOR)
+
+        if cached is not None:
+            # ⚡ 命中缓存：直接整篇渲染，不走网络
+            self.on_log("⚡ 命中缓存，直接显示结果")
+            self.trace.mark("setup")
+            if similar_score is not None:
+                self._emit(renderer, SIMILAR_NOTICE.format(score=similar_score))
+            self._emit(renderer, cached)
+            self._flush_tags(renderer)
+            self.trace.mark("cache")
+            if refresh and len(segments) == 1:
+                self._refresh_in_background(key, messages, similar, scope, text, key_for)
+        else:
+            from core.ai_client import Abort
+
+            # 任务被取消时打断阻塞中的网络读取，工作线程不必等到下一个 token 或请求超时才退出
+            abort = Abort()
+            response = None
+
+            def answered_by(provider):
+                # 记在共享流上，合并到这个请求的其他任务也能拿到
+                response.shared.provider = provider
+
+            request = lambda request_messages: self._request(request_messages, abort=abort, on_provider=answered_by)
+            if len(segments) > 1:
+                factory = lambda: self._map_reduce(segments, system_prompt, request, build_messages)
+            else:
+                factory = lambda: request(messages)
+
+            # 5. 发起请求 (相同的请求正在进行时直接共享它的流)
+            response = services.inflight.stream(key, factory, abort=abort)
+            self.task.on_cancel(response.cancel)
+
+            # 按帧率合并 token，每帧只渲染并发送一次；上游卡住时被压住的尾巴到帧时间也会发出
+            # 只发送增量，弹窗在文档末尾追加，不再整篇替换
+            coalescer = FrameCoalescer(self.cfg.get("stream_fps"),
+                                       on_frame=lambda batch: self._emit(renderer, batch, send=not self.cancelled))
+            self.trace.mark("setup")
+            # 6. 流式处理
+            try:
+                for content in response:
+                    if self.cancelled: break
+                    if content:
+                        if coalescer.chunks_received == 0:
+                            self.trace.mark("ttft")
+                        coalescer.push(content)
+            except Exception:
+                if not self.cancelled:
+                    coalescer.flush()  # 停掉后台发帧
+                    raise
+                # 取消时被打断的读取不算出错
+            response.close()
+            self.chunks_received = coalescer.chunks_received
+            answered = response.shared.provider or providers[0]
+            self.model = answered["model"]
+            key = key_for(answered)
+
+            # 最后一帧总是发送，确保完整
+            batch = coalescer.flush()
+            if batch is not None:
+                self._emit(renderer, batch, send=not self.cancelled)
+            self._flush_tags(renderer, send=not self.cancelled)
+            self.trace.mark("stream")
+            self.on_log(f"📊 收到 {coalescer.chunks_received} 个 chunk，发送 {self.frames_emitted} 帧")
+
+        self.text = "".join(self._raw)
+        # 只缓存完整的回答
+        if cached is None and use_cache and not self.cancelled and self.text[prefix_len:]:
+            services.response_cache.put(key, self.text[prefix_len:])
+            if similar is not None:
+                similar.add(scope, text, key)
+
+        copier = self._copier
+        if copier is not None:
+            copier.join()
+        # 💡 分段处理时最后一个 <fixed> 是合并后的完整结果；流式过程中已经复制过的不再重复
+        # 相似命中的 <fixed> 属于之前的选区，不复制
+        if (auto_copy and similar_score is None and self._last_fixed is not None
+                and self._last_fixed != self._copied):
+            self._copy_fixed(self._last_fixed)
+
+    def _prepare(self):
+        """
+        与取词并行执行，只做和选中文本无关的事，失败了也不影响主流程 (请求时会照常连接)
+        导入在主线程里重复执行时会等这里导入完成，不需要额外同步
+        """
+        start = self.trace.now()
+        try:
+            import core.ai_client  # noqa: F401
+            import core.markdown_stream  # noqa: F401
+            import core.response_cache  # noqa: F401
+            import core.stream_coalescer  # noqa: F401
+            import openai  # noqa: F401
+        except ImportError:
+            return
+        self.trace.span("prepare", start)
+
+        pool = self.services.client_pool
+        providers = configured_providers(self.cfg)
+        for provider in providers if self.cfg.get("hedge_enabled") else providers[:1]:
+            if not provider["api_key"] or self.cancelled:
+                continue
+            # 最近刚用过的连接还在连接池里
+            if not pool.is_idle(provider["base_url"], provider["api_key"]):
+                continue
+            connect_start = self.trace.now()
+            if pool.warm_up(provider["base_url"], provider["api_key"]):
+                self.trace.span("connect", connect_start)
+
+    def _request(self, request_messages, log=None, abort=None, on_provider=None):
+        """
+        发出一次 AI 请求，返回文本增量迭代器 (按配置对冲、限流重试)
+        :param abort: 可选的 ai_client.Abort，中断时打断阻塞中的读取
+        :param on_provider: 可选，on_provider(provider)，确定由哪个服务回答时调用
+        """
+        from core.ai_client import stream_chat
+
+        services = self.services
+        log = log or self.on_log
+        providers = configured_providers(self.cfg)
+        hedge = self.cfg.get("hedge_enabled") and len(providers) > 1
+        hedge_delay_ms = self.cfg.get("hedge_delay_ms")
+
+        def open_stream(provider, abort=abort):
+            # 复用应用持有的客户端 (keep-alive 连接已由 preload_heavy_libs 预热)
+            client = services.client_pool.get(provider["base_url"], provider["api_key"])
+            if services.rate_limits is None:
+                return stream_chat(client, provider["model"], request_messages, timeout=20, abort=abort)
+            # 重试交给限流器 (退避时会参考 Retry-After 并收紧并发)，关掉 SDK 自带的重试
+            client = client.with_options(max_retries=0)
+            return limited_stream(
+                services.rate_limits.get(provider),
+                lambda: stream_chat(client, provider["model"], request_messages, timeout=20, abort=abort),
+                cost=estimate_tokens(request_messages),
+                max_retries=self.cfg.get("retry_max_attempts") or 0,
+                base_delay=(self.cfg.get("retry_base_delay_ms") or 0) / 1000.0,
+                cancelled=lambda: self.cancelled,
+                log=log)
+
+        if hedge:
+            # 主服务迟迟没有首 token 时，同样的请求再发给下一个服务，用先返回的那个
+            return hedged_stream(providers, open_stream, stats=services.ttft_stats,
+                                 delay=hedge_delay_ms / 1000.0 if hedge_delay_ms else None,
+                                 log=log, abort=abort, on_winner=on_provider)
+        if on_provider is not None:
+            on_provider(providers[0])
+        return open_stream(providers[0])
+
+    def _lookup_similar(self, similar, scope, text):
+        """
+        :return: (相似选区的缓存回答或 None, 是否需要后台刷新, 相似度或 None)
+        """
+        found = similar.lookup(scope, text, self.cfg.get("similar_cache_threshold") or 1.0)
+        if found is None:
+            return None, False, None
+        similar_key, score = found
+        answer = self.services.response_cache.get(similar_key)
+        if answer is None:
+            similar.discard(similar_key)  # 回答已过期 / 被淘汰
+            return None, False, None
+        self.on_log(f"≈ 命中相似选区 (相似度 {score:.2f})，显示之前的回答")
+        return answer, bool(self.cfg.get("similar_cache_refresh")), score
+
+    def _refresh_in_background(self, key, messages, similar, scope, text, key_for):
+        """相似命中后照常请求这次的选区，结果只写缓存，下次精确命中"""
+        services = self.services
+
+        def refresh():
+            response = None
+
+            def answered_by(provider):
+                response.shared.provider = provider
+
+            try:
+                # 任务结束后界面层的日志回调可能已经失效，后台刷新不写日志
+                response = services.inflight.stream(
+                    key, lambda: self._request(messages, log=_ignore, on_provider=answered_by))
+                answer = "".join(response)
+            except Exception:
+                return
+            if answer and not self.cancelled:
+                answer_key = key_for(response.shared.provider) if response.shared.provider else key
+                services.response_cache.put(answer_key, answer)
+                similar.add(scope, text, answer_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _lookup_dictionary(self, text):
+        """翻译任务的短选区查本地词典，返回要显示的 Markdown；查不到返回 None"""
+        dictionary = self.services.dictionary
+        if dictionary is None or self.task_type != "translate":
+            return None
+        if not is_short_selection(text, self.cfg.get("dictionary_max_words") or 0):
+            return None
+        try:
+            found = dictionary.lookup(text)
+        except (ValueError, OSError) as e:  # 词典正在重新加载
+            self.on_log(f"⚠️ 本地词典查询失败: {e}")
+            return None
+        if found is None:
+            return None
+        self.on_log(f"📖 本地词典命中: {found[0]}")
+        return format_entry(*found)
+
+    def _split(self, text):
+        """超过 split_chars 的长文本在段落 / 句子边界切开；不切时返回单个片段"""
+        split_chars = self.cfg.get("split_chars") or 0
+        if split_chars <= 0 or len(text) <= split_chars:
+            return [("", text)]
+        return split_text(text, split_chars)
+
+    def _map_reduce(self, segments, system_prompt, request, build_messages):
+        """各片段并发请求，按原文顺序拼成一个流；纠错任务最后追加合并后的 <fixed>"""
+        max_workers = self.cfg.get("split_max_workers") or 1
+        self.on_log(f"✂️ 文本较长，拆成 {len(segments)} 段并发处理 (最多 {max_workers} 路)")
+        answers = [[] for _ in segments]
+
+        def make_factory(index, segment):
+            def factory():
+                stream = request(build_messages(system_prompt, segment))
+                try:
+                    for delta in stream:
+                        answers[index].append(delta)
+                        yield delta
+                finally:
+                    close = getattr(stream, "close", None)
+                    if close is not None:
+                        close()
+            return factory
+
+        def on_error(index, error):
+            self.on_log(f"⚠️ 第 {index + 1} 段处理失败: {error}")
+            return f"> ⚠️ 第 {index + 1} 段处理失败: {error}"
+
+        factories = [make_factory(i, segment) for i, (_, segment) in enumerate(segments)]
+        yield from ordered_merge(factories, max_workers=max_workers, on_error=on_error)
+
+        if self.task_type == "grammar":
+            combined = combine_fixed(segments, ["".join(parts) for parts in answers])
+            yield f"{SEGMENT_SEPARATOR}**完整纠错结果**\n\n<fixed>{combined}</fixed>\n"
+
+    def _emit(self, renderer, delta, send=True):
+        self._raw.append(delta)
+        shown, closed = self._tags.feed(delta)
+        self._render(renderer, shown, delta, send)
+        for fixed_text in closed:
+            self._last_fixed = fixed_text
+            if self._copy_on_close:
+                # 帧在持有 FrameCoalescer 锁时发出 (可能在它的定时线程里)，复制要等取词锁和剪贴板，
+                # 交给单独的线程，不挡住后面的帧和网络读取
+                self._copy_in_background(fixed_text)
+
+    def _flush_tags(self, renderer, send=True):
+        # 流末尾留着的半个标签其实是正文
+        rest = self._tags.flush()
+        if rest:
+            self._render(renderer, rest, "", send)
+
+    def _render(self, renderer, shown, delta, send):
+        start = time.perf_counter()
+        frozen_html, tail_html = renderer.feed(shown)
+        self.render_seconds.append(time.perf_counter() - start)
+        if send:
+            self.frames_emitted += 1
+            self.on_stream(frozen_html, tail_html)
+            # IPC 调用方拿到的是带标签的原文
+            if self.on_delta is not None and delta:
+                self.on_delta(delta)
+
+    def _copy_in_background(self, fixed_text):
+        with self._copy_lock:
+            self._to_copy.append(fixed_text)
+            if self._copier is None:
+                self._copier = threading.Thread(target=self._drain_copies, daemon=True)
+                self._copier.start()
+
+    def _drain_copies(self):
+        while True:
+            with self._copy_lock:
+                if not self._to_copy:
+                    self._copier = None
+                    return
+                fixed_text = self._to_copy.pop(0)
+            try:
+                self._copy_fixed(fixed_text)
+            except Exception as e:
+                self.on_log(f"⚠️ 复制纠错句子失败: {e}")
+
+    def _copy_fixed(self, fixed_text):
+        fixed_text = fixed_text.strip()
+        if not fixed_text or self.cancelled:
+            return
+        # 不能在别的任务取词 (会恢复原剪贴板) 的过程中写入
+        with self.services.capture_lock:
+            if self.cancelled:
+                return
+            self.services.clipboard.set_text(fixed_text)
+        self._copied = fixed_text
+        self.fixed_copied_at = time.monotonic()
+        self.on_log(f"✅ 已复制纠错后的句子: {fixed_text[:15]}...")
+
+    def perform_copy_sequence(self):
+        from core.active_app import foreground_app_id
+        from core.capture import TextCapture
+
+        # 按前台程序的历史记录决定先试哪种复制方式、每种等多久
+        stats = self.services.capture_stats if self.cfg.get("adaptive_capture") else None
+        key_delay = (self.cfg.get("key_step_delay_ms") or 0) / 1000.0
+        return TextCapture(self.services.clipboard, key_delay=key_delay, log=self.on_log,
+                           stats=stats, active_app=foreground_app_id).capture()
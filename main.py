@@ -4,32 +4,53 @@ import time
 import ctypes
 import queue
 import threading
-import pyperclip
+from functools import partial
+
+STARTUP_TIME = time.perf_counter()  # 启动耗时 (到热键就绪) 从这里算起
+
+# 0. 无界面批处理模式：在导入 PyQt6 之前分流
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] == "batch":
+    from core.batch import main as batch_main
+    sys.exit(batch_main(sys.argv[2:]))
 
 # 1. 强制软件渲染
 os.environ["QT_OPENGL"] = "software"
 
 # GUI 相关 (必须保留 QLockFile, QDir, Qt)
-from PyQt6.QtWidgets import QApplication, QMessageBox
+# 设置窗口 (ui.main_window)、弹窗、keyboard 都按需导入，静默自启只加载托盘和热键需要的部分
+from PyQt6.QtWidgets import QApplication, QMessageBox, QSystemTrayIcon
 from PyQt6.QtCore import QTimer, QLockFile, QDir, Qt, QThread, pyqtSignal
-from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+from PyQt6.QtNetwork import QLocalSocket
 from PyQt6.QtGui import QIcon
 
-import keyboard
-
-from core.hardware import hard_click, hard_press, hard_release, DIK_HOME, DIK_END, DIK_LSHIFT, DIK_LCONTROL, DIK_C, DIK_INSERT, DIK_RIGHT
-from ui.main_window import MainWindow
-from ui.popup import PopupResult
+from core.ai_client import ClientPool
+from core.hedging import TTFTStats, configured_providers
+from core.history import HistoryStore
+from core.ipc_protocol import IPC_SERVER_NAME, encode_frame
+from core.logbuffer import LogBuffer
+from core.response_cache import ResponseCache, InflightRequests
+from core.capture_stats import CaptureStats
+from core.clipboard import PyperclipBackend
+from ui.clipboard_qt import QtClipboardBackend
+from core.diagnostics import Profiler, runs_from_env
+from core.metrics import MetricsRegistry
+from core.rate_limit import RateLimits
+from core.scheduler import TaskScheduler
+from core.workflow import Workflow, WorkflowServices
+from ui.ipc_server import IpcServer
+from ui.tray import TrayIcon
 
 # 引入跨线程安全的信号机制
 from PyQt6.QtCore import QObject
 
 class HotkeySignals(QObject):
     triggered = pyqtSignal(str)
+    ready = pyqtSignal(bool)  # 热键注册完成 (是否成功)
 
 hotkey_signals = HotkeySignals()
 
-IPC_SERVER_NAME = "SyntaxLens_IPC_Server_v002"
+LOG_CAPACITY = 2000  # 内存中保留的日志条数
+LOG_FLUSH_MS = 200  # 日志批量刷新间隔
 
 
 def resource_path(relative_path):
@@ -41,6 +62,8 @@ def resource_path(relative_path):
 
 
 def hotkey_daemon(grammar_key, translate_key):
+    import keyboard
+
     def on_grammar():
         hotkey_signals.triggered.emit("grammar")
 
@@ -54,264 +77,146 @@ def hotkey_daemon(grammar_key, translate_key):
             print(f"Hotkey cleanup warning: {e}")
         keyboard.add_hotkey(grammar_key, on_grammar)
         keyboard.add_hotkey(translate_key, on_translate)
+        hotkey_signals.ready.emit(True)
         keyboard.wait()
     except Exception as e:
         print(f"Hotkey Error: {e}")
+        hotkey_signals.ready.emit(False)
 
 
 # === 🚀 核心重构：工作流线程 (复制 + AI) ===
-# 这个线程负责所有的脏活累活，确保 UI 线程丝滑流畅
+# 这个线程负责所有的脏活累活，确保 UI 线程丝滑流畅；具体流程在 core.workflow 里，不依赖 Qt
 class WorkflowThread(QThread):
-    stream_update = pyqtSignal(str)  # 发送 HTML 片段
-    finished_signal = pyqtSignal()  # 任务结束
-    error_signal = pyqtSignal(str)  # 报错
+    stream_update = pyqtSignal(int, str, str)  # 发送 (任务 id, 新冻结的 HTML, 当前尾部 HTML)
+    finished_signal = pyqtSignal(int)  # 任务结束
+    error_signal = pyqtSignal(int, str)  # 报错
     log_signal = pyqtSignal(str)  # 日志
 
-    def __init__(self, config_manager, task_type):
+    def __init__(self, config_manager, task, services, trace, profiler=None):
         super().__init__()
+        self.task = task  # core.scheduler.Task，取消状态由调度器统一管理
+        self.trace = trace  # core.metrics.Trace，记录各阶段结束时刻
         self.cfg = config_manager
-        self.task_type = task_type  # "grammar" 或 "translate"
-        self._is_cancelled = False
+        self.profiler = profiler  # core.diagnostics.Profiler，开启诊断时在分析器下运行
+        self.workflow = Workflow(config_manager, task, services, trace,
+                                 on_stream=self.emit_stream,
+                                 on_log=self.log_signal.emit,
+                                 on_error=self.emit_error,
+                                 interrupted=self.isInterruptionRequested)
+
+    def emit_stream(self, frozen_html, tail_html):
+        self.stream_update.emit(self.task.id, frozen_html, tail_html)
+
+    def emit_error(self, msg):
+        self.error_signal.emit(self.task.id, msg)
 
     def cancel(self):
-        self._is_cancelled = True
+        self.task.cancel()
+
+    def release(self):
+        """
+        线程结束后由 GUI 线程调用：工作流 (内部有循环引用) 的回调引用着线程对象，不处理的话线程要等
+        Python 的循环垃圾回收 (可能发生在任意线程) 才被析构；这里断开引用，C++ 对象由 Qt 在 GUI 线程里删除
+        """
+        self.wait()  # finished 发出后线程还要收尾，几乎立即返回
+        self.workflow = None
+        self.deleteLater()
 
     def run(self):
         try:
-            # 1. 获取对应的提示词 (支持用户自定义)
-            if self.task_type == "grammar":
-                system_prompt = self.cfg.get("prompt_grammar")
+            if self.profiler is not None:
+                self.profiler.run(self.workflow.run, name=f"{self.task.task_type}-{self.task.id}",
+                                  config=self.cfg.config, trace=self.trace)
             else:
-                system_prompt = self.cfg.get("prompt_translate")
+                self.workflow.run()
+        finally:
+            self.finished_signal.emit(self.task.id)
 
-            # 2. 执行取词 (后台执行，不卡UI)
-            text = self.perform_copy_sequence()
-            if not text:
-                self.error_signal.emit("未选中内容，请重试")
-                return
 
-            self.log_signal.emit(f"✅ 获取文本: {text[:15]}...")
-
-            # 3. 延迟加载 AI 库
-            import markdown2
-            from openai import OpenAI
-
-            # 4. 准备 API
-            api_key = self.cfg.get("api_key")
-            base_url = self.cfg.get("base_url")
-            model = self.cfg.get("model")
-
-            # 拼接 user 内容
-            user_content = f"待分析数据：\n```text\n{text}\n```"
-
-            client = OpenAI(api_key=api_key, base_url=base_url)
-
-            # 5. 发起请求
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_content}
-                ],
-                stream=True,
-                timeout=20
-            )
-
-            collected_text = ""
-            # 深色模式 CSS
-            # 深色模式 CSS (优化版：强制换行)
-            css = """
-                        <style>
-                            body { 
-                                color: #d4d4d4; 
-                                font-family: 'Segoe UI', 'Microsoft YaHei', sans-serif; 
-                                font-size: 14px; 
-                                line-height: 1.6;
-                                word-wrap: break-word; /* 关键：允许长单词换行 */
-                            }
-                            h1, h2, h3 { color: #569cd6; margin-top: 10px; }
-                            strong { color: #dcdcaa; }
-                            /* 代码块样式优化 */
-                            code { 
-                                background-color: #2d2d2d; 
-                                padding: 2px 5px; 
-                                border-radius: 4px; 
-                                color: #ce9178; 
-                                font-family: Consolas, monospace;
-                            }
-                            pre {
-                                background-color: #1e1e1e;
-                                border: 1px solid #333;
-                                padding: 10px;
-                                border-radius: 5px;
-                                white-space: pre-wrap; /* 关键：强制代码块自动换行，不许出现横向滚动条 */
-                                word-wrap: break-word;
-                            }
-                            pre code {
-                                background-color: transparent;
-                                border: none;
-                                color: #9cdcfe;
-                                padding: 0;
-                            }
-                            blockquote { 
-                                border-left: 4px solid #569cd6; 
-                                margin: 10px 0; 
-                                padding-left: 10px; 
-                                color: #808080; 
-                                background-color: #252526; 
-                            }
-                        </style>
-                        """
-            # 6. 流式处理
-            for chunk in response:
-                if self.isInterruptionRequested() or self._is_cancelled: break
-                content = chunk.choices[0].delta.content
-                if content:
-                    collected_text += content
-                    html = markdown2.markdown(collected_text, extras=["break-on-newline", "fenced-code-blocks"])
-                    self.stream_update.emit(css + html)
-
-            # 最后发一次确保完整
-            if not self._is_cancelled:
-                html = markdown2.markdown(collected_text, extras=["break-on-newline", "fenced-code-blocks"])
-                self.stream_update.emit(css + html)
-
-            # 💡 检查是否需要自动复制纠错后的句子
-            if not self._is_cancelled and self.task_type == "grammar" and self.cfg.get("auto_copy_grammar"):
-                import re
-                self.log_signal.emit("正在提取纠错后的句子...")
-                match = re.search(r'<fixed>(.*?)</fixed>', collected_text, re.DOTALL)
-                if match:
-                    fixed_text = match.group(1).strip()
-                    if fixed_text:
-                        import pyperclip
-                        pyperclip.copy(fixed_text)
-                        self.log_signal.emit(f"✅ 已复制纠错后的句子: {fixed_text[:15]}...")
+# --- 主程序逻辑 ---
+class SyntaxLensApp(QObject):
+    """
+    常驻的应用控制器：托盘、热键、任务调度
+    设置窗口 (MainWindow) 和结果弹窗都在第一次用到时才创建
+    """
 
+    def __init__(self, config_manager):
+        super().__init__()
+        self.cfg = config_manager
+        # 各阶段延迟直方图，设置窗口的统计页和导出都读它
+        self.metrics = MetricsRegistry()
+        self.window = None
+        self._popup = None
+        # 任意线程都只往环形缓冲里写日志，由定时器批量刷到界面和日志文件
+        self.log_buffer = LogBuffer(capacity=LOG_CAPACITY)
+        self.apply_log_file()
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_MS)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.log_timer.start()
+        # 按需性能诊断 (托盘菜单或 SYNTAXLENS_PROFILE_RUNS 环境变量开启)
+        self.profiler = Profiler(max_bytes=int(self.cfg.get("diagnostics_max_mb") * 1024 * 1024),
+                                 log=self.append_log)
+        env_runs = runs_from_env()
+        if env_runs:
+            self.profiler.arm(env_runs)
+            self.append_log(f"🩺 性能诊断已开启 (环境变量)，记录接下来 {env_runs} 次任务 -> {self.profiler.directory}")
+
+        self.tray_icon = TrayIcon(resource_path("app.ico"), self.force_show_window, self.quit_app,
+                                  on_profile=self.start_profiling)
+
+        # 任务调度：热键触发不再因为忙碌被丢弃，由调度器决定取代还是排队
+        self.scheduler = TaskScheduler(self.launch_worker,
+                                       policy=self.cfg.get("task_policy"),
+                                       max_running=self.cfg.get("max_concurrent_tasks"),
+                                       max_queue=self.cfg.get("task_queue_size"))
+        self.workers = {}  # 任务 id -> WorkflowThread，线程真正退出后才释放
+
+        # 剪贴板变化由 Qt 通知，取词时不再轮询 pyperclip
+        try:
+            self.clipboard = QtClipboardBackend()
         except Exception as e:
-            self.error_signal.emit(f"错误: {str(e)}")
-        finally:
-            self.finished_signal.emit()
+            self.append_log(f"⚠️ 剪贴板监听不可用，改用轮询: {e}")
+            self.clipboard = PyperclipBackend()
+        # 各程序下复制策略的成败与延迟 (capture_stats.json)
+        self.capture_stats = CaptureStats()
 
-    def perform_copy_sequence(self):
-        try:
-            original_clipboard = pyperclip.paste()
-        except Exception:
-            original_clipboard = ""
-
-        def wait_for_clipboard(timeout_ms=500, interval_ms=20):
-            start = time.time()
-            timeout_sec = timeout_ms / 1000.0
-            interval_sec = interval_ms / 1000.0
-            while time.time() - start < timeout_sec:
-                text = pyperclip.paste()
-                if text.strip(): return text.strip()
-                time.sleep(interval_sec)
-            return None
-
-        # 定义按键常量，方便下面调用
-        try:
-            time.sleep(0.05)  # 稍微缩短初始等待
-
-            # 清空剪贴板
-            pyperclip.copy("")
-
-            # === 方案 A: 强力复制 (Ctrl + Insert) ===
-            # 针对 PyCharm/IdeaVim 优化
-            self.log_signal.emit("⚡ 尝试强力复制 (Ctrl+Insert)...")
-
-            hard_press(DIK_LCONTROL)
-            time.sleep(0.05)
-            hard_press(DIK_INSERT)
-            time.sleep(0.05)
-            hard_release(DIK_INSERT)
-            time.sleep(0.02)
-            hard_release(DIK_LCONTROL)
-
-            # 检查 A (动态等待最多400ms)
-            text = wait_for_clipboard(400)
-            if text: return text
-
-            # === 方案 B: 标准复制 (Ctrl + C) ===
-            self.log_signal.emit("🔄 尝试标准复制 (Ctrl+C)...")
-
-            hard_press(DIK_LCONTROL)
-            time.sleep(0.03)
-            hard_press(DIK_C)
-            time.sleep(0.03)
-            hard_release(DIK_C)
-            time.sleep(0.02)
-            hard_release(DIK_LCONTROL)
-
-            # 检查 B (动态等待最多400ms)
-            text = wait_for_clipboard(400)
-            if text: return text
-
-            # === 方案 C: 自动全选兜底 (Home -> Shift+End) ===
-            self.log_signal.emit("⚠️ 未选中，尝试自动全选...")
-
-            # Home
-            hard_press(DIK_HOME)
-            time.sleep(0.03)
-            hard_release(DIK_HOME)
-            time.sleep(0.03)
-
-            # Shift + End
-            hard_press(DIK_LSHIFT)
-            time.sleep(0.03)
-            hard_press(DIK_END)
-            time.sleep(0.03)
-            hard_release(DIK_END)
-            time.sleep(0.03)
-            hard_release(DIK_LSHIFT)  # 这里必须先释放 Shift
-            time.sleep(0.05)
-
-            # 全选后再 Ctrl + C
-            hard_press(DIK_LCONTROL)
-            time.sleep(0.03)
-            hard_press(DIK_C)
-            time.sleep(0.03)
-            hard_release(DIK_C)
-            time.sleep(0.02)
-            hard_release(DIK_LCONTROL)
-
-            # 检查 C (动态等待最多600ms)
-            text = wait_for_clipboard(600)
-            if text: return text
-
-            return None
+        # 长期持有的 AI 客户端，按 base_url/api_key 复用连接
+        self.client_pool = ClientPool()
+        self.ttft_stats = TTFTStats()
 
+        # 回答缓存 (内存 + 磁盘) 与相同请求合并
+        self.inflight = InflightRequests()
+        try:
+            self.response_cache = ResponseCache(
+                max_bytes=int(self.cfg.get("cache_max_mb") * 1024 * 1024),
+                ttl_seconds=self.cfg.get("cache_ttl_hours") * 3600)
         except Exception as e:
-            self.log_signal.emit(f"❌ 取词错误: {e}")
-            return None
-
-        finally:
-            # === 🛡️ 绝对防御 (兜底释放) ===
-            # 无论上面发生了什么（报错、return、断电），这里都会执行
-            # 确保按键一定被松开！
-            hard_release(DIK_LCONTROL)
-            hard_release(DIK_LSHIFT)
-            hard_release(DIK_INSERT)
-            hard_release(DIK_C)
-            
-            # ⚠️ 恢复剪贴板原始内容
+            self.response_cache = None
+            self.append_log(f"⚠️ 回答缓存不可用: {e}")
+        # 结果历史 (history.db)，设置窗口的历史页可以全文搜索
+        self.history = None
+        if self.cfg.get("history_enabled"):
             try:
-                pyperclip.copy(original_clipboard)
+                self.history = HistoryStore(max_bytes=int(self.cfg.get("history_max_mb") * 1024 * 1024),
+                                            retention_days=self.cfg.get("history_retention_days"))
             except Exception as e:
-                self.log_signal.emit(f"⚠️ 恢复剪贴板失败: {e}")
+                self.append_log(f"⚠️ 结果历史不可用: {e}")
 
+        # 各 AI 服务的客户端限流 (令牌桶 + 随 429 自适应的并发上限)
+        self.rate_limits = RateLimits(self.cfg)
 
-# --- 主程序逻辑 ---
-class SyntaxLensApp(MainWindow):
-    def __init__(self, config_manager):
-        super().__init__(config_manager)
-        self.popup = PopupResult()
-        
-        # 绑定弹窗关闭信号，用于中断 AI 请求
-        self.popup.closed_signal.connect(self.cancel_current_task)
+        # 预加载和每次保存设置都会在后台线程里重新加载词典 / 相似索引，各自同一时间只允许一个
+        self._dictionary_lock = threading.Lock()
+        self._similar_lock = threading.Lock()
 
-        self.worker = None  # 现在用新的 WorkflowThread
-        self.is_processing = False
+        # 每个任务都用的共享对象 (取词锁由调度器持有)
+        self.services = WorkflowServices(self.clipboard, self.client_pool, self.inflight,
+                                         capture_stats=self.capture_stats,
+                                         response_cache=self.response_cache,
+                                         ttft_stats=self.ttft_stats,
+                                         capture_lock=self.scheduler.capture_lock,
+                                         rate_limits=self.rate_limits)
 
         self.append_log("✅ 系统就绪")
 
@@ -326,65 +231,277 @@ class SyntaxLensApp(MainWindow):
         self.init_ipc_server()
 
     def init_ipc_server(self):
-        QLocalServer.removeServer(IPC_SERVER_NAME)
-        self.ipc_server = QLocalServer()
-        self.ipc_server.newConnection.connect(self.handle_new_connection)
-        self.ipc_server.listen(IPC_SERVER_NAME)
-
-    def handle_new_connection(self):
-        socket = self.ipc_server.nextPendingConnection()
-        socket.readyRead.connect(lambda: self.read_socket_data(socket))
-
-    def read_socket_data(self, socket):
-        if socket.readAll().data().decode() == "SHOW":
-            self.force_show_window()
+        # 第二个实例发 show；编辑器插件、脚本等通过 core.ipc_client 复用这里的客户端和缓存
+        self.ipc_server = IpcServer(IPC_SERVER_NAME, self.run_ipc_analyze, stats=self.ipc_stats,
+                                    max_workers=self.cfg.get("ipc_max_workers"), parent=self)
+        self.ipc_server.show_requested.connect(self.force_show_window)
+        if not self.ipc_server.listen():
+            self.append_log(f"⚠️ IPC 服务启动失败: {self.ipc_server.server.errorString()}")
+
+    def run_ipc_analyze(self, task, text, on_delta):
+        # 在 IPC 线程池里执行：不取词、不弹窗、不写剪贴板
+        errors = []
+        trace = self.metrics.trace(task="ipc")
+        Workflow(self.cfg, task, self.services, trace, on_error=errors.append, capture=lambda: text,
+                 on_delta=on_delta, auto_copy=False).run()
+        trace.finish("cancelled" if task.cancelled else None)
+        if errors:
+            raise RuntimeError(errors[-1])
+
+    def ipc_stats(self):
+        stats = {"scheduler": self.scheduler.stats()}
+        if self.response_cache is not None:
+            stats["cache"] = self.response_cache.stats()
+        if self.services.similar_index is not None:
+            stats["similar"] = self.services.similar_index.stats()
+        stats["rate_limits"] = self.rate_limits.stats()
+        return stats
+
+    def ensure_window(self):
+        if self.window is None:
+            from ui.main_window import MainWindow
+
+            self.window = MainWindow(self.cfg, metrics=self.metrics, tray_icon=self.tray_icon,
+                                     history=self.history, log_buffer=self.log_buffer,
+                                     rate_limits=self.rate_limits)
+            self.window.config_updated.connect(self.on_config_updated)
+        return self.window
+
+    @property
+    def popup(self):
+        if self._popup is None:
+            from ui.popup import PopupResult
+
+            self._popup = PopupResult()
+            # 绑定弹窗关闭信号，用于中断 AI 请求
+            self._popup.closed_signal.connect(self.cancel_current_task)
+        return self._popup
 
     def force_show_window(self):
-        self.showNormal()
-        self.show()
+        window = self.ensure_window()
+        window.showNormal()
+        window.show()
         # self.raise_()
         # self.activateWindow()
 
+    def start_profiling(self):
+        runs = max(1, self.cfg.get("profile_runs") or 1)
+        self.profiler.max_bytes = int(self.cfg.get("diagnostics_max_mb") * 1024 * 1024)
+        self.profiler.arm(runs)
+        self.append_log(f"🩺 性能诊断已开启，记录接下来 {runs} 次任务 -> {self.profiler.directory}")
+        self.tray_icon.showMessage("SyntaxLens", f"接下来 {runs} 次任务将记录性能诊断")
+
+    def quit_app(self):
+        if self.window is not None:
+            self.window.force_quit = True
+        self.flush_logs()
+        QApplication.instance().quit()
+
+    def append_log(self, text):
+        # 线程安全，后台线程可以直接调用
+        self.log_buffer.log(text)
+
+    def apply_log_file(self):
+        self.log_buffer.set_path(self.cfg.get("log_file"),
+                                 max_bytes=int(self.cfg.get("log_max_kb") * 1024),
+                                 backups=self.cfg.get("log_backups"))
+
+    def flush_logs(self):
+        try:
+            self.log_buffer.flush_file()
+        except OSError as e:
+            self.log_buffer.set_path(None)
+            self.append_log(f"⚠️ 写日志文件失败，已停用: {e}")
+        # 设置窗口隐藏时不刷新控制台，显示后一次补齐
+        if self.window is not None and self.window.isVisible():
+            self.window.flush_logs()
+
+    def is_recording_mode(self):
+        return self.window is not None and self.window.is_recording_mode()
+
+    def on_metrics_updated(self):
+        if self.window is not None:
+            self.window.on_metrics_updated()
+        # 配置了 metrics_file 时写出快照
+        path = self.cfg.get("metrics_file")
+        if path:
+            try:
+                self.metrics.export(path)
+            except Exception as e:
+                self.append_log(f"⚠️ 写出统计失败: {e}")
+
     def preload_heavy_libs(self):
         try:
             import markdown2; from openai import OpenAI
         except Exception as e:
             self.append_log(f"预加载依赖失败: {e}")
+            return
+        self.warm_up_client()
+        self.load_dictionary()
+        self.load_similar_index()
+
+    def load_dictionary(self):
+        """后台打开本地词典 (源文件变化时重建索引)，失败时只记日志"""
+        with self._dictionary_lock:
+            self._load_dictionary()
+
+    def _load_dictionary(self):
+        source = self.cfg.get("dictionary_file")
+        old = self.services.dictionary
+        if old is not None and source and old.matches_source(source):
+            return
+        # 先摘下旧词典再关闭，正在查词的任务最多这一次查不到
+        self.services.dictionary = None
+        if old is not None:
+            old.close()
+        if not source:
+            return
+        try:
+            from core.dictionary import load_dictionary
+
+            self.services.dictionary = load_dictionary(source, log=self.append_log)
+            self.append_log(f"📖 本地词典已加载: {len(self.services.dictionary)} 个词条")
+        except Exception as e:
+            self.append_log(f"⚠️ 本地词典不可用: {e}")
+
+    def load_similar_index(self):
+        """启用相似选区缓存时在后台加载签名索引 (关闭后保留到退出，不再使用)"""
+        if not self.cfg.get("similar_cache_enabled") or self.response_cache is None:
+            return
+        # 检查和赋值在同一把锁里：并发加载时不会多打开一个没人关闭的 SQLite 连接
+        with self._similar_lock:
+            if self.services.similar_index is not None:
+                return
+            try:
+                from core.similar_cache import SimilarIndex
+
+                self.services.similar_index = SimilarIndex()
+                self.append_log(f"≈ 相似选区索引已加载: {len(self.services.similar_index)} 条")
+            except Exception as e:
+                self.append_log(f"⚠️ 相似选区索引不可用: {e}")
+
+    def active_providers(self):
+        providers = configured_providers(self.cfg)
+        return providers if self.cfg.get("hedge_enabled") else providers[:1]
+
+    def warm_up_client(self):
+        for provider in self.active_providers():
+            if not provider["api_key"]:
+                continue
+            if not self.client_pool.warm_up(provider["base_url"], provider["api_key"]):
+                self.append_log(f"⚠️ AI 连接预热失败 ({provider['name']})，将在首次请求时重试")
+
+    def on_config_updated(self, new_conf):
+        self.apply_log_file()
+        # 只在 base_url / api_key 变化时重建客户端
+        self.client_pool.retain([(p["base_url"], p["api_key"]) for p in self.active_providers()])
+        threading.Thread(target=self.warm_up_client, daemon=True).start()
+        threading.Thread(target=self.load_dictionary, daemon=True).start()
+        threading.Thread(target=self.load_similar_index, daemon=True).start()
+        # 限流配额可能变了，之后的请求按新配置重新开始
+        self.rate_limits.reset()
+        # 调度策略只影响之后提交的任务
+        self.scheduler.policy = self.cfg.get("task_policy")
+        self.scheduler.max_running = max(1, self.cfg.get("max_concurrent_tasks"))
+        self.scheduler.max_queue = max(0, self.cfg.get("task_queue_size"))
 
     def start_task_flow(self, task_type):
         if self.is_recording_mode(): return
-        if self.is_processing: return
-
-        self.is_processing = True
 
-        # 显示 "正在分析..."
-        # 注意：这里我们立即显示弹窗，但文字显示 "正在获取文本..."
-        self.popup.show_loading("准备中...")
+        task = self.scheduler.submit(task_type)
+        if task is None:
+            self.append_log(f"⏳ 任务队列已满 ({self.scheduler.max_queue})，忽略本次触发")
+            return
 
-        # 创建并启动后台线程
-        self.worker = WorkflowThread(self.cfg, task_type)
-        self.worker.stream_update.connect(lambda html: self.popup.update_stream_content(html, False))
-        self.worker.log_signal.connect(self.append_log)
-        self.worker.error_signal.connect(self.handle_error)
-        self.worker.finished_signal.connect(self.reset_state)
+        if self.scheduler.displayed is task:
+            # 显示 "正在分析..."
+            # 注意：这里我们立即显示弹窗，但文字显示 "正在获取文本..."
+            self.popup.show_loading("准备中...")
+        else:
+            self.append_log(f"🕒 任务 #{task.id} 已排队，关闭当前弹窗后显示")
+
+    def launch_worker(self, task):
+        # 由调度器在有空闲名额时调用，创建并启动后台线程
+        # 从热键触发 (提交任务) 开始计时
+        trace = self.metrics.trace(start=task.submitted_at, task=task.task_type)
+        worker = WorkflowThread(self.cfg, task, self.services, trace, profiler=self.profiler)
+        worker.stream_update.connect(self.handle_stream)
+        worker.log_signal.connect(self.append_log)
+        worker.error_signal.connect(self.handle_error)
+        worker.finished_signal.connect(self.handle_finished)
+        worker.finished.connect(partial(self.release_worker, task.id))
+        self.workers[task.id] = worker
+        worker.start()
+
+    def release_worker(self, task_id):
+        # QThread.finished 在 finished_signal 之后送达，此时历史和统计都已记录完
+        worker = self.workers.pop(task_id, None)
+        if worker is not None:
+            worker.release()
+
+    def deliver(self, task_id, item):
+        worker = self.workers.get(task_id)
+        if worker is not None and self.scheduler.route(worker.task, item):
+            self.show_item(item)
+
+    def show_item(self, item):
+        if item[0] == "stream":
+            self.popup.append_stream(item[1], item[2])
+        else:
+            self.popup.show_message(f"⚠️ {item[1]}")
 
-        self.worker.start()
+    def handle_stream(self, task_id, frozen_html, tail_html):
+        self.deliver(task_id, ("stream", frozen_html, tail_html))
 
     def cancel_current_task(self):
-        if self.worker and self.worker.isRunning():
+        # 弹窗被关闭：中断正在显示的任务，FIFO 模式下接着显示下一个
+        current = self.scheduler.displayed
+        if current is not None and not current.finished:
             self.append_log("🛑 用户关闭弹窗，已中断当前 AI 请求")
-            self.worker.cancel()
-            self.worker.requestInterruption()
-            self.reset_state()
+            worker = self.workers.get(current.id)
+            if worker is not None:
+                worker.requestInterruption()
 
-    def handle_error(self, msg):
-        self.append_log(f"❌ {msg}")
-        self.popup.show_message(f"⚠️ {msg}")
-        # error 也会触发 finished -> reset_state，所以这里不用手动 reset
+        next_task = self.scheduler.dismiss()
+        if next_task is not None:
+            self.popup.show_loading("准备中...")
+            for item in self.scheduler.take_outbox(next_task):
+                self.show_item(item)
 
-    def reset_state(self):
-        self.is_processing = False
-        # 任务结束，Worker 线程会自动销毁
+    def handle_error(self, task_id, msg):
+        self.append_log(f"❌ {msg}")
+        self.deliver(task_id, ("error", msg))
+        # error 也会触发 finished，所以这里不用手动结束任务
+
+    def handle_finished(self, task_id):
+        worker = self.workers.get(task_id)
+        if worker is None: return
+        # 最后一帧已经在这之前渲染完 (同一线程的信号按顺序送达)
+        if self.scheduler.displayed is worker.task:
+            worker.trace.mark("render")
+        worker.trace.finish("cancelled" if worker.task.cancelled else None)
+        self.scheduler.finish(worker.task)
+        self.record_history(worker)
+        self.on_metrics_updated()
+        stats = self.scheduler.stats()
+        if stats["wait_p95_ms"] is not None:
+            self.append_log(f"📋 调度: 运行 {stats['running']}，排队 {stats['queue_depth']}，"
+                            f"等待 p95 {stats['wait_p95_ms']}ms，被取代 {stats['superseded']}，"
+                            f"被拒绝 {stats['rejected']}")
+
+    def record_history(self, worker):
+        # 只保存完整的回答
+        workflow = worker.workflow
+        if self.history is None or worker.trace.outcome != "ok" or not workflow.text:
+            return
+        try:
+            self.history.add(workflow.task_type, workflow.model, workflow.source, workflow.text,
+                             {stage: round(seconds, 4) for stage, seconds in worker.trace.stages()})
+        except Exception as e:
+            self.append_log(f"⚠️ 保存历史失败: {e}")
+            return
+        if self.window is not None:
+            self.window.on_history_updated()
 
 
 def main():
@@ -404,11 +521,19 @@ def main():
         socket = QLocalSocket()
         socket.connectToServer(IPC_SERVER_NAME)
         if socket.waitForConnected(500):
-            socket.write(b"SHOW")
+            socket.write(encode_frame({"id": 0, "cmd": "show"}))
             socket.flush()
             socket.waitForBytesWritten(1000)
             return
 
+        if "--startup-probe" in sys.argv:
+            # 启动耗时测试用：热键注册完成 (或失败) 后打印耗时并退出
+            def report_startup(ok):
+                print(f"STARTUP hotkey_ready_ms={(time.perf_counter() - STARTUP_TIME) * 1000:.1f} ok={ok} "
+                      f"window={'ui.main_window' in sys.modules}", flush=True)
+                app.quit()
+            hotkey_signals.ready.connect(report_startup)
+
         from core.config import ConfigManager
         cfg = ConfigManager()
         win = SyntaxLensApp(cfg)
@@ -0,0 +1,234 @@
+"""
+本地 OpenAI 兼容的假服务端 (SSE 流式)
+只用于测试 / 基准：统计新建连接数和请求数，可配置首 token 延迟、token 速率 (或间隔) 和每个 SSE 事件的 token 数。
+token 也可以是 (相对请求开始的秒数, 文本) 的录制数据，按录制时的节奏回放 (见 load_recording / save_recording)。
+请求体里 stream 为 false 时返回普通的 JSON 结果 (带 usage)。
+可以注入限流：按顺序返回 failures 里的错误状态，或同时进行的请求超过 max_concurrent 时返回 429。
+也可以模拟新连接的握手耗时 (connect_delay) 和服务端关闭空闲连接 (keepalive_timeout)。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+    def setup(self):
+        owner = self.server.owner
+        # 空闲超过 keepalive_timeout 的连接由服务端关闭 (和真实服务一样)
+        self.timeout = owner.keepalive_timeout
+        super().setup()
+        owner._on_connection()
+        if owner.connect_delay:
+            time.sleep(owner.connect_delay)  # 模拟新连接的 TCP / TLS 握手耗时
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # 客户端断开 (例如对冲请求取消了输掉的一方)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        owner = self.server.owner
+        owner._on_request(self.path, None)
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": owner.model, "object": "model",
+                                                              "created": 0, "owned_by": "fake"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        owner = self.server.owner
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        owner._on_request(self.path, payload)
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        failure = owner._admit()
+        if failure is not None:
+            status, headers = failure
+            self._send_json(status, {"error": {"message": f"injected {status}", "type": "rate_limit_error"}},
+                            headers)
+            return
+        try:
+            self._respond(owner, payload)
+        finally:
+            owner._release()
+
+    def _respond(self, owner, payload):
+        started = time.monotonic()
+        tokens = owner.responder(payload) if owner.responder else owner.tokens
+        if not payload.get("stream"):
+            schedule = owner.schedule(tokens)
+            if schedule:
+                _sleep_until(started + schedule[-1][0])
+            self._send_json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": 0,
+                "model": payload.get("model", owner.model),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(_text(t) for t in tokens)}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": len(tokens), "total_tokens": 10 + len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            for offset, piece in owner.schedule(tokens):
+                _sleep_until(started + offset)
+                event = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0,
+                    "model": payload.get("model", owner.model),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端中途取消
+
+
+def _text(token):
+    return token[1] if isinstance(token, (tuple, list)) else token
+
+
+def _sleep_until(deadline):
+    # 按绝对时间排期，避免逐个 sleep 累积误差
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def load_recording(path):
+    """读取录制的流：每行 {"t": 相对请求开始的秒数, "content": 文本}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(event["t"], event["content"]) for event in map(json.loads, f) if event.get("content")]
+
+
+def save_recording(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        for t, content in events:
+            f.write(json.dumps({"t": round(t, 4), "content": content}, ensure_ascii=False) + "\n")
+
+
+class FakeOpenAIServer:
+    def __init__(self, tokens=("Hello", ", ", "world", "!"), first_token_delay=0.0, token_interval=0.0,
+                 model="fake-model", responder=None, token_rate=None, chunk_size=1, failures=(),
+                 max_concurrent=None, retry_after=None, connect_delay=0.0, keepalive_timeout=None):
+        """
+        :param tokens: 文本列表，或 (相对请求开始的秒数, 文本) 的录制数据 (此时忽略延迟参数，按录制节奏回放)
+        :param responder: 可选，根据请求体返回 token 列表 (在处理线程中调用，可以自行 sleep 模拟耗时)
+        :param token_rate: 每秒 token 数，设置后覆盖 token_interval
+        :param chunk_size: 每个 SSE 事件包含的 token 数
+        :param failures: [(状态码, 响应头)]，前几个聊天请求依次直接返回这些错误
+        :param max_concurrent: 同时进行的聊天请求超过这个数时返回 429 (带 retry_after 秒的 Retry-After 头)
+        :param connect_delay: 每个新连接处理第一个请求前的额外延迟 (秒)
+        :param keepalive_timeout: 连接空闲这么多秒后由服务端关闭，None 表示一直保持
+        """
+        self.tokens = list(tokens)
+        self.responder = responder
+        self.first_token_delay = first_token_delay
+        self.token_interval = 1.0 / token_rate if token_rate else token_interval
+        self.chunk_size = max(1, chunk_size)
+        self.model = model
+
+        self.failures = list(failures)
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.connect_delay = connect_delay
+        self.keepalive_timeout = keepalive_timeout
+
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+
+    def schedule(self, tokens):
+        """:return: [(相对请求开始的秒数, 这个 SSE 事件的文本)]"""
+        events = []
+        for start in range(0, len(tokens), self.chunk_size):
+            group = tokens[start:start + self.chunk_size]
+            last = group[-1]
+            if isinstance(last, (tuple, list)):
+                offset = last[0]
+            else:
+                offset = self.first_token_delay + (start + len(group) - 1) * self.token_interval
+            events.append((offset, "".join(_text(t) for t in group)))
+        return events
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _on_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _on_request(self, path, payload):
+        with self._lock:
+            self.requests.append((path, payload))
+
+    def _admit(self):
+        with self._lock:
+            if self.failures:
+                return self.failures.pop(0)
+            if self.max_concurrent is not None and self.active >= self.max_concurrent:
+                self.throttled += 1
+                return 429, {"Retry-After": str(self.retry_after)} if self.retry_after is not None else {}
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            return None
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
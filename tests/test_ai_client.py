@@ -0,0 +1,53 @@
+import unittest
+
+try:
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.ai_client import ClientPool, stream_chat
+from fake_openai_server import FakeOpenAIServer
+
+
+def stream_answer(client):
+    return "".join(stream_chat(client, "fake-model", [{"role": "user", "content": "hi"}], timeout=5))
+
+
+@unittest.skipIf(openai is None, "openai not installed")
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeOpenAIServer().start()
+        self.pool = ClientPool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.stop()
+
+    def test_requests_reuse_one_keep_alive_connection(self):
+        for _ in range(3):
+            client = self.pool.get(self.server.base_url, "sk-test")
+            self.assertEqual(stream_answer(client), "Hello, world!")
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_warm_up_opens_the_connection_used_by_the_first_request(self):
+        self.assertTrue(self.pool.warm_up(self.server.base_url, "sk-test"))
+        self.assertEqual(self.server.connections, 1)
+
+        stream_answer(self.pool.get(self.server.base_url, "sk-test"))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_config_change_rebuilds_client(self):
+        first = self.pool.get(self.server.base_url, "sk-old")
+        self.assertIs(self.pool.get(self.server.base_url, "sk-old"), first)
+
+        self.pool.retain([(self.server.base_url, "sk-new")])
+        self.assertEqual(len(self.pool), 0)
+        self.assertIsNot(self.pool.get(self.server.base_url, "sk-new"), first)
+
+    def test_warm_up_failure_is_reported(self):
+        self.assertFalse(self.pool.warm_up("http://127.0.0.1:9/v1", "sk-test", timeout=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
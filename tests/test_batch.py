@@ -0,0 +1,130 @@
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+
+try:
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.batch import BatchRunner, main as batch_main, read_items, resume_point
+from fake_openai_server import FakeOpenAIServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def echo_responder(payload):
+    """随机耗时后把输入句子包进 <fixed>，用来检查输出是否按输入顺序写入"""
+    time.sleep(random.uniform(0, 0.05))
+    text = payload["messages"][-1]["content"].split("```text\n")[1].split("\n```")[0]
+    return ["Fixed: ", f"<fixed>{text.upper()}</fixed>"]
+
+
+class SlowHeadClient:
+    """第一条很慢、其余立即返回的假 AsyncOpenAI"""
+
+    def __init__(self, head_delay):
+        self.head_delay = head_delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, timeout):
+        if "item 0\n" in messages[-1]["content"]:
+            await asyncio.sleep(self.head_delay)
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class TestBatchMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input_path = os.path.join(self.tmp.name, "sentences.txt")
+        self.output_path = os.path.join(self.tmp.name, "results.jsonl")
+        self.config_path = os.path.join(self.tmp.name, "config.json")
+        self.sentences = [f"sentence number {i}" for i in range(40)]
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.sentences) + "\n\n")
+
+    def write_config(self, base_url):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump({"api_key": "sk-test", "base_url": base_url, "model": "fake-model"}, f)
+
+    def run_batch(self, *extra):
+        return batch_main(["--in", self.input_path, "--out", self.output_path,
+                           "--config", self.config_path, *extra])
+
+    def read_output(self):
+        with open(self.output_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_read_items_by_line_and_paragraph(self):
+        self.assertEqual(len(read_items(self.input_path)), 40)
+        with open(self.input_path, "w", encoding="utf-8") as f:
+            f.write("first line\nstill first\n\n\nsecond\n")
+        self.assertEqual(read_items(self.input_path, "paragraph"), ["first line\nstill first", "second"])
+
+    def test_resume_point_truncates_partial_and_failed_records(self):
+        with open(self.output_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"index": 0, "input": self.sentences[0], "output": "ok"}) + "\n")
+            f.write(json.dumps({"index": 1, "input": self.sentences[1], "error": "timeout"}) + "\n")
+            f.write(json.dumps({"index": 2, "input": self.sentences[2], "output": "ok"}) + "\n")
+        self.assertEqual(resume_point(self.output_path, self.sentences), 1)
+        self.assertEqual(len(self.read_output()), 1)
+
+    @unittest.skipIf(openai is None, "openai not installed")
+    def test_concurrent_results_are_written_in_input_order_and_resumable(self):
+        with FakeOpenAIServer(responder=echo_responder) as server:
+            self.write_config(server.base_url)
+            self.assertEqual(self.run_batch("--concurrency", "8"), 0)
+
+            records = self.read_output()
+            self.assertEqual([r["index"] for r in records], list(range(40)))
+            self.assertEqual([r["fixed"] for r in records], [s.upper() for s in self.sentences])
+            self.assertTrue(all(r["completion_tokens"] > 0 for r in records))
+
+            # 模拟中途被打断：保留前 25 条和半行，再次运行只补剩下的 15 条
+            with open(self.output_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            with open(self.output_path, "w", encoding="utf-8") as f:
+                f.writelines(lines[:25])
+                f.write(lines[25][:10])
+            requests_before = len(server.requests)
+
+            self.assertEqual(self.run_batch("--concurrency", "4"), 0)
+            self.assertEqual(len(server.requests) - requests_before, 15)
+            self.assertEqual([r["index"] for r in self.read_output()], list(range(40)))
+
+    def test_slow_item_bounds_how_far_submission_runs_ahead(self):
+        items = [f"item {i}" for i in range(200)]
+        runner = BatchRunner(SlowHeadClient(0.2), "fake-model", "prompt", "translate", concurrency=4, max_ahead=8)
+        out_file = io.StringIO()
+        asyncio.run(runner.run(items, out_file))
+
+        records = [json.loads(line) for line in out_file.getvalue().splitlines()]
+        self.assertEqual([r["index"] for r in records], list(range(200)))
+        # 第一条卡住时后面最多先做完 7 条，不会把剩下 199 条的结果都堆在内存里
+        self.assertLessEqual(runner.max_buffered, 8)
+        self.assertEqual(runner.summary()["completed"], 200)
+
+    def test_batch_entry_does_not_import_qt(self):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            json.dump({"api_key": ""}, f)
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "main.py", "batch", "--in", self.input_path,
+             "--out", self.output_path, "--config", self.config_path],
+            cwd=ROOT, capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 2)  # 没有 api_key，在发请求前退出
+        self.assertIn("core.batch", result.stderr)
+        self.assertNotIn("PyQt6", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from core.capture import TextCapture
+from core.capture_stats import CaptureStats
+from core.clipboard import FakeClipboard
+from core.hardware import RecordingBackend, DIK_LCONTROL, DIK_INSERT, DIK_C, DIK_HOME
+
+
+class FakeApp(RecordingBackend):
+    """模拟前台程序：收到指定组合键后过一段时间把选中文本写进剪贴板"""
+
+    def __init__(self, clipboard, selection, accepts=(DIK_INSERT, DIK_C), latency=0.01, require_home=False):
+        super().__init__()
+        self.clipboard = clipboard
+        self.selection = selection
+        self.accepts = accepts
+        self.latency = latency
+        self.require_home = require_home  # 只有先按 Home 全选当前行后复制才有内容
+        self.down = set()
+
+    def send(self, inputs, count):
+        super().send(inputs, count)
+        for code, is_press in self.batches[-1][1]:
+            if not is_press:
+                self.down.discard(code)
+                continue
+            self.down.add(code)
+            if DIK_LCONTROL in self.down and code in self.accepts:
+                if not self.require_home or (DIK_HOME, True) in self.events:
+                    self.clipboard.copy_after(self.selection, self.latency)
+
+
+def no_sleep(seconds):
+    pass
+
+
+class TestTextCapture(unittest.TestCase):
+    def test_capture_returns_as_soon_as_clipboard_changes(self):
+        clipboard = FakeClipboard("original")
+        app = FakeApp(clipboard, "  selected text \n", latency=0.03)
+        start = time.perf_counter()
+        text = TextCapture(clipboard, keyboard=app, log=lambda msg: None, sleep=no_sleep).capture()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(text, "selected text")
+        self.assertLess(elapsed, 0.3)  # 远小于 400ms 的轮询超时
+        self.assertEqual(clipboard.get_text(), "original")  # 恢复原剪贴板
+        self.assertFalse(app.down)  # 所有按键都已松开
+
+    def test_falls_back_to_ctrl_c(self):
+        clipboard = FakeClipboard("original")
+        app = FakeApp(clipboard, "only ctrl c", accepts=(DIK_C,))
+        text = TextCapture(clipboard, keyboard=app, log=lambda msg: None, sleep=no_sleep).capture()
+        self.assertEqual(text, "only ctrl c")
+
+    def test_nothing_selected_returns_none(self):
+        clipboard = FakeClipboard("original")
+        app = FakeApp(clipboard, "", accepts=())
+        text = TextCapture(clipboard, keyboard=app, log=lambda msg: None, sleep=no_sleep).capture()
+        self.assertIsNone(text)
+        self.assertEqual(clipboard.get_text(), "original")
+
+
+class TestAdaptiveCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "capture_stats.json")
+        self.clipboard = FakeClipboard("original")
+
+    def run_capture(self, app, app_id, stats):
+        app.batches.clear()
+        capture = TextCapture(self.clipboard, keyboard=app, log=lambda msg: None, sleep=no_sleep,
+                              stats=stats, active_app=lambda: app_id)
+        start = time.perf_counter()
+        text = capture.capture()
+        return text, time.perf_counter() - start, capture.last_strategy
+
+    def test_learns_successful_strategy_and_shortens_wait(self):
+        stats = CaptureStats(self.path)
+        app = FakeApp(self.clipboard, "hello", accepts=(DIK_C,), latency=0.02)
+
+        _, first_elapsed, strategy = self.run_capture(app, "notepad.exe", stats)
+        self.assertEqual(strategy, "ctrl_c")
+        self.assertGreaterEqual(first_elapsed, 0.4)  # 先等满了 Ctrl+Insert 的超时
+
+        for _ in range(3):
+            self.run_capture(app, "notepad.exe", stats)
+        text, elapsed, strategy = self.run_capture(app, "notepad.exe", stats)
+        self.assertEqual((text, strategy), ("hello", "ctrl_c"))
+        self.assertNotIn((DIK_INSERT, True), app.events)
+        self.assertLess(elapsed, 0.2)
+
+        plan = CaptureStats(self.path).plan("notepad.exe", [("ctrl_insert", 0.4), ("ctrl_c", 0.4)])
+        self.assertEqual(plan[0][0], "ctrl_c")
+        self.assertLess(plan[0][1], 0.4)  # 超时来自 p95 延迟 + 余量
+
+        # 其他程序不受影响
+        other = FakeApp(self.clipboard, "x", latency=0.0)
+        self.assertEqual(self.run_capture(other, "code.exe", stats)[2], "ctrl_insert")
+
+    def test_select_line_moves_first_only_when_copy_never_works(self):
+        stats = CaptureStats(self.path)
+        app = FakeApp(self.clipboard, "whole line", accepts=(DIK_C,), latency=0.0, require_home=True)
+
+        for _ in range(3):
+            self.assertEqual(self.run_capture(app, "game.exe", stats)[2], "select_line")
+        _, elapsed, strategy = self.run_capture(app, "game.exe", stats)
+        self.assertEqual(strategy, "select_line")
+        self.assertEqual(app.events[0], (DIK_HOME, True))
+        self.assertLess(elapsed, 0.2)
+
+
+try:
+    from PyQt6.QtCore import QCoreApplication, QEventLoop
+    from PyQt6.QtWidgets import QApplication
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    QApplication = None
+
+
+@unittest.skipIf(QApplication is None, "PyQt6 not installed")
+class TestQtClipboardBackend(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_background_thread_is_notified_of_changes(self):
+        from ui.clipboard_qt import QtClipboardBackend
+
+        backend = QtClipboardBackend()
+        token = backend.begin_watch()
+        result = {}
+
+        def worker():
+            result["text"] = backend.wait_for_text(token, 2.0)
+            backend.set_text("written from worker")
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        QApplication.clipboard().setText("copied by app")
+        deadline = time.monotonic() + 2
+        while thread.is_alive() and time.monotonic() < deadline:
+            QCoreApplication.processEvents(QEventLoop.ProcessEventsFlag.AllEvents, 10)
+        thread.join(1)
+
+        self.assertEqual(result["text"], "copied by app")
+        self.assertEqual(QApplication.clipboard().text(), "written from worker")
+        self.assertEqual(backend.get_text(), "written from worker")
+
+
+if __name__ == "__main__":
+    unittest.main()
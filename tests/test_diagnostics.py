@@ -0,0 +1,150 @@
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import tracemalloc
+import unittest
+
+from core.diagnostics import ENV_RUNS, Profiler, config_hash, runs_from_env
+from core.metrics import MetricsRegistry
+
+
+def busy_work():
+    data = [str(i) * 10 for i in range(20000)]
+    return len(data)
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = os.path.join(self.tmp.name, "diagnostics")
+        self.logs = []
+
+    def files(self):
+        return sorted(os.listdir(self.dir)) if os.path.isdir(self.dir) else []
+
+    def test_disabled_runs_directly(self):
+        profiler = Profiler(self.dir)
+        self.assertEqual(profiler.run(busy_work), 20000)
+        self.assertEqual(self.files(), [])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_profiles_next_n_runs_with_report(self):
+        profiler = Profiler(self.dir, log=self.logs.append)
+        profiler.arm(2)
+        trace = MetricsRegistry().trace(task="grammar")
+        trace.mark("capture")
+        config = {"model": "m", "api_key": "sk-secret"}
+        for _ in range(3):
+            self.assertEqual(profiler.run(busy_work, name="grammar-1", config=config, trace=trace), 20000)
+
+        files = self.files()
+        self.assertEqual(len(files), 4)  # 只有前两次：各一个 .prof + .txt
+        self.assertEqual(profiler.remaining, 0)
+        self.assertFalse(tracemalloc.is_tracing())
+        prof = [name for name in files if name.endswith(".prof")][0]
+        self.assertTrue(pstats.Stats(os.path.join(self.dir, prof)).total_calls > 0)
+
+        with open(os.path.join(self.dir, files[1]), encoding="utf-8") as f:
+            report = f.read()
+        self.assertIn(f"配置哈希: {config_hash(config)}", report)
+        self.assertIn("capture", report)
+        self.assertIn("busy_work", report)
+        self.assertIn("test_diagnostics.py", report)  # 分配最多的代码行
+        self.assertNotIn("sk-secret", report)
+        self.assertEqual(len(self.logs), 2)
+
+    def test_report_written_when_run_raises(self):
+        profiler = Profiler(self.dir)
+        profiler.arm(1)
+
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            profiler.run(fail)
+        self.assertEqual(len(self.files()), 2)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_folder_size_is_capped(self):
+        profiler = Profiler(self.dir, max_bytes=1)
+        os.makedirs(self.dir)
+        with open(os.path.join(self.dir, "old.txt"), "w") as f:
+            f.write("x" * 1000)
+        os.utime(os.path.join(self.dir, "old.txt"), (1, 1))
+        profiler.arm(1)
+        profiler.run(busy_work)
+        # 最旧的先删，直到总大小不超过上限
+        self.assertNotIn("old.txt", self.files())
+        self.assertLessEqual(sum(os.path.getsize(os.path.join(self.dir, n)) for n in self.files()), 1)
+
+    def test_concurrent_run_is_not_profiled_and_keeps_its_turn(self):
+        profiler = Profiler(self.dir)
+        profiler.arm(2)
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            entered.set()
+            release.wait(5)
+            return "slow"
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(profiler.run(slow, name="first")))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        # 第一次还在诊断：第二个任务照常执行，不报错，也不占用次数
+        self.assertEqual(profiler.run(busy_work, name="second"), 20000)
+        self.assertEqual(profiler.remaining, 1)
+        release.set()
+        first.join(5)
+
+        self.assertEqual(results, ["slow"])
+        self.assertEqual(len(self.files()), 2)
+        self.assertEqual(profiler.run(busy_work, name="third"), 20000)
+        self.assertEqual(profiler.remaining, 0)
+        self.assertEqual(len(self.files()), 4)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    @unittest.skipIf(sys.version_info < (3, 12), "只有 3.12+ 的 cProfile 是进程级的")
+    def test_runs_unprofiled_when_another_profiler_is_active(self):
+        import cProfile
+
+        other = cProfile.Profile()
+        other.enable()
+        try:
+            profiler = Profiler(self.dir, log=self.logs.append)
+            profiler.arm(1)
+            self.assertEqual(profiler.run(busy_work), 20000)
+        finally:
+            other.disable()
+        self.assertEqual(self.files(), [])
+        self.assertTrue(self.logs[0].startswith("⚠️"))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_leaves_existing_tracemalloc_running(self):
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        profiler = Profiler(self.dir)
+        profiler.arm(1)
+        profiler.run(busy_work)
+        self.assertTrue(tracemalloc.is_tracing())
+
+
+class TestHelpers(unittest.TestCase):
+    def test_config_hash_ignores_secrets(self):
+        base = {"model": "m", "api_key": "a", "providers": [{"base_url": "u", "api_key": "x"}]}
+        same = {"model": "m", "api_key": "b", "providers": [{"base_url": "u", "api_key": "y"}]}
+        self.assertEqual(config_hash(base), config_hash(same))
+        self.assertNotEqual(config_hash(base), config_hash(dict(base, model="n")))
+
+    def test_runs_from_env(self):
+        self.assertEqual(runs_from_env({ENV_RUNS: "3"}), 3)
+        self.assertEqual(runs_from_env({ENV_RUNS: "many"}), 0)
+        self.assertEqual(runs_from_env({}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import gzip
+import os
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.dictionary import MmapDictionary, build_index, is_short_selection, load_dictionary
+
+TSV = """# word\tdefinition
+apple\tn. 苹果
+Run\tv. 跑\\nn. 跑步
+run\tv. 经营
+city\tn. 城市
+stop\tv. 停止
+ice cream\tn. 冰淇淋
+你好\tint. hello
+"""
+
+
+class TestMmapDictionary(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.source = os.path.join(self.tmp.name, "words.tsv")
+        self.index = os.path.join(self.tmp.name, "words.sldx")
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write(TSV)
+
+    def open(self):
+        dictionary = load_dictionary(self.source, self.index)
+        self.addCleanup(dictionary.close)
+        return dictionary
+
+    def test_lookup_normalizes_and_merges_duplicates(self):
+        dictionary = self.open()
+        self.assertEqual(len(dictionary), 6)
+        self.assertEqual(dictionary.lookup("Apple,"), ("apple", "n. 苹果"))
+        self.assertEqual(dictionary.lookup("  ICE   cream "), ("ice cream", "n. 冰淇淋"))
+        self.assertEqual(dictionary.lookup("run")[1], "v. 跑\nn. 跑步\n\nv. 经营")
+        self.assertEqual(dictionary.lookup("你好"), ("你好", "int. hello"))
+        self.assertIsNone(dictionary.lookup("banana"))
+
+    def test_inflected_forms_fall_back_to_lemma(self):
+        dictionary = self.open()
+        self.assertEqual(dictionary.lookup("apples")[0], "apple")
+        self.assertEqual(dictionary.lookup("cities")[0], "city")
+        self.assertEqual(dictionary.lookup("running")[0], "run")
+        self.assertEqual(dictionary.lookup("stopped")[0], "stop")
+
+    def test_lemma_keeps_silent_e_before_bare_stem(self):
+        # 同时收录了去掉 e 后的另一个词：先试保留 e 的词形，否则 notes 会查成 not
+        with open(self.source, "w", encoding="utf-8") as f:
+            f.write("not\tadv. 不\nnote\tn. 笔记\nhop\tv. 跳\nhope\tv. 希望\nus\tpron. 我们\n"
+                    "use\tv. 使用\nrat\tn. 老鼠\nrate\tn. 比率\ncar\tn. 汽车\ncare\tv. 关心\n"
+                    "box\tn. 盒子\nwalk\tv. 走\nsing\tv. 唱\nsinge\tv. 烧焦\nbe\tv. 是\nbee\tn. 蜜蜂\n")
+        dictionary = self.open()
+        expected = {"notes": "note", "hoped": "hope", "hoping": "hope", "hops": "hop", "uses": "use",
+                    "used": "use", "using": "use", "rates": "rate", "cares": "care", "cared": "care",
+                    "boxes": "box", "walked": "walk", "singing": "sing", "being": "be"}
+        for word, lemma in expected.items():
+            with self.subTest(word=word):
+                self.assertEqual(dictionary.lookup(word)[0], lemma)
+
+    def test_index_is_rebuilt_for_a_different_source_path(self):
+        self.open()
+        other = os.path.join(self.tmp.name, "other.tsv")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write(TSV.replace("apple\tn. 苹果", "apple\tn. 苹菓"))  # 大小相同
+        stat = os.stat(self.source)
+        os.utime(other, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(os.path.getsize(other), os.path.getsize(self.source))
+
+        dictionary = load_dictionary(other, self.index)
+        self.addCleanup(dictionary.close)
+        self.assertEqual(dictionary.lookup("apple")[1], "n. 苹菓")
+
+    def test_index_is_rebuilt_when_source_changes(self):
+        self.open()
+        with open(self.source, "a", encoding="utf-8") as f:
+            f.write("banana\tn. 香蕉\n")
+        os.utime(self.source, (time.time() + 10, time.time() + 10))
+        self.assertEqual(self.open().lookup("banana")[1], "n. 香蕉")
+
+    def test_concurrent_builds_leave_a_valid_index(self):
+        errors = []
+
+        def build():
+            try:
+                for _ in range(20):
+                    build_index(self.source, self.index)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=build) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.open().lookup("apple")[1], "n. 苹果")
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["words.sldx", "words.tsv"])  # 没有留下临时文件
+
+    def test_invalid_index_is_rejected(self):
+        with open(self.index, "wb") as f:
+            f.write(b"not an index at all, definitely")
+        with self.assertRaises(ValueError):
+            MmapDictionary(self.index)
+        # load_dictionary 会直接重建
+        self.assertEqual(self.open().lookup("apple")[0], "apple")
+
+    def test_reads_stardict_export(self):
+        base = os.path.join(self.tmp.name, "star")
+        entries = [("bee", "n. 蜜蜂"), ("cat", "n. 猫")]
+        data = b""
+        index = b""
+        for word, definition in entries:
+            raw = definition.encode("utf-8")
+            index += word.encode("utf-8") + b"\0" + struct.pack(">II", len(data), len(raw))
+            data += raw
+        with open(base + ".ifo", "w", encoding="utf-8") as f:
+            f.write("StarDict's dict ifo file\nversion=2.4.2\nwordcount=2\nsametypesequence=m\n")
+        with open(base + ".idx", "wb") as f:
+            f.write(index)
+        with gzip.open(base + ".dict.dz", "wb") as f:
+            f.write(data)
+
+        self.assertEqual(build_index(base + ".ifo", self.index), 2)
+        dictionary = MmapDictionary(self.index)
+        self.addCleanup(dictionary.close)
+        self.assertEqual(dictionary.lookup("Cat"), ("cat", "n. 猫"))
+
+    def test_short_selection(self):
+        self.assertTrue(is_short_selection(" apple ", 3))
+        self.assertTrue(is_short_selection("ice cream", 3))
+        self.assertFalse(is_short_selection("one two three four", 3))
+        self.assertFalse(is_short_selection("line\nbreak", 3))
+        self.assertTrue(is_short_selection("你好", 3))
+        self.assertFalse(is_short_selection("这是一个比较长的中文句子，不适合查词典", 3))
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestWorkflowDictionary(unittest.TestCase):
+    def run_translate(self, dictionary_ai):
+        from core.ai_client import ClientPool
+        from core.clipboard import FakeClipboard
+        from core.config import ConfigManager
+        from core.metrics import MetricsRegistry
+        from core.response_cache import InflightRequests
+        from core.scheduler import Task
+        from core.workflow import Workflow, WorkflowServices
+        from fake_openai_server import FakeOpenAIServer
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        source = os.path.join(tmp.name, "words.tsv")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write(TSV)
+        dictionary = load_dictionary(source, os.path.join(tmp.name, "words.sldx"))
+        self.addCleanup(dictionary.close)
+
+        server = FakeOpenAIServer(tokens=["AI 翻译"], first_token_delay=0.1).start()
+        self.addCleanup(server.stop)
+        pool = ClientPool()
+        self.addCleanup(pool.close)
+        cfg = ConfigManager(os.path.join(tmp.name, "config.json"))
+        cfg.config.update({"base_url": server.base_url, "api_key": "sk-test", "model": "fake-model",
+                           "stream_fps": 0, "dictionary_ai": dictionary_ai})
+        frames = []
+        trace = MetricsRegistry().trace()
+        services = WorkflowServices(FakeClipboard(""), pool, InflightRequests(), dictionary=dictionary)
+        workflow = Workflow(cfg, Task(1, "translate", time.monotonic()), services, trace,
+                            on_stream=lambda frozen, tail: frames.append(frozen + tail), capture=lambda: "Apples")
+        workflow.run()
+        return server, workflow, trace, frames
+
+    def test_entry_is_shown_before_the_ai_answer(self):
+        server, workflow, trace, frames = self.run_translate(dictionary_ai=True)
+        self.assertIn("苹果", frames[0])
+        self.assertTrue(workflow.text.startswith("📖 **apple**"))
+        self.assertTrue(workflow.text.endswith("AI 翻译"))
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual([stage for stage, _ in trace.stages()][:3], ["queue", "capture", "dictionary"])
+
+    def test_dictionary_only_skips_the_network(self):
+        server, workflow, _, frames = self.run_translate(dictionary_ai=False)
+        self.assertEqual(len(server.requests), 0)
+        self.assertEqual(len(frames), 1)
+        self.assertIn("苹果", workflow.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import re
+import tempfile
+import time
+import unittest
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.fixed_tags import FixedTagScanner, strip_tags
+
+ANSWER = "## 分析\n\n时态错误。\n\n<fixed>I have finished.</fixed>\n\n补充说明：a < b 不是标签。"
+
+
+def scan(chunks):
+    scanner = FixedTagScanner()
+    shown = []
+    closed = []
+    for chunk in chunks:
+        text, fixed = scanner.feed(chunk)
+        shown.append(text)
+        closed.extend(fixed)
+    shown.append(scanner.flush())
+    return "".join(shown), closed
+
+
+class TestFixedTagScanner(unittest.TestCase):
+    def test_whole_text(self):
+        shown, closed = scan([ANSWER])
+        self.assertEqual(shown, strip_tags(ANSWER))
+        self.assertEqual(closed, ["I have finished."])
+
+    def test_tags_split_at_every_position(self):
+        for cut in range(1, len(ANSWER)):
+            with self.subTest(cut=cut):
+                self.assertEqual(scan([ANSWER[:cut], ANSWER[cut:]]), (strip_tags(ANSWER), ["I have finished."]))
+
+    def test_one_character_chunks(self):
+        self.assertEqual(scan(list(ANSWER)), (strip_tags(ANSWER), ["I have finished."]))
+
+    def test_closes_as_soon_as_close_tag_arrives(self):
+        scanner = FixedTagScanner()
+        self.assertEqual(scanner.feed("x <fixed>A b"), ("x A b", []))
+        self.assertEqual(scanner.feed("c.</fix"), ("c.", []))
+        self.assertEqual(scanner.feed("ed> tail"), (" tail", ["A bc."]))
+
+    def test_multiple_and_stray_tags(self):
+        shown, closed = scan(["</fixed>a<fixed>one</fixed> b <fixed>two</fixed>"])
+        self.assertEqual((shown, closed), ("aone b two", ["one", "two"]))
+
+    def test_unclosed_tag_and_trailing_partial(self):
+        self.assertEqual(scan(["<fixed>never closed <fix"]), ("never closed <fix", []))
+        self.assertEqual(scan(["ends with <"]), ("ends with <", []))
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestStreamingCopy(unittest.TestCase):
+    """脚本化的流：纠错句子很早闭合，之后还有很长的说明"""
+
+    def setUp(self):
+        from core.ai_client import ClientPool
+        from core.config import ConfigManager
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = ClientPool()
+        self.addCleanup(self.pool.close)
+        self.cfg = ConfigManager(os.path.join(self.tmp.name, "config.json"))
+
+    def run_stream(self, tokens, source="I has finished.", **cfg):
+        from core.clipboard import FakeClipboard
+        from core.metrics import MetricsRegistry
+        from core.response_cache import InflightRequests
+        from core.scheduler import Task
+        from core.workflow import Workflow, WorkflowServices
+        from fake_openai_server import FakeOpenAIServer
+
+        server = FakeOpenAIServer(tokens=tokens).start()
+        self.addCleanup(server.stop)
+        self.cfg.config.update({"base_url": server.base_url, "api_key": "sk-test", "model": "fake-model",
+                                "stream_fps": 0, "auto_copy_grammar": True, "cache_enabled": False})
+        self.cfg.config.update(cfg)
+        clipboard = FakeClipboard("")
+        frames = []
+        workflow = Workflow(self.cfg, Task(1, "grammar", time.monotonic()),
+                            WorkflowServices(clipboard, self.pool, InflightRequests()), MetricsRegistry().trace(),
+                            on_stream=lambda frozen, tail: frames.append(frozen + tail),
+                            capture=lambda: source)
+        started = time.monotonic()
+        workflow.run()
+        return workflow, clipboard, frames, started, time.monotonic()
+
+    def test_copies_when_tag_closes_not_when_stream_ends(self):
+        tokens = [(0.01, "## 分析\n\n"), (0.02, "<fi"), (0.03, "xed>I have "), (0.04, "finished.</fi"),
+                  (0.05, "xed>\n\n")] + [(0.05 + 0.05 * i, f"说明 {i}。") for i in range(1, 11)]
+        workflow, clipboard, frames, started, ended = self.run_stream(tokens)
+
+        self.assertEqual(clipboard.writes, ["I have finished."])
+        early = workflow.fixed_copied_at - started
+        # 原来的做法：流结束后再用正则提取
+        regex = re.findall(r"<fixed>(.*?)</fixed>", workflow.text, re.DOTALL)[-1]
+        post_stream = ended - started
+        self.assertEqual(regex, "I have finished.")
+        self.assertLess(early, post_stream - 0.3, f"copied at {early * 1000:.0f}ms, stream ended at "
+                                                  f"{post_stream * 1000:.0f}ms")
+        # 显示里看不到标签，缓存 / 历史用的原文仍然保留
+        self.assertFalse(any("fixed" in frame for frame in frames))
+        self.assertIn("<fixed>I have finished.</fixed>", workflow.text)
+
+    def test_split_answers_copy_only_combined_result(self):
+        source = "\n\n".join(f"Sentence number {i} is here." for i in range(3))
+        workflow, clipboard, _, _, _ = self.run_stream([(0.0, "<fixed>Fixed.</fixed>")], source=source,
+                                                       split_chars=30, split_max_workers=3)
+        # 各段的 <fixed> 不复制，只复制最后合并的完整结果一次
+        self.assertEqual(workflow.text.count("<fixed>"), 4)
+        self.assertEqual(clipboard.writes, ["Fixed.\n\nFixed.\n\nFixed."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from core.hardware import (KeySequence, RecordingBackend, get_backend, set_backend, hard_click,
+                           DIK_LCONTROL, DIK_C, DIK_HOME, KEYEVENTF_EXTENDEDKEY)
+
+
+class FakeSleep:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, seconds):
+        self.calls.append(seconds)
+
+
+class TestKeySequence(unittest.TestCase):
+    def test_chord_is_sent_as_one_batch(self):
+        backend = RecordingBackend()
+        sleep = FakeSleep()
+        KeySequence.chord(DIK_LCONTROL, DIK_C).send(backend, sleep)
+
+        self.assertEqual(len(backend.batches), 1)
+        self.assertEqual(backend.events, [(DIK_LCONTROL, True), (DIK_C, True), (DIK_C, False), (DIK_LCONTROL, False)])
+        self.assertEqual(sleep.calls, [])
+
+    def test_step_delays_split_batches(self):
+        backend = RecordingBackend()
+        sleep = FakeSleep()
+        sequence = KeySequence.tap(DIK_HOME) + KeySequence([(DIK_C, True, 0.03), (DIK_C, False)])
+        sequence.send(backend, sleep)
+        self.assertEqual([len(batch) for _, batch in backend.batches], [3, 1])
+        self.assertEqual(sleep.calls, [0.03])
+
+        backend = RecordingBackend()
+        sleep = FakeSleep()
+        sequence.with_delay(0.02).send(backend, sleep)
+        self.assertEqual(len(backend.batches), 4)
+        self.assertEqual(sleep.calls, [0.02] * 4)
+
+    def test_compiled_inputs_are_reused(self):
+        sequence = KeySequence.chord(DIK_LCONTROL, DIK_HOME)
+        inputs = sequence._segments[0][0]
+        sequence.send(RecordingBackend())
+        self.assertIs(sequence._segments[0][0], inputs)
+        # Home 和 Ctrl 是扩展键
+        self.assertTrue(all(inputs[i].ii.ki.dwFlags & KEYEVENTF_EXTENDEDKEY for i in range(4)))
+
+    def test_global_backend_is_swappable(self):
+        backend = RecordingBackend()
+        old = set_backend(backend)
+        self.addCleanup(set_backend, old)
+        self.assertIs(get_backend(), backend)
+
+        hard_click(DIK_C)
+        KeySequence.tap(DIK_HOME).send()
+        self.assertEqual(backend.events, [(DIK_C, True), (DIK_C, False), (DIK_HOME, True), (DIK_HOME, False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
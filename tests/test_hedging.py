@@ -0,0 +1,133 @@
+import time
+import unittest
+
+try:
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.ai_client import ClientPool, stream_chat
+from core.hedging import TTFTStats, configured_providers, hedged_stream, provider_key, MIN_SAMPLES
+from fake_openai_server import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+class DictConfig:
+    def __init__(self, **values):
+        self.values = values
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+class TestProviders(unittest.TestCase):
+    def test_backups_inherit_primary_key_and_model(self):
+        cfg = DictConfig(base_url="https://api.deepseek.com", api_key="sk-main", model="deepseek-chat",
+                         providers=[{"base_url": "https://api.openai.com/v1", "model": "gpt-4o-mini"},
+                                    {"name": "kimi", "base_url": "https://api.moonshot.cn/v1", "api_key": "sk-k"}])
+        providers = configured_providers(cfg)
+        self.assertEqual([p["name"] for p in providers], ["api.deepseek.com", "api.openai.com", "kimi"])
+        self.assertEqual(providers[1]["api_key"], "sk-main")
+        self.assertEqual(providers[2]["model"], "deepseek-chat")
+
+    def test_hedge_delay_follows_ttft_percentile(self):
+        stats = TTFTStats(default_delay=2.0)
+        self.assertEqual(stats.hedge_delay("a"), 2.0)
+        for seconds in [0.5] * (MIN_SAMPLES - 1) + [0.9]:
+            stats.record("a", seconds)
+        self.assertEqual(stats.hedge_delay("a"), 0.9)
+        for _ in range(10):
+            stats.record("a", 30.0)
+        self.assertEqual(stats.hedge_delay("a"), stats.max_delay)
+
+
+@unittest.skipIf(openai is None, "openai not installed")
+class TestHedgedStream(unittest.TestCase):
+    def setUp(self):
+        self.pool = ClientPool()
+        self.servers = []
+        self.ended = {}  # provider 名 -> 流结束 (含被打断) 的时刻
+
+    def tearDown(self):
+        self.pool.close()
+        for server in self.servers:
+            server.stop()
+
+    def server(self, tokens, first_token_delay):
+        server = FakeOpenAIServer(tokens=tokens, first_token_delay=first_token_delay).start()
+        self.servers.append(server)
+        return {"name": tokens[0], "base_url": server.base_url, "api_key": "sk-test", "model": f"{tokens[0]}-model"}
+
+    def open_stream(self, provider, abort=None):
+        try:
+            yield from stream_chat(self.pool.get(provider["base_url"], provider["api_key"]), provider["model"],
+                                   MESSAGES, timeout=5, abort=abort)
+        finally:
+            self.ended[provider["name"]] = time.perf_counter()
+
+    def run_hedged(self, providers, **kwargs):
+        logs = []
+        start = time.perf_counter()
+        text = "".join(hedged_stream(providers, self.open_stream, log=logs.append, **kwargs))
+        return text, time.perf_counter() - start, logs
+
+    def test_fast_primary_never_hedges(self):
+        providers = [self.server(["primary"], 0.0), self.server(["backup"], 0.0)]
+        text, _, logs = self.run_hedged(providers, delay=0.5)
+        self.assertEqual(text, "primary")
+        self.assertEqual(len(self.servers[1].requests), 0)
+        self.assertEqual(logs, [])
+
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        stats = TTFTStats()
+        providers = [self.server(["primary"], 2.0), self.server(["backup"], 0.05)]
+        text, elapsed, logs = self.run_hedged(providers, delay=0.2, stats=stats)
+
+        self.assertEqual(text, "backup")
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(self.servers[1].requests), 1)
+        self.assertTrue(any("backup" in line and "🏁" in line for line in logs))
+        # 只记录赢家真实的首 token 延迟，输掉的主服务没有样本
+        self.assertEqual(stats.samples(provider_key(providers[0])), [])
+        self.assertEqual(len(stats.samples(provider_key(providers[1]))), 1)
+        self.assertLess(stats.samples(provider_key(providers[1]))[0], 0.5)
+
+    def test_losing_attempt_is_interrupted_and_winner_reported(self):
+        # 主服务一直不给首 token：输掉后阻塞的读取要立即被打断，而不是等到首 token 或超时
+        providers = [self.server(["primary"], 3.0), self.server(["backup"], 0.05)]
+        winners = []
+        text, _, _ = self.run_hedged(providers, delay=0.1, on_winner=winners.append)
+        finished = time.perf_counter()
+        self.assertEqual(text, "backup")
+        self.assertEqual(winners, [providers[1]])
+        for _ in range(50):
+            if "primary" in self.ended:
+                break
+            time.sleep(0.02)
+        self.assertLess(self.ended["primary"] - finished, 1.0)
+
+    def test_failing_primary_falls_through_immediately(self):
+        failing = {"name": "down", "base_url": "http://127.0.0.1:9/v1", "api_key": "sk-test", "model": "fake-model"}
+        providers = [failing, self.server(["backup"], 0.0)]
+        text, elapsed, _ = self.run_hedged(providers, delay=3.0)
+        self.assertEqual(text, "backup")
+        self.assertLess(elapsed, 2.5)
+
+    def test_all_failing_raises_last_error(self):
+        failing = {"name": "down", "base_url": "http://127.0.0.1:9/v1", "api_key": "sk-test", "model": "fake-model"}
+        with self.assertRaises(Exception):
+            self.run_hedged([failing, dict(failing, name="down2")], delay=0.1)
+
+    def test_auto_delay_learned_from_stats(self):
+        stats = TTFTStats(default_delay=5.0)
+        providers = [self.server(["primary"], 1.0), self.server(["backup"], 0.0)]
+        for _ in range(MIN_SAMPLES):
+            stats.record(provider_key(providers[0]), 0.1)
+        text, elapsed, _ = self.run_hedged(providers, stats=stats)
+        self.assertEqual(text, "backup")
+        self.assertLess(elapsed, 0.8)
+
+
+if __name__ == "__main__":
+    unittest.main()
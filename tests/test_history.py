@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from core.history import HistoryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = FakeClock()
+
+    def open(self, **kwargs):
+        store = HistoryStore(os.path.join(self.tmp.name, "history.db"), clock=self.clock, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_add_and_get_roundtrip(self):
+        store = self.open()
+        entry_id = store.add("grammar", "fake-model", "I has a pen.", "<fixed>I have a pen.</fixed>",
+                             {"ttft": 0.5})
+        entry = store.get(entry_id)
+        self.assertEqual(entry["source"], "I has a pen.")
+        self.assertEqual(entry["timings"], {"ttft": 0.5})
+        self.assertIsNone(store.get(entry_id + 1))
+
+    def test_full_text_search(self):
+        store = self.open()
+        store.add("grammar", "m", "I has a pen.", "主语是 I，谓语应为 have")
+        store.add("translate", "m", "The weather is nice today.", "今天天气很好")
+        store.add("translate", "m", "Good morning", "早上好")
+
+        self.assertEqual([r["preview"] for r in store.search("weather")], ["The weather is nice today."])
+        self.assertEqual([r["preview"] for r in store.search("天气很好")], ["The weather is nice today."])
+        # 少于 3 个字符的关键词走 LIKE
+        self.assertEqual([r["preview"] for r in store.search("早上")], ["Good morning"])
+        self.assertEqual(len(store.search("")), 3)
+        self.assertEqual(store.search('pen" OR "x'), [])  # 引号不会破坏查询
+
+    def test_pagination_is_newest_first(self):
+        store = self.open()
+        ids = [store.add("translate", "m", f"sentence {i}", "answer") for i in range(7)]
+        first = store.search("sentence", limit=3)
+        second = store.search("sentence", limit=3, before_id=first[-1]["id"])
+        self.assertEqual([r["id"] for r in first + second], ids[::-1][:6])
+
+    def test_retention_and_size_limits(self):
+        store = self.open(retention_days=1, max_bytes=100)
+        old_id = store.add("translate", "m", "old", "x")
+        self.clock.now += 2 * 86400
+        store.add("translate", "m", "new", "y")
+        self.assertIsNone(store.get(old_id))
+
+        for i in range(10):
+            store.add("translate", "m", f"entry {i}", "z" * 20)
+        self.assertLessEqual(store.stats()["bytes"], 100)
+        self.assertEqual(store.search("entry", limit=1)[0]["preview"], "entry 9")
+        # 被淘汰的记录也从全文索引里删掉了
+        self.assertEqual(store.search("entry 0"), [])
+
+    def test_size_limit_uses_running_total_across_reopen(self):
+        store = self.open(max_bytes=100)
+        ids = [store.add("translate", "m", f"entry {i}", "z" * 15) for i in range(4)]
+        store.delete(ids[0])
+        store.close()
+
+        # 重新打开时从表里载入总大小，之后只按增删维护
+        store = self.open(max_bytes=100)
+        for i in range(4, 8):
+            store.add("translate", "m", f"entry {i}", "z" * 15)
+        stats = store.stats()
+        self.assertLessEqual(stats["bytes"], 100)
+        self.assertEqual(stats["items"], 4)  # 每条 22 字节，上限内最多留 4 条
+        self.assertEqual(store.search("entry", limit=1)[0]["preview"], "entry 7")
+
+    def test_delete_and_clear(self):
+        store = self.open()
+        first = store.add("translate", "m", "alpha beta", "a")
+        store.add("translate", "m", "alpha gamma", "b")
+        store.delete(first)
+        self.assertEqual([r["preview"] for r in store.search("alpha")], ["alpha gamma"])
+        store.clear()
+        self.assertEqual(store.stats()["items"], 0)
+        self.assertEqual(store.search("alpha"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    from PyQt6.QtCore import QCoreApplication
+    from PyQt6.QtNetwork import QLocalSocket
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    QCoreApplication = None
+
+from core.ipc_protocol import FrameDecoder, ProtocolError, encode_frame
+
+if QCoreApplication is not None:
+    from core.ipc_client import IpcClient, IpcError
+    from ui.ipc_server import IpcServer
+
+
+class TestFraming(unittest.TestCase):
+    def test_frames_survive_arbitrary_splits(self):
+        messages = [{"id": i, "text": "语法" * i} for i in range(20)]
+        data = b"".join(encode_frame(m) for m in messages)
+        decoder = FrameDecoder()
+        received = []
+        for i in range(0, len(data), 7):
+            received.extend(decoder.feed(data[i:i + 7]))
+        self.assertEqual(received, messages)
+        self.assertEqual(decoder.pending_bytes, 0)
+
+    def test_oversized_or_garbage_frames_are_rejected(self):
+        with self.assertRaises(ProtocolError):
+            FrameDecoder(max_frame=10).feed(encode_frame({"text": "x" * 20}))
+        with self.assertRaises(ProtocolError):
+            FrameDecoder().feed(b"\x00\x00\x00\x03abc")
+
+
+def fake_analyze(task, text, on_delta):
+    """把原文按词流式返回；"slow" 每个词之间停一下，"fail" 直接报错"""
+    if text == "fail":
+        raise RuntimeError("boom")
+    for word in text.split():
+        if task.cancelled:
+            return
+        if text.startswith("slow"):
+            time.sleep(0.02)
+        on_delta(f"{task.task_type}:{word} ")
+
+
+@unittest.skipIf(QCoreApplication is None, "PyQt6 not installed")
+class TestIpcServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.name = f"syntaxlens-test-{os.getpid()}-{id(self)}"
+        self.server = IpcServer(self.name, fake_analyze, stats=lambda: {"cache": {"hits": 3}}, max_workers=4)
+        self.shown = []
+        self.server.show_requested.connect(lambda: self.shown.append(True))
+        self.assertTrue(self.server.listen())
+        self.addCleanup(self.server.close)
+
+    def run_clients(self, target, count=1, timeout=20):
+        """客户端在线程里跑，主线程处理 Qt 事件 (与应用里 GUI 线程的角色一样)"""
+        results = [None] * count
+        errors = []
+
+        def runner(i):
+            try:
+                results[i] = target(i)
+            except Exception as e:  # pragma: no cover - 失败时由断言报告
+                errors.append(e)
+
+        threads = [threading.Thread(target=runner, args=(i,), daemon=True) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + timeout
+        while any(t.is_alive() for t in threads) and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.assertFalse(errors, errors)
+        self.assertFalse(any(t.is_alive() for t in threads), "clients timed out")
+        return results
+
+    def test_analyze_streams_deltas(self):
+        def client(i):
+            with IpcClient(self.name) as c:
+                return "".join(c.analyze("I has a pen", task="grammar"))
+
+        self.assertEqual(self.run_clients(client), ["grammar:I grammar:has grammar:a grammar:pen "])
+
+    def test_errors_stats_and_show(self):
+        def client(i):
+            with IpcClient(self.name) as c:
+                with self.assertRaises(IpcError):
+                    list(c.analyze("fail"))
+                with self.assertRaises(IpcError):
+                    list(c.analyze("text", task="poem"))
+                c.show()
+                return c.stats()
+
+        stats = self.run_clients(client)[0]
+        self.assertEqual(stats["failed"], 1)
+        self.assertEqual(stats["cache"], {"hits": 3})
+        self.assertEqual(self.shown, [True])
+
+    def test_cancel_stops_a_running_request(self):
+        def client(i):
+            with IpcClient(self.name) as c:
+                request_id = c.start_analyze("slow " + "word " * 200, task="translate")
+                stream = c.stream(request_id)
+                first = next(stream)
+                c.cancel(request_id)
+                rest = list(stream)
+                return first, len(rest)
+
+        first, rest = self.run_clients(client)[0]
+        self.assertEqual(first, "translate:slow ")
+        self.assertLess(rest, 100)
+
+    def test_legacy_show_command(self):
+        socket = QLocalSocket()
+        socket.connectToServer(self.name)
+        self.assertTrue(socket.waitForConnected(1000))
+        socket.write(b"SHOW")
+        socket.flush()
+        deadline = time.monotonic() + 5
+        while not self.shown and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.001)
+        self.assertEqual(self.shown, [True])
+        socket.abort()
+
+    def test_throughput_with_concurrent_clients(self):
+        clients, requests, words = 8, 25, 40
+        text = " ".join(f"w{i}" for i in range(words))
+        expected = "".join(f"grammar:w{i} " for i in range(words))
+
+        def client(i):
+            with IpcClient(self.name) as c:
+                # 每个连接上同时挂 5 个请求，检查按 id 分发
+                done = 0
+                for _ in range(requests // 5):
+                    ids = [c.start_analyze(text) for _ in range(5)]
+                    for request_id in ids:
+                        self.assertEqual("".join(c.stream(request_id)), expected)
+                        done += 1
+                return done
+
+        start = time.monotonic()
+        results = self.run_clients(client, count=clients, timeout=60)
+        elapsed = time.monotonic() - start
+        total = sum(results)
+        self.assertEqual(total, clients * requests)
+        frames = total * (words + 1)
+        self.assertGreater(total / elapsed, 20, f"{total} 个请求 {frames} 帧用时 {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    unittest.main()
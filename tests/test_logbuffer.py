@@ -0,0 +1,68 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from core.logbuffer import ERROR, INFO, WARNING, LogBuffer
+
+
+class TestLogBuffer(unittest.TestCase):
+    def test_levels_are_inferred_from_prefix(self):
+        buffer = LogBuffer()
+        self.assertEqual(buffer.log("✅ 系统就绪").level, INFO)
+        self.assertEqual(buffer.log("⚠️ 回答缓存不可用").level, WARNING)
+        self.assertEqual(buffer.log("❌ 错误: boom").level, ERROR)
+        self.assertEqual(buffer.log("plain", level=ERROR).level, ERROR)
+
+    def test_ring_buffer_keeps_latest_records(self):
+        buffer = LogBuffer(capacity=5)
+        for i in range(12):
+            buffer.log(f"line {i}")
+        self.assertEqual([r.message for r in buffer.snapshot()], [f"line {i}" for i in range(7, 12)])
+        # 读者落后太多时只拿到还在缓冲里的
+        self.assertEqual([r.seq for r in buffer.since(2)], [8, 9, 10, 11, 12])
+        self.assertEqual([r.seq for r in buffer.since(10)], [11, 12])
+        self.assertEqual(buffer.since(12), [])
+
+    def test_concurrent_writers(self):
+        buffer = LogBuffer(capacity=10000)
+
+        def writer(n):
+            for i in range(500):
+                buffer.log(f"{n}-{i}")
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seqs = [r.seq for r in buffer.snapshot()]
+        self.assertEqual(seqs, list(range(1, 4001)))
+
+    def test_file_is_written_in_batches_and_rotated(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "app.log")
+            buffer = LogBuffer(path=path, max_bytes=300, backups=2)
+            self.assertEqual(buffer.flush_file(), 0)
+            for i in range(3):
+                buffer.log(f"message {i}")
+            self.assertEqual(buffer.flush_file(), 3)
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(len(lines), 3)
+            self.assertTrue(lines[0].endswith("INFO    message 0"))
+
+            for round_ in range(6):
+                for i in range(4):
+                    buffer.log(f"round {round_} message {i}")
+                buffer.flush_file()
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertTrue(os.path.exists(path + ".2"))
+            self.assertFalse(os.path.exists(path + ".3"))
+            self.assertLessEqual(os.path.getsize(path), 300)
+            with open(path, encoding="utf-8") as f:
+                self.assertIn("round 5 message 3", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
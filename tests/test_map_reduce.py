@@ -0,0 +1,148 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.map_reduce import SEGMENT_SEPARATOR, combine_fixed, ordered_merge, split_text
+
+
+def slow_stream(parts, delay):
+    def factory():
+        for part in parts:
+            time.sleep(delay)
+            yield part
+    return factory
+
+
+class TestSplitText(unittest.TestCase):
+    def test_short_paragraphs_are_packed_together(self):
+        text = "First one.\n\nSecond one.\n\nThird paragraph here."
+        segments = split_text(text, 30)
+        self.assertEqual([s for _, s in segments], ["First one.\n\nSecond one.", "Third paragraph here."])
+        self.assertEqual(segments[1][0], "\n\n")
+
+    def test_long_paragraph_splits_at_sentences(self):
+        text = "Pi is 3.14 here. It rains! Does it? 我很好。你呢？"
+        segments = split_text(text, 18)
+        self.assertEqual([s for _, s in segments], ["Pi is 3.14 here.", "It rains! Does it?", "我很好。你呢？"])
+        self.assertEqual("".join(gap + s for gap, s in segments), text)
+        self.assertTrue(all(len(s) <= 18 for _, s in segments))
+
+    def test_sentence_without_punctuation_is_cut_at_spaces(self):
+        text = "word " * 20
+        segments = split_text(text, 22)
+        self.assertTrue(all(len(s) <= 22 for _, s in segments))
+        self.assertEqual(" ".join(s for _, s in segments).split(), text.split())
+
+    def test_combine_fixed_keeps_original_layout(self):
+        segments = [("", "I has a pen."), (" ", "He go home."), ("\n\n", "No error.")]
+        answers = ["分析\n<fixed>I have a pen.</fixed>", "<fixed> He goes home. </fixed>", "没有 fixed"]
+        self.assertEqual(combine_fixed(segments, answers), "I have a pen. He goes home.\n\nNo error.")
+
+
+class TestOrderedMerge(unittest.TestCase):
+    def test_output_keeps_order_while_running_concurrently(self):
+        factories = [slow_stream(["a1", "a2"], 0.1), slow_stream(["b1"], 0.01), slow_stream(["c1"], 0.01)]
+        start = time.monotonic()
+        output = list(ordered_merge(factories, max_workers=3, separator="|"))
+        self.assertEqual(output, ["a1", "a2", "|", "b1", "|", "c1"])
+        self.assertLess(time.monotonic() - start, 0.3)
+
+    def test_worker_count_is_bounded(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def factory():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            yield "x"
+
+        list(ordered_merge([factory] * 6, max_workers=2))
+        self.assertEqual(max(peak), 2)
+
+    def test_failed_segment_is_replaced(self):
+        def broken():
+            raise RuntimeError("boom")
+            yield
+
+        output = list(ordered_merge([slow_stream(["ok"], 0), broken], separator="|",
+                                    on_error=lambda index, error: f"[{index}:{error}]"))
+        self.assertEqual(output, ["ok", "|", "[1:boom]"])
+        with self.assertRaises(RuntimeError):
+            list(ordered_merge([broken]))
+
+    def test_closing_early_stops_workers(self):
+        produced = []
+
+        def endless():
+            while True:
+                time.sleep(0.01)
+                produced.append(1)
+                yield "x"
+
+        merged = ordered_merge([endless, endless], max_workers=2)
+        next(merged)
+        merged.close()
+        time.sleep(0.05)
+        count = len(produced)
+        time.sleep(0.05)
+        self.assertLessEqual(len(produced) - count, 2)
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestWorkflowMapReduce(unittest.TestCase):
+    def test_long_selection_is_split_and_fixed_text_combined(self):
+        from core.ai_client import ClientPool
+        from core.clipboard import FakeClipboard
+        from core.config import ConfigManager
+        from core.metrics import MetricsRegistry
+        from core.response_cache import InflightRequests
+        from core.scheduler import Task
+        from core.workflow import Workflow, WorkflowServices
+        from fake_openai_server import FakeOpenAIServer
+
+        def responder(payload):
+            sentence = payload["messages"][-1]["content"].split("```text\n")[1].split("\n```")[0]
+            if sentence.startswith("I has"):
+                time.sleep(0.2)  # 第一段最慢，后面的段要等它
+            return ["分析：", sentence, f"\n\n<fixed>{sentence.replace('has', 'have')}</fixed>"]
+
+        server = FakeOpenAIServer(responder=responder).start()
+        self.addCleanup(server.stop)
+        pool = ClientPool()
+        self.addCleanup(pool.close)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cfg = ConfigManager(os.path.join(tmp.name, "config.json"))
+        cfg.config.update({"base_url": server.base_url, "api_key": "sk-test", "model": "fake-model",
+                           "auto_copy_grammar": True, "stream_fps": 0, "split_chars": 20, "split_max_workers": 3})
+        clipboard = FakeClipboard("")
+        text = "I has a pen.\n\nShe has a cat.\n\nWe has a dog."
+
+        workflow = Workflow(cfg, Task(1, "grammar", time.monotonic()),
+                            WorkflowServices(clipboard, pool, InflightRequests()), MetricsRegistry().trace(),
+                            capture=lambda: text)
+        workflow.run()
+
+        self.assertEqual(len(server.requests), 3)
+        answers = workflow.text.split(SEGMENT_SEPARATOR)
+        self.assertTrue(answers[0].startswith("分析：I has a pen."))
+        self.assertTrue(answers[1].startswith("分析：She has a cat."))
+        self.assertTrue(answers[2].startswith("分析：We has a dog."))
+        self.assertEqual(clipboard.get_text(), "I have a pen.\n\nShe have a cat.\n\nWe have a dog.")
+
+
+if __name__ == "__main__":
+    unittest.main()
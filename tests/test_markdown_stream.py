@@ -0,0 +1,79 @@
+import random
+import unittest
+
+try:
+    import markdown2
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    markdown2 = None
+
+if markdown2 is not None:
+    from core.markdown_stream import IncrementalMarkdown, MARKDOWN_EXTRAS
+
+
+BLOCKS = [
+    "# 标题\n",
+    "## Sub heading\n",
+    "Plain paragraph with **bold** and `code`.\nSecond line.\n",
+    "- item one\n- item two\n",
+    "1. first\n2. second\n",
+    "> quote line\n> more\n",
+    "```python\nx = 1\n\nprint(x)\n```\n",
+    "```\nplain code\n```\n",
+    "text <fixed>Fixed sentence.</fixed>\n",
+    "    indented code\n",
+    "---\n",
+    "* star item\n  continued\n",
+    "Para\n===\n",
+    "中文段落，包含*强调*。\n",
+]
+
+
+def render(text):
+    return markdown2.markdown(text, extras=MARKDOWN_EXTRAS) if text.strip() else ""
+
+
+@unittest.skipIf(markdown2 is None, "markdown2 not installed")
+class TestIncrementalMarkdown(unittest.TestCase):
+    def feed_in_chunks(self, renderer, doc, rng):
+        i = 0
+        while i < len(doc):
+            n = rng.randint(1, 8)
+            renderer.feed(doc[i:i + n])
+            i += n
+            self.assertEqual(renderer.html, render(renderer.text), repr(renderer.text))
+
+    def test_matches_one_shot_render_for_random_streams(self):
+        rng = random.Random(2024)
+        frozen = 0
+        for _ in range(300):
+            doc = "".join(rng.choice(BLOCKS) + rng.choice(["", "\n", "\n\n"])
+                          for _ in range(rng.randint(1, 8)))
+            renderer = IncrementalMarkdown()
+            self.feed_in_chunks(renderer, doc, rng)
+            self.assertEqual(renderer.text, doc)
+            frozen += renderer.frozen_blocks
+        self.assertGreater(frozen, 0)
+
+    def test_feed_returns_new_frozen_html_and_tail(self):
+        renderer = IncrementalMarkdown()
+        self.assertEqual(renderer.feed("# Title\n\nfirst para"), ("<h1>Title</h1>\n", "\n<p>first para</p>\n"))
+        frozen, tail = renderer.feed(" continues")
+        self.assertEqual(frozen, "")
+        self.assertEqual(tail, "\n<p>first para continues</p>\n")
+
+    def test_closed_fence_is_frozen(self):
+        renderer = IncrementalMarkdown()
+        renderer.feed("```\ncode\n\nmore\n```\nafter")
+        self.assertEqual(renderer.frozen_blocks, 1)
+        self.assertEqual(renderer.html, render(renderer.text))
+
+    def test_link_definition_falls_back_to_full_render(self):
+        renderer = IncrementalMarkdown()
+        renderer.feed("see [doc][1]\n\nnext paragraph\n\n")
+        renderer.feed("[1]: http://example.com\n")
+        self.assertEqual(renderer.frozen_blocks, 0)
+        self.assertEqual(renderer.html, render(renderer.text))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+
+from core.metrics import MetricsRegistry, STAGE_METRIC, TASK_METRIC
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = MetricsRegistry(clock=self.clock)
+
+    def run_trace(self, durations, outcome=None, task="grammar"):
+        trace = self.metrics.trace(task=task)
+        for stage, seconds in durations:
+            self.clock.now += seconds
+            trace.mark(stage)
+        trace.finish(outcome)
+        return trace
+
+    def test_trace_records_each_stage_and_total(self):
+        for i in range(100):
+            self.run_trace([("queue", 0.001), ("capture", 0.05 + i / 1000), ("setup", 0.01),
+                            ("ttft", 1.0), ("stream", 2.0), ("render", 0.005)])
+
+        capture = self.metrics.summary(STAGE_METRIC, stage="capture", task="grammar")
+        self.assertEqual(capture["count"], 100)
+        self.assertAlmostEqual(capture["p50"], 0.1, delta=0.002)
+        self.assertAlmostEqual(capture["p99"], 0.149, delta=0.002)
+        total = self.metrics.summary(STAGE_METRIC, stage="total", task="grammar")
+        self.assertAlmostEqual(total["p95"], 3.066 + 0.094, delta=0.01)
+
+    def test_parallel_spans_join_timeline_and_histograms(self):
+        trace = self.metrics.trace(task="grammar")
+        self.clock.now = 0.001
+        trace.mark("queue")
+        connect_start = trace.now()
+        self.clock.now = 0.2
+        trace.span("connect", connect_start)
+        self.clock.now = 0.4
+        trace.mark("capture")
+        trace.span("prepare", 0.001, 0.003)
+        trace.finish()
+
+        self.assertEqual([(stage, round(begin, 3), round(end, 3)) for stage, begin, end in trace.timeline()],
+                         [("queue", 0.0, 0.001), ("capture", 0.001, 0.4), ("connect", 0.001, 0.2),
+                          ("prepare", 0.001, 0.003)])
+        # 并行阶段不计入总耗时
+        self.assertAlmostEqual(self.metrics.summary(STAGE_METRIC, stage="connect", task="grammar")["p50"], 0.199)
+        self.assertAlmostEqual(self.metrics.summary(STAGE_METRIC, stage="total", task="grammar")["p50"], 0.4)
+
+    def test_cancelled_tasks_are_only_counted(self):
+        self.run_trace([("queue", 0.001), ("capture", 5.0)], outcome="cancelled")
+        self.assertIsNone(self.metrics.summary(STAGE_METRIC, stage="capture", task="grammar"))
+        counters = self.metrics.snapshot()["counters"]
+        self.assertEqual(counters, [{"name": TASK_METRIC, "labels": {"outcome": "cancelled", "task": "grammar"},
+                                     "value": 1}])
+
+    def test_prometheus_histogram_is_cumulative(self):
+        self.run_trace([("ttft", 0.3)])
+        self.run_trace([("ttft", 3.0)])
+        text = self.metrics.to_prometheus()
+
+        self.assertIn(f"# TYPE {STAGE_METRIC} histogram", text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="ttft",task="grammar",le="0.25"}} 0', text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="ttft",task="grammar",le="0.5"}} 1', text)
+        self.assertIn(f'{STAGE_METRIC}_bucket{{stage="ttft",task="grammar",le="+Inf"}} 2', text)
+        self.assertIn(f'{STAGE_METRIC}_count{{stage="ttft",task="grammar"}} 2', text)
+        self.assertIn(f'{TASK_METRIC}{{outcome="ok",task="grammar"}} 2', text)
+
+    def test_export_by_extension(self):
+        self.run_trace([("capture", 0.02)], task="translate")
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = os.path.join(tmp, "metrics.json")
+            prom_path = os.path.join(tmp, "metrics.prom")
+            self.metrics.export(json_path)
+            self.metrics.export(prom_path)
+            with open(json_path, encoding="utf-8") as f:
+                data = json.load(f)
+            with open(prom_path, encoding="utf-8") as f:
+                self.assertIn("_bucket{", f.read())
+        self.assertEqual(data["histograms"][0]["labels"], {"stage": "capture", "task": "translate"})
+        self.assertIn("capture", self.metrics.format_table())
+
+
+if __name__ == "__main__":
+    unittest.main()
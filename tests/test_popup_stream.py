@@ -0,0 +1,81 @@
+import os
+import random
+import unittest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import markdown2
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtGui import QTextDocument
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    QApplication = None
+
+if QApplication is not None:
+    from core.markdown_stream import IncrementalMarkdown
+    from ui.popup import PopupResult, MARKDOWN_CSS
+
+
+ANSWER = (
+    "## 语法分析\n\n"
+    "The sentence uses the **present perfect** tense.\n主语是 *I*。\n\n"
+    "- 主语: I\n- 谓语: have finished\n\n"
+    "```text\nI have finished my homework.\n```\n\n"
+    "> 注意时态一致。\n\n"
+    "<fixed>I have finished my homework.</fixed>\n"
+)
+
+
+@unittest.skipIf(QApplication is None, "PyQt6 / markdown2 not installed")
+class TestPopupStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_streamed_document_matches_full_render(self):
+        popup = PopupResult()
+        popup.show_loading()
+        renderer = IncrementalMarkdown()
+        rng = random.Random(7)
+        i = 0
+        while i < len(ANSWER):
+            n = rng.randint(1, 6)
+            popup.append_stream(*renderer.feed(ANSWER[i:i + n]))
+            i += n
+
+        expected = QTextDocument()
+        expected.setDefaultStyleSheet(MARKDOWN_CSS)
+        expected.setHtml(renderer.html)
+        actual = popup.stream_view.document()
+        self.assertEqual(actual.blockCount(), expected.blockCount())
+        self.assertEqual([line.rstrip() for line in actual.toPlainText().splitlines()],
+                         [line.rstrip() for line in expected.toPlainText().splitlines()])
+        self.assertTrue(popup.stream_view.isVisibleTo(popup))
+
+    def test_message_and_new_stream_reset_document(self):
+        popup = PopupResult()
+        popup.append_stream("<p>old answer</p>\n", "")
+        popup.show_message("error")
+        self.assertFalse(popup.stream_view.isVisibleTo(popup))
+
+        popup.append_stream("", "<p>new</p>\n")
+        self.assertEqual(popup.stream_view.toPlainText().strip(), "new")
+        self.assertEqual(popup.stream_view.document().defaultStyleSheet(), MARKDOWN_CSS)
+
+    def test_close_releases_last_answer(self):
+        popup = PopupResult()
+        closed = []
+        popup.closed_signal.connect(lambda: closed.append(True))
+        popup.append_stream("<p>" + "long answer " * 500 + "</p>\n", "<p>tail</p>\n")
+        popup.close_popup()
+
+        self.assertEqual(closed, [True])
+        self.assertTrue(popup.stream_view.document().isEmpty())
+        self.assertEqual(popup.label.text(), "")
+        popup.append_stream("", "<p>next</p>\n")
+        self.assertEqual(popup.stream_view.toPlainText().strip(), "next")
+        self.assertEqual(popup.stream_view.document().defaultStyleSheet(), MARKDOWN_CSS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.rate_limit import RateLimiter, RateLimits, TokenBucket, limited_stream, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_refills_at_rate_up_to_capacity(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=4, clock=clock)
+        bucket.take(4)
+        self.assertAlmostEqual(bucket.wait_time(1), 0.5)
+        clock.now += 1.0
+        self.assertEqual(bucket.wait_time(2), 0.0)
+        clock.now += 100
+        bucket.wait_time(1)
+        self.assertEqual(bucket.level, 4)
+
+    def test_oversized_request_only_needs_full_bucket(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, capacity=10, clock=clock)
+        self.assertEqual(bucket.wait_time(50), 0.0)
+        bucket.take(50)
+        self.assertAlmostEqual(bucket.wait_time(50), 10.0)
+
+    def test_zero_rate_is_unlimited(self):
+        bucket = TokenBucket(rate=0, capacity=0)
+        bucket.take(10 ** 9)
+        self.assertEqual(bucket.wait_time(10 ** 9), 0.0)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_aimd_halves_on_throttle_and_recovers_additively(self):
+        clock = FakeClock()
+        limiter = RateLimiter(max_concurrency=8, clock=clock)
+        self.assertTrue(limiter.acquire())
+        limiter.release("throttled")
+        self.assertEqual(limiter.limit, 4)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release("throttled")
+        self.assertEqual(limiter.limit, 1)  # 不低于 min_concurrency
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release("ok")
+        self.assertGreater(limiter.limit, 5)
+        self.assertLessEqual(limiter.limit, 8)
+        # 其他错误和取消不改变并发上限
+        limit = limiter.limit
+        limiter.acquire()
+        limiter.release("error")
+        limiter.acquire()
+        limiter.release("cancelled")
+        self.assertEqual(limiter.limit, limit)
+        self.assertEqual(limiter.stats()["failures"], 1)
+
+    def test_retry_after_pauses_new_requests(self):
+        clock = FakeClock()
+        limiter = RateLimiter(max_concurrency=4, clock=clock)
+        limiter.acquire()
+        limiter.release("throttled", retry_after=2.0)
+        self.assertEqual(limiter.stats()["paused_ms"], 2000)
+        # 暂停期间 acquire 一直等到被取消
+        polls = []
+        self.assertFalse(limiter.acquire(cancelled=lambda: polls.append(1) or len(polls) > 3, poll=0.001))
+        clock.now += 2.0
+        self.assertTrue(limiter.acquire())
+
+    def test_request_bucket_spaces_out_requests(self):
+        clock = FakeClock()
+        limiter = RateLimiter(rpm=6, max_concurrency=4, clock=clock)  # 容量 1 个请求，每 10 秒补 1 个
+        self.assertTrue(limiter.acquire())
+        limiter.release()
+        polls = []
+        self.assertFalse(limiter.acquire(cancelled=lambda: polls.append(1) or len(polls) > 3, poll=0.001))
+        clock.now += 10
+        self.assertTrue(limiter.acquire())
+
+    def test_concurrency_limit_blocks_until_release(self):
+        limiter = RateLimiter(max_concurrency=1)
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(poll=0.01), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        self.assertEqual(limiter.stats()["waiting"], 1)
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_rate_limits_per_provider_from_config(self):
+        limits = RateLimits({"rate_limit_rpm": 60, "rate_limit_tpm": 0, "max_concurrent_requests": 3})
+        a = limits.get({"base_url": "https://a", "api_key": "k", "model": "m"})
+        self.assertIs(limits.get({"base_url": "https://a", "api_key": "k", "model": "m"}), a)
+        self.assertIsNot(limits.get({"base_url": "https://b", "api_key": "k", "model": "m"}), a)
+        self.assertEqual(a.max_concurrency, 3)
+        self.assertEqual(a.stats()["request_bucket"], 10.0)
+        self.assertIsNone(a.stats()["token_bucket"])
+        self.assertEqual(len(limits.format_table().splitlines()), 3)
+        limits.reset()
+        self.assertEqual(limits.stats(), {})
+
+
+class TestParseRetryAfter(unittest.TestCase):
+    def test_formats(self):
+        self.assertEqual(parse_retry_after({"retry-after": "3"}), 3.0)
+        self.assertEqual(parse_retry_after({"retry-after-ms": "250", "retry-after": "3"}), 0.25)
+        self.assertEqual(parse_retry_after({"retry-after": "9999"}), 60.0)
+        self.assertIsNone(parse_retry_after({"retry-after": "soon"}))
+        self.assertIsNone(parse_retry_after({}))
+        self.assertIsNone(parse_retry_after(None))
+        future = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+        self.assertAlmostEqual(parse_retry_after({"retry-after": future}), 30, delta=2)
+
+
+class TestLimitedStream(unittest.TestCase):
+    def run_stream(self, limiter, attempts, **kwargs):
+        calls = []
+        sleeps = []
+
+        def open_stream():
+            calls.append(1)
+            result = attempts[len(calls) - 1]
+            if isinstance(result, Exception):
+                raise result
+            return iter(result)
+
+        text = "".join(limited_stream(limiter, open_stream, sleep=sleeps.append, **kwargs))
+        return text, calls, sleeps
+
+    def test_retries_throttled_request_after_retry_after(self):
+        limiter = RateLimiter(max_concurrency=4)
+        logs = []
+        text, calls, sleeps = self.run_stream(limiter, [StatusError(429, {"retry-after": "0"}),
+                                                        StatusError(503), ["ok"]],
+                                              base_delay=0.01, log=logs.append)
+        self.assertEqual(text, "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(sleeps), 2)
+        self.assertTrue(all(0 <= s <= 0.02 for s in sleeps))
+        stats = limiter.stats()
+        self.assertEqual((stats["throttled"], stats["failures"], stats["retries"], stats["in_flight"]), (1, 1, 2, 0))
+        self.assertEqual(stats["limit"], 2.5)  # 4 -> 2 -> +1/2
+        self.assertEqual(len(logs), 2)
+
+    def test_backoff_honours_retry_after(self):
+        limiter = RateLimiter(max_concurrency=4, clock=FakeClock())  # 时钟不走：暂停期由 sleep 代替
+        limiter.paused_until = 0
+        calls = []
+
+        def open_stream():
+            calls.append(1)
+            if len(calls) == 1:
+                raise StatusError(429, {"retry-after": "1.5"})
+            return iter(["x"])
+
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            limiter.paused_until = 0
+
+        self.assertEqual("".join(limited_stream(limiter, open_stream, base_delay=0.01, sleep=sleep)), "x")
+        self.assertEqual(sleeps, [1.5])
+
+    def test_gives_up_after_max_retries_and_on_client_errors(self):
+        limiter = RateLimiter()
+        with self.assertRaises(StatusError):
+            self.run_stream(limiter, [StatusError(500)] * 3, max_retries=2, base_delay=0)
+        with self.assertRaises(StatusError):
+            self.run_stream(limiter, [StatusError(401), ["never"]], base_delay=0)
+        self.assertEqual(limiter.stats()["in_flight"], 0)
+
+    def test_no_retry_after_content_streamed(self):
+        limiter = RateLimiter()
+
+        def broken():
+            yield "partial"
+            raise StatusError(503)
+
+        calls = []
+
+        def open_stream():
+            calls.append(1)
+            return broken()
+
+        received = []
+        with self.assertRaises(StatusError):
+            for content in limited_stream(limiter, open_stream, base_delay=0, sleep=lambda s: None):
+                received.append(content)
+        self.assertEqual((received, len(calls)), (["partial"], 1))
+
+    def test_closing_early_releases_permit_without_penalty(self):
+        limiter = RateLimiter(max_concurrency=2)
+        stream = limited_stream(limiter, lambda: iter(["a", "b"]))
+        self.assertEqual(next(stream), "a")
+        self.assertEqual(limiter.stats()["in_flight"], 1)
+        stream.close()
+        stats = limiter.stats()
+        self.assertEqual((stats["in_flight"], stats["limit"], stats["failures"]), (0, 2, 0))
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestRateLimitedWorkflow(unittest.TestCase):
+    """对着会返回 429 的假服务端跑完整流程"""
+
+    def setUp(self):
+        from core.ai_client import ClientPool
+        from core.config import ConfigManager
+        from fake_openai_server import FakeOpenAIServer
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = ClientPool()
+        self.addCleanup(self.pool.close)
+        self.FakeOpenAIServer = FakeOpenAIServer
+        self.cfg = ConfigManager(os.path.join(self.tmp.name, "config.json"))
+
+    def start_server(self, **kwargs):
+        server = self.FakeOpenAIServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        self.cfg.config.update({"base_url": server.base_url, "api_key": "sk-test", "model": "fake-model",
+                                "stream_fps": 0, "cache_enabled": False, "retry_base_delay_ms": 10})
+        return server
+
+    def run_workflow(self, limits, text="I has finished.", logs=None):
+        from core.clipboard import FakeClipboard
+        from core.metrics import MetricsRegistry
+        from core.response_cache import InflightRequests
+        from core.scheduler import Task
+        from core.workflow import Workflow, WorkflowServices
+
+        services = WorkflowServices(FakeClipboard(""), self.pool, InflightRequests(), rate_limits=limits)
+        errors = []
+        workflow = Workflow(self.cfg, Task(1, "grammar", time.monotonic()), services, MetricsRegistry().trace(),
+                            on_error=errors.append, on_log=(logs if logs is not None else []).append,
+                            capture=lambda: text)
+        workflow.run()
+        return workflow, errors
+
+    def test_injected_failures_are_retried(self):
+        server = self.start_server(tokens=["fine"], failures=[(429, {"Retry-After": "0"}), (503, {})])
+        limits = RateLimits(self.cfg)
+        logs = []
+        workflow, errors = self.run_workflow(limits, logs=logs)
+        self.assertEqual((workflow.text, errors), ("fine", []))
+        chat = [r for r in server.requests if r[0].endswith("/chat/completions")]
+        self.assertEqual(len(chat), 3)  # SDK 自带的重试已关闭，只有限流器的 2 次重试
+        stats = next(iter(limits.stats().values()))
+        self.assertEqual((stats["throttled"], stats["retries"]), (1, 2))
+        self.assertEqual(sum("🔁" in line for line in logs), 2)
+
+    def test_concurrency_adapts_to_server_limit(self):
+        # 服务端只允许 2 个并发，客户端一开始允许 8 个：被 429 后收紧，所有请求最终都成功
+        server = self.start_server(tokens=["a", "b", "c"], token_interval=0.02, max_concurrent=2, retry_after=0)
+        self.cfg.config.update({"max_concurrent_requests": 8, "retry_max_attempts": 10})
+        limits = RateLimits(self.cfg)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda i: self.run_workflow(limits, text=f"sentence {i}"), range(16)))
+        self.assertTrue(all(workflow.text == "abc" and not errors for workflow, errors in results))
+        stats = next(iter(limits.stats().values()))
+        self.assertGreater(server.throttled, 0)
+        self.assertEqual(stats["throttled"], server.throttled)
+        self.assertLess(stats["limit"], 8)
+        self.assertLessEqual(server.max_active, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from core.ai_client import Abort
+from core.response_cache import ResponseCache, InflightRequests, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "response_cache.db")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_cache(self, **kwargs):
+        cache = ResponseCache(self.path, clock=self.clock, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_key_ignores_whitespace_but_not_prompt_or_model(self):
+        base = cache_key("m", "url", "prompt", "I has a  book.\n")
+        self.assertEqual(base, cache_key("m", "url", "prompt", " I has a book."))
+        self.assertNotEqual(base, cache_key("m2", "url", "prompt", "I has a book."))
+        self.assertNotEqual(base, cache_key("m", "url", "prompt2", "I has a book."))
+
+    def test_disk_tier_survives_restart(self):
+        self.make_cache().put("k", "answer")
+        cache = self.make_cache()
+        self.assertEqual(cache.get("k"), "answer")
+        self.assertIsNone(cache.get("missing"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_memory_tier_is_lru_bounded(self):
+        cache = self.make_cache(memory_items=2)
+        for key in "abc":
+            cache.put(key, key * 3)
+        self.assertEqual(cache.stats()["memory_items"], 2)
+        self.assertEqual(cache.get("a"), "aaa")  # 从磁盘层取回
+
+    def test_ttl_expires_entries(self):
+        cache = self.make_cache(ttl_seconds=60)
+        cache.put("k", "answer")
+        self.clock.now += 61
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["disk_items"], 0)
+
+    def test_size_bound_evicts_least_recently_used(self):
+        cache = self.make_cache(max_bytes=25)
+        cache.put("old", "x" * 10)
+        self.clock.now += 1
+        cache.put("used", "y" * 10)
+        self.clock.now += 1
+        cache.get("old")  # 刷新访问时间
+        self.clock.now += 1
+        cache.put("new", "z" * 10)
+
+        stats = cache.stats()
+        self.assertLessEqual(stats["disk_bytes"], 25)
+        fresh = self.make_cache()
+        self.assertIsNone(fresh.get("used"))
+        self.assertEqual(fresh.get("old"), "x" * 10)
+
+    def test_hits_do_not_write_until_next_put_or_close(self):
+        def accessed(key):
+            with sqlite3.connect(self.path) as db:
+                return db.execute("SELECT accessed FROM responses WHERE key = ?", (key,)).fetchone()[0]
+
+        cache = ResponseCache(self.path, clock=self.clock)
+        cache.put("k", "answer")
+        self.clock.now += 5
+        for _ in range(3):
+            self.assertEqual(cache.get("k"), "answer")
+        self.assertEqual(accessed("k"), 1000.0)  # 内存命中不写盘
+
+        self.clock.now += 5
+        cache.put("other", "x")
+        self.assertEqual(accessed("k"), 1005.0)
+        self.clock.now += 5
+        cache.get("other")
+        cache.close()  # 关闭时写入还没写的访问时间
+        self.assertEqual(accessed("other"), 1015.0)
+
+
+class TestInflightRequests(unittest.TestCase):
+    def test_identical_requests_share_one_upstream_stream(self):
+        inflight = InflightRequests()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            yield "Hello"
+            started.set()
+            release.wait(5)
+            yield ", world"
+
+        results = {}
+
+        def consume(name):
+            results[name] = "".join(inflight.stream("key", upstream))
+
+        leader = threading.Thread(target=consume, args=("leader",))
+        leader.start()
+        self.assertTrue(started.wait(5))
+        follower = threading.Thread(target=consume, args=("follower",))
+        follower.start()
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, {"leader": "Hello, world", "follower": "Hello, world"})
+        self.assertEqual(len(inflight), 0)
+
+    def test_upstream_error_reaches_followers(self):
+        inflight = InflightRequests()
+
+        def upstream():
+            yield "partial"
+            raise ValueError("boom")
+
+        stream = inflight.stream("key", upstream)
+        self.assertEqual(next(stream), "partial")
+        follower = inflight.stream("key", upstream)
+        with self.assertRaises(ValueError):
+            list(stream)
+        with self.assertRaises(ValueError):
+            list(follower)
+
+    def test_leader_cancel_does_not_fail_followers(self):
+        inflight = InflightRequests()
+        release = threading.Event()
+        closed = []
+
+        def upstream():
+            try:
+                yield "Hello"
+                release.wait(5)
+                yield ", "
+                yield "world"
+            finally:
+                closed.append(True)
+
+        leader = inflight.stream("key", upstream)
+        self.assertEqual(next(leader), "Hello")
+        follower = inflight.stream("key", upstream)
+        leader.close()  # 例如 leader 的弹窗被关掉
+        release.set()
+
+        self.assertEqual("".join(follower), "Hello, world")
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(inflight), 0)
+
+    def test_last_subscriber_leaving_closes_upstream(self):
+        inflight = InflightRequests()
+        closed = threading.Event()
+
+        def upstream():
+            try:
+                while True:
+                    yield "x"
+            finally:
+                closed.set()
+
+        leader = inflight.stream("key", upstream)
+        next(leader)
+        follower = inflight.stream("key", upstream)
+        next(follower)
+        leader.close()
+        self.assertEqual(len(inflight), 1)  # 后台线程还在替 follower 读
+        follower.close()
+
+        self.assertTrue(closed.wait(5))
+        self.assertEqual(len(inflight), 0)
+        # 之后的相同请求重新发起
+        fresh = inflight.stream("key", lambda: iter(["new"]))
+        self.assertEqual(list(fresh), ["new"])
+
+    def test_cancel_without_followers_closes_upstream(self):
+        inflight = InflightRequests()
+        closed = []
+
+        def upstream():
+            try:
+                yield "a"
+                yield "b"
+            finally:
+                closed.append(True)
+
+        leader = inflight.stream("key", upstream)
+        next(leader)
+        leader.close()
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(inflight), 0)
+
+    def test_cancel_from_another_thread_aborts_blocked_upstream(self):
+        inflight = InflightRequests()
+        abort = Abort()
+        blocked = threading.Event()
+
+        def upstream():
+            yield "a"
+            blocked.wait(5)  # 阻塞的网络读取，由 abort 唤醒
+            raise ConnectionError("socket shut down")
+
+        abort.register(blocked.set)
+        leader = inflight.stream("key", upstream, abort=abort)
+        follower = inflight.stream("key", upstream)
+        self.assertEqual(next(leader), "a")
+        received = []
+        waiting = threading.Thread(target=lambda: received.extend(follower))
+        waiting.start()
+
+        # 还有订阅者时只退订，不打断上游
+        follower.cancel()
+        waiting.join(1.0)
+        self.assertFalse(waiting.is_alive())  # 等待中的订阅者被唤醒
+        self.assertEqual(received, ["a"])
+        self.assertFalse(abort.aborted)
+
+        leader.cancel()
+        self.assertTrue(abort.aborted)
+        with self.assertRaises(ConnectionError):
+            next(leader)
+        leader.close()
+        self.assertEqual(len(inflight), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
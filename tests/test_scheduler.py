@@ -0,0 +1,130 @@
+import threading
+import time
+import unittest
+
+from core.scheduler import TaskScheduler, CANCELLED, DONE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTaskScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.started = []
+
+    def make(self, policy, **kwargs):
+        return TaskScheduler(self.started.append, policy=policy, clock=self.clock, **kwargs)
+
+    def test_latest_supersedes_and_cancels_running_tasks(self):
+        scheduler = self.make("latest", max_running=2)
+        first = scheduler.submit("grammar")
+        second = scheduler.submit("translate")
+
+        self.assertTrue(first.cancelled and first.superseded)
+        self.assertEqual(self.started, [first, second])  # 不等旧任务退出，新任务立即开始
+        self.assertIs(scheduler.displayed, second)
+        self.assertFalse(scheduler.route(first, ("stream", "old", "")))  # 旧任务的输出被丢弃
+        self.assertTrue(scheduler.route(second, ("stream", "new", "")))
+
+        # 被取消的线程还没退出也不占名额，第三个任务立即开始
+        third = scheduler.submit("grammar")
+        self.assertEqual(self.started, [first, second, third])
+        self.assertEqual(scheduler.stats()["cancelled_running"], 2)
+        scheduler.finish(first)
+        self.assertEqual(first.state, CANCELLED)
+
+        stats = scheduler.stats()
+        self.assertEqual(stats["superseded"], 2)
+        self.assertEqual(stats["running"], 1)
+        self.assertEqual(stats["wait_p95_ms"], 0.0)
+
+    def test_cancelled_tasks_have_their_own_cap(self):
+        scheduler = self.make("latest", max_running=1, max_cancelled=2)
+        tasks = [scheduler.submit("grammar") for _ in range(4)]
+        # 三个被取代的线程都还没退出，超过 max_cancelled，第四个任务等一个旧线程退出
+        self.assertEqual(self.started, tasks[:3])
+        self.clock.now = 0.3
+        scheduler.finish(tasks[0])
+        self.assertEqual(self.started, tasks)
+        self.assertEqual(scheduler.stats()["wait_p95_ms"], 300.0)
+
+    def test_task_cancel_runs_callbacks_once(self):
+        scheduler = self.make("latest")
+        task = scheduler.submit("grammar")
+        calls = []
+        task.on_cancel(lambda: calls.append("first"))
+        scheduler.cancel(task)
+        task.cancel()
+        task.on_cancel(lambda: calls.append("late"))  # 取消之后登记的立即执行
+        self.assertEqual(calls, ["first", "late"])
+
+    def test_fifo_queues_in_order_and_rejects_when_full(self):
+        scheduler = self.make("fifo", max_running=1, max_queue=2)
+        tasks = [scheduler.submit("grammar") for _ in range(3)]
+        self.assertIsNone(scheduler.submit("grammar"))
+        self.assertEqual(self.started, tasks[:1])
+        self.assertEqual(scheduler.stats()["queue_depth"], 2)
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+        # 排队任务的输出先暂存，轮到它显示时再交给弹窗
+        scheduler.finish(tasks[0])
+        self.assertEqual(tasks[0].state, DONE)
+        self.assertEqual(self.started, tasks[:2])
+        self.assertFalse(scheduler.route(tasks[1], ("stream", "b", "")))
+
+        self.assertIs(scheduler.dismiss(), tasks[1])
+        self.assertEqual(scheduler.take_outbox(tasks[1]), [("stream", "b", "")])
+        self.assertTrue(scheduler.route(tasks[1], ("stream", "c", "")))
+
+        # 关闭正在运行的任务会取消它，并显示下一个
+        self.assertIs(scheduler.dismiss(), tasks[2])
+        self.assertTrue(tasks[1].cancelled)
+        self.assertEqual(scheduler.stats()["cancelled"], 1)
+
+    def test_capture_is_serialized_but_work_overlaps(self):
+        events = []
+        scheduler = TaskScheduler(lambda task: threads.append(threading.Thread(target=work, args=(task,))),
+                                  policy="fifo", max_running=3)
+        threads = []
+        active = {"capture": 0, "network": 0, "max_capture": 0, "max_network": 0}
+        lock = threading.Lock()
+
+        def enter(stage, delta):
+            with lock:
+                active[stage] += delta
+                active["max_" + stage] = max(active["max_" + stage], active[stage])
+
+        def work(task):
+            with scheduler.capture_lock:
+                enter("capture", 1)
+                time.sleep(0.02)
+                enter("capture", -1)
+            enter("network", 1)
+            time.sleep(0.1)
+            enter("network", -1)
+            events.append(task.id)
+
+        for _ in range(3):
+            scheduler.submit("grammar")
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(active["max_capture"], 1)
+        self.assertGreater(active["max_network"], 1)
+        self.assertEqual(len(events), 3)
+
+    def test_rejects_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.make("lifo")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import time
+import unittest
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.similar_cache import SimilarIndex, normalize, shingles, signature, similarity, similarity_scope
+
+SENTENCE = "Yesterday I go to the library and borrow three books about history"
+SCOPE = similarity_scope("m", "url", "prompt")
+
+
+class TestSignature(unittest.TestCase):
+    def test_normalize_ignores_case_punctuation_and_whitespace(self):
+        self.assertEqual(normalize("Hello,\n  World!!"), "hello world")
+        self.assertEqual(normalize("你好，世界。"), "你好 世界")
+
+    def test_similarity_tracks_jaccard(self):
+        a, b = shingles(SENTENCE), shingles(SENTENCE + " and magazines")
+        jaccard = len(a & b) / len(a | b)
+        estimate = similarity(signature(a), signature(b))
+        self.assertAlmostEqual(estimate, jaccard, delta=0.15)
+        self.assertEqual(similarity(signature(a), signature(shingles(SENTENCE.upper() + "."))), 1.0)
+        self.assertLess(similarity(signature(a), signature(shingles("Completely unrelated words here"))), 0.3)
+
+    def test_empty_text_has_no_signature(self):
+        self.assertIsNone(signature(shingles(" ... ")))
+
+
+class TestSimilarIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "similar_index.db")
+
+    def make_index(self, **kwargs):
+        index = SimilarIndex(self.path, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def test_finds_near_duplicates_only(self):
+        index = self.make_index()
+        index.add(SCOPE, SENTENCE + ".", "k1")
+        index.add(SCOPE, "The weather is lovely today, let us walk.", "k2")
+
+        for variant in (SENTENCE, SENTENCE + ".\n", SENTENCE.replace(" the ", "\nthe "), SENTENCE + " yesterday."):
+            with self.subTest(variant=variant):
+                key, score = index.lookup(SCOPE, variant, threshold=0.8)
+                self.assertEqual(key, "k1")
+                self.assertGreaterEqual(score, 0.8)
+        self.assertIsNone(index.lookup(SCOPE, "I went to the cinema with my friends", threshold=0.8))
+        # 不同模型 / 提示词的回答不能互相替代
+        self.assertIsNone(index.lookup(similarity_scope("m", "url", "other"), SENTENCE, threshold=0.8))
+        self.assertEqual(index.stats()["hits"], 4)
+
+    def test_persists_and_rebuilds_buckets(self):
+        self.make_index().add(SCOPE, SENTENCE, "k1")
+        index = self.make_index()
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.lookup(SCOPE, SENTENCE + "!")[0], "k1")
+
+    def test_re_adding_key_replaces_entry(self):
+        index = self.make_index()
+        index.add(SCOPE, SENTENCE, "k1")
+        index.add(SCOPE, "Something else entirely different", "k1")
+        self.assertEqual(len(index), 1)
+        self.assertIsNone(index.lookup(SCOPE, SENTENCE))
+
+    def test_max_entries_evicts_oldest_and_discard(self):
+        index = self.make_index(max_entries=2)
+        for i, text in enumerate(["alpha beta gamma delta", "one two three four five", "red green blue yellow"]):
+            index.add(SCOPE, text, f"k{i}")
+        self.assertEqual(len(index), 2)
+        self.assertIsNone(index.lookup(SCOPE, "alpha beta gamma delta"))
+        index.discard("k1")
+        index.discard("missing")
+        self.assertIsNone(index.lookup(SCOPE, "one two three four five"))
+        self.assertEqual(len(self.make_index(max_entries=2)), 1)
+
+    def test_lookup_under_a_millisecond_with_many_entries(self):
+        import random
+        import string
+
+        rng = random.Random(7)
+        vocab = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9))) for _ in range(5000)]
+        texts = [" ".join(rng.choice(vocab) for _ in range(rng.randint(8, 20))) for _ in range(5000)]
+        index = SimilarIndex(":memory:", max_entries=len(texts))
+        self.addCleanup(index.close)
+        for i, text in enumerate(texts):
+            index.add(SCOPE, text, f"k{i}")
+        queries = [texts[i] + "." for i in range(0, len(texts), 25)]
+        start = time.perf_counter()
+        found = [index.lookup(SCOPE, query) for query in queries]
+        per_lookup = (time.perf_counter() - start) / len(queries)
+        self.assertTrue(all(f is not None for f in found))
+        # 宽松的上限，避免在慢机器上误报；精确数字见 benchmarks/bench_similar_cache.py
+        self.assertLess(per_lookup, 0.005)
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestSimilarWorkflow(unittest.TestCase):
+    def setUp(self):
+        from core.ai_client import ClientPool
+        from core.config import ConfigManager
+        from core.response_cache import ResponseCache
+        from fake_openai_server import FakeOpenAIServer
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = ClientPool()
+        self.addCleanup(self.pool.close)
+        self.server = FakeOpenAIServer(tokens=["answer ", "one"]).start()
+        self.addCleanup(self.server.stop)
+        self.cache = ResponseCache(os.path.join(self.tmp.name, "cache.db"))
+        self.addCleanup(self.cache.close)
+        self.index = SimilarIndex(os.path.join(self.tmp.name, "similar.db"))
+        self.addCleanup(self.index.close)
+        self.cfg = ConfigManager(os.path.join(self.tmp.name, "config.json"))
+        self.cfg.config.update({"base_url": self.server.base_url, "api_key": "sk-test", "model": "fake-model",
+                                "stream_fps": 0, "similar_cache_enabled": True, "similar_cache_refresh": False})
+
+    def run_workflow(self, text, task_type="translate", clipboard=None):
+        from core.clipboard import FakeClipboard
+        from core.metrics import MetricsRegistry
+        from core.response_cache import InflightRequests
+        from core.scheduler import Task
+        from core.workflow import Workflow, WorkflowServices
+
+        services = WorkflowServices(clipboard or FakeClipboard(""), self.pool, InflightRequests(),
+                                    response_cache=self.cache)
+        services.similar_index = self.index
+        logs = []
+        trace = MetricsRegistry().trace()
+        workflow = Workflow(self.cfg, Task(1, task_type, time.monotonic()), services, trace,
+                            on_log=logs.append, capture=lambda: text)
+        workflow.run()
+        return workflow, trace, logs
+
+    def chat_requests(self):
+        return [r for r in self.server.requests if r[0].endswith("/chat/completions")]
+
+    def test_near_duplicate_selection_reuses_answer(self):
+        self.run_workflow(SENTENCE)
+        self.server.tokens = ["answer ", "two"]
+        workflow, trace, logs = self.run_workflow(SENTENCE + ".\n")
+        self.assertTrue(workflow.text.startswith("> ≈ 与之前的选区相似"))  # 弹窗里标出这是近似命中
+        self.assertTrue(workflow.text.endswith("answer one"))
+        self.assertEqual(trace.stages()[-1][0], "cache")
+        self.assertEqual(len(self.chat_requests()), 1)
+        self.assertTrue(any(line.startswith("≈") for line in logs))
+
+        # 关闭后只用精确缓存
+        self.cfg.config["similar_cache_enabled"] = False
+        workflow, _, _ = self.run_workflow(SENTENCE + " again")
+        self.assertEqual(workflow.text, "answer two")
+
+    def test_background_refresh_caches_exact_answer(self):
+        self.cfg.config["similar_cache_refresh"] = True
+        self.run_workflow(SENTENCE)
+        self.server.tokens = ["fresh"]
+        workflow, _, _ = self.run_workflow(SENTENCE + "!")
+        self.assertTrue(workflow.text.endswith("answer one"))
+        deadline = time.monotonic() + 5
+        while len(self.chat_requests()) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # 后台刷新完成后同样的选区精确命中新的回答
+        for _ in range(100):
+            workflow, _, _ = self.run_workflow(SENTENCE + "!")
+            if workflow.text == "fresh":
+                break
+            time.sleep(0.02)
+        self.assertEqual(workflow.text, "fresh")
+
+    def test_grammar_never_reuses_similar_answers(self):
+        from core.clipboard import FakeClipboard
+
+        self.cfg.config["auto_copy_grammar"] = True
+        self.server.tokens = ["has -> have ", "<fixed>I have finished my homework yesterday evening.</fixed>"]
+        self.run_workflow("I has finished my homework yesterday evening before dinner.", "grammar")
+
+        # 改正后的句子和原句相似度在 0.9 以上，但结论不同，必须重新请求
+        self.server.tokens = ["没有错误 ", "<fixed>I have finished my homework yesterday evening before dinner.</fixed>"]
+        clipboard = FakeClipboard("")
+        workflow, trace, logs = self.run_workflow("I have finished my homework yesterday evening before dinner.",
+                                                  "grammar", clipboard)
+        self.assertTrue(workflow.text.startswith("没有错误"))
+        self.assertEqual(len(self.chat_requests()), 2)
+        self.assertFalse(any(line.startswith("≈") for line in logs))
+        self.assertEqual(clipboard.get_text(), "I have finished my homework yesterday evening before dinner.")
+
+    def test_expired_answer_is_dropped_from_index(self):
+        self.run_workflow(SENTENCE)
+        self.cache.ttl_seconds = 1e-9
+        time.sleep(0.01)
+        self.server.tokens = ["new"]
+        workflow, _, _ = self.run_workflow(SENTENCE + ".")
+        self.assertEqual(workflow.text, "new")
+        self.assertEqual(len(self.chat_requests()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
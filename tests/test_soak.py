@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+import unittest
+
+try:
+    import markdown2
+    import openai
+    import PyQt6
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 / PyQt6 not installed")
+class TestSoak(unittest.TestCase):
+    def test_memory_stays_flat_over_many_runs(self):
+        # 缩短版的浸泡测试 (新进程，数据文件写在临时目录)：几百次任务内 RSS 噪声太大，日志缓冲也还没填满，
+        # 这里只检查 QObject 不增长、结束的线程及时删除；几千次任务的完整检查见 benchmarks/bench_soak.py
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "bench_soak.py"),
+             "--runs", "150", "--sample-every", "25", "--warmup", "50", "--max-rss-mb", "1000", "--max-objects", "10000"],
+            capture_output=True, text=True, timeout=300, env=dict(os.environ, QT_QPA_PLATFORM="offscreen"))
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn("内存平稳", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import unittest
+
+try:
+    import PyQt6
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    PyQt6 = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动预算 (毫秒)，留足余量，只用来挡住明显的回退
+IMPORT_BUDGET_MS = 400  # import main (模块级导入)
+HOTKEY_READY_BUDGET_MS = 2500  # 进程启动 -> 热键注册完成
+
+# 静默启动时不应该加载的模块
+DEFERRED_MODULES = ("ui.main_window", "ui.popup", "keyboard", "pyperclip", "openai", "markdown2", "winreg")
+
+CORE_MODULES = ("core.config", "core.workflow", "core.capture", "core.capture_stats", "core.clipboard",
+                "core.hardware", "core.scheduler", "core.metrics", "core.hedging", "core.ai_client",
+                "core.response_cache", "core.markdown_stream", "core.stream_coalescer", "core.active_app",
+                "core.batch", "core.map_reduce", "core.dictionary", "core.history", "core.logbuffer",
+                "core.ipc_protocol", "core.ipc_client", "core.rate_limit",
+                "core.fixed_tags", "core.similar_cache", "core.diagnostics")
+
+
+def run_python(args, cwd=ROOT, env=None):
+    return subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, timeout=60,
+                          env=dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM="offscreen", **(env or {})))
+
+
+def top_level_import_ms(stderr):
+    """-X importtime 输出里所有顶层导入的累计耗时之和"""
+    total = 0
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", line)
+        if match:
+            total += int(match.group(1))
+    return total / 1000
+
+
+class TestQtFreeCore(unittest.TestCase):
+    def test_core_modules_import_without_qt(self):
+        code = ("import sys\n"
+                f"for name in {CORE_MODULES!r}: __import__(name)\n"
+                "print(sorted(m for m in sys.modules if m.split('.')[0] in ('PyQt6', 'keyboard')))")
+        result = run_python(["-c", code])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
+@unittest.skipIf(PyQt6 is None, "PyQt6 not installed")
+class TestStartupBudget(unittest.TestCase):
+    def test_import_main_within_budget_and_defers_heavy_modules(self):
+        code = ("import sys, json, main\n"
+                f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))")
+        result = run_python(["-X", "importtime", "-c", code])
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+        self.assertLess(top_level_import_ms(result.stderr), IMPORT_BUDGET_MS)
+
+    def test_silent_start_reaches_hotkeys_without_building_the_window(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "config.json"), "w", encoding="utf-8") as f:
+                json.dump({"api_key": "sk-test", "base_url": "http://127.0.0.1:9/v1"}, f)
+            result = run_python([os.path.join(ROOT, "main.py"), "--silent", "--startup-probe"], cwd=tmp)
+
+        match = re.search(r"STARTUP hotkey_ready_ms=([\d.]+) ok=(\w+) window=(\w+)", result.stdout)
+        self.assertIsNotNone(match, result.stdout + result.stderr[-2000:])
+        self.assertEqual(match.group(3), "False")
+        if match.group(2) != "True":
+            # 没有权限 / 设备安装键盘钩子 (无界面的 Linux、容器)：热键根本没有注册，耗时没有意义
+            error = re.search(r"Hotkey Error: .*", result.stdout)
+            self.skipTest(f"keyboard hook unavailable ({error.group(0) if error else 'no hotkey'})")
+        self.assertLess(float(match.group(1)), HOTKEY_READY_BUDGET_MS)
+
+
+if __name__ == "__main__":
+    unittest.main()
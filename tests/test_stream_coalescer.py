@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+
+from core.stream_coalescer import FrameCoalescer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestFrameCoalescer(unittest.TestCase):
+    def test_emits_at_most_once_per_frame_and_flushes_tail(self):
+        clock = FakeClock()
+        coalescer = FrameCoalescer(fps=30, clock=clock)
+        emitted = []
+
+        # 3 秒内每 5ms 一个 token
+        for i in range(600):
+            clock.now = i * 0.005
+            batch = coalescer.push(f"t{i} ")
+            if batch is not None:
+                emitted.append((clock.now, batch))
+        final = coalescer.flush()
+        if final is not None:
+            emitted.append((clock.now, final))
+
+        self.assertEqual("".join(batch for _, batch in emitted), "".join(f"t{i} " for i in range(600)))
+        gaps = [b[0] - a[0] for a, b in zip(emitted, emitted[1:-1])]
+        self.assertTrue(all(gap >= 1 / 30 - 1e-9 for gap in gaps))
+        self.assertLessEqual(len(emitted), 3 * 30 + 2)
+
+        stats = coalescer.stats()
+        self.assertEqual(stats["chunks_received"], 600)
+        self.assertEqual(stats["frames_emitted"], len(emitted))
+        self.assertEqual(stats["frames_saved"], 600 - len(emitted))
+
+    def test_first_chunk_is_emitted_immediately(self):
+        coalescer = FrameCoalescer(fps=60, clock=FakeClock())
+        self.assertEqual(coalescer.push("Hello"), "Hello")
+        self.assertIsNone(coalescer.push(" world"))
+        self.assertEqual(coalescer.flush(), " world")
+        self.assertIsNone(coalescer.flush())
+
+    def test_non_positive_fps_disables_pacing(self):
+        coalescer = FrameCoalescer(fps=0, clock=FakeClock())
+        self.assertEqual([coalescer.push(c) for c in "abc"], ["a", "b", "c"])
+
+    def test_stalled_stream_flushes_held_back_tail_at_frame_deadline(self):
+        frames = []
+        delivered = threading.Event()
+
+        def on_frame(batch):
+            frames.append(batch)
+            if len(frames) == 2:
+                delivered.set()
+
+        coalescer = FrameCoalescer(fps=20, on_frame=on_frame)
+        self.assertIsNone(coalescer.push("Hello"))
+        coalescer.push(" world")  # 同一帧内到达，被压住
+        self.assertEqual(frames, ["Hello"])
+
+        # 上游卡住，没有下一个 chunk：到了帧时间尾巴也要发出，不等流结束
+        self.assertTrue(delivered.wait(1.0))
+        self.assertEqual(frames, ["Hello", " world"])
+
+        # flush 取走剩下的尾巴，之后不再主动发帧
+        coalescer.push("!")
+        self.assertEqual(coalescer.flush(), "!")
+        time.sleep(0.1)
+        self.assertEqual(frames, ["Hello", " world"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    import markdown2
+    import openai
+except ImportError:  # pragma: no cover - 依赖未安装时跳过
+    openai = None
+
+from core.ai_client import ClientPool
+from core.clipboard import FakeClipboard
+from core.config import ConfigManager
+from core.metrics import MetricsRegistry
+from core.response_cache import InflightRequests, ResponseCache, cache_key
+from core.scheduler import Task, TaskScheduler
+from core.workflow import Workflow, WorkflowServices
+from fake_openai_server import FakeOpenAIServer, load_recording, save_recording
+
+ANSWER = ["## 分析\n\n", "主语是 *I*。", "\n\n", "<fixed>I have ", "finished.</fixed>\n"]
+
+
+@unittest.skipIf(openai is None, "openai / markdown2 not installed")
+class TestWorkflow(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.pool = ClientPool()
+        self.addCleanup(self.pool.close)
+        self.clipboard = FakeClipboard("")
+
+    def start_server(self, **kwargs):
+        server = FakeOpenAIServer(**kwargs).start()
+        self.addCleanup(server.stop)
+        cfg = ConfigManager(os.path.join(self.tmp.name, "config.json"))
+        cfg.config.update({"base_url": server.base_url, "api_key": "sk-test", "model": "fake-model",
+                           "auto_copy_grammar": True, "stream_fps": 0})
+        return server, cfg
+
+    def run_workflow(self, cfg, services, capture=lambda: "I has finished."):
+        frames = []
+        trace = MetricsRegistry().trace()
+        workflow = Workflow(cfg, Task(1, "grammar", time.monotonic()), services, trace,
+                            on_stream=lambda frozen, tail: frames.append((frozen, tail)), capture=capture)
+        workflow.run()
+        return workflow, trace, frames
+
+    def test_streams_renders_and_copies_fixed_sentence(self):
+        server, cfg = self.start_server(tokens=ANSWER)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+        workflow, trace, frames = self.run_workflow(cfg, services)
+
+        self.assertEqual(trace.outcome, "ok")
+        self.assertEqual(workflow.text, "".join(ANSWER))
+        self.assertEqual(workflow.chunks_received, len(ANSWER))
+        self.assertEqual(len(frames), len(ANSWER))  # stream_fps = 0: 每个 chunk 一帧
+        self.assertIn("<h2>", "".join(frozen for frozen, _ in frames))
+        self.assertEqual(self.clipboard.get_text(), "I have finished.")
+        self.assertEqual([stage for stage, _ in trace.stages()], ["queue", "capture", "setup", "ttft", "stream"])
+        self.assertIn("I has finished.", server.requests[-1][1]["messages"][-1]["content"])
+
+    def test_cache_hit_skips_network(self):
+        server, cfg = self.start_server(tokens=ANSWER)
+        cache = ResponseCache(os.path.join(self.tmp.name, "cache.db"))
+        self.addCleanup(cache.close)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests(), response_cache=cache)
+
+        self.run_workflow(cfg, services)
+        workflow, trace, frames = self.run_workflow(cfg, services)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(trace.stages()[-1][0], "cache")
+
+    def test_reconnects_idle_connection_while_capturing(self):
+        # 连接空闲后被服务端关掉：开启 overlap_setup 时握手和取词同时进行，首 token 不再等握手
+        server, cfg = self.start_server(tokens=ANSWER, connect_delay=0.2, keepalive_timeout=0.2)
+        pool = ClientPool(rewarm_after=0.1)
+        self.addCleanup(pool.close)
+        services = WorkflowServices(self.clipboard, pool, InflightRequests())
+        pool.warm_up(server.base_url, "sk-test")
+
+        def slow_capture():
+            time.sleep(0.3)
+            return "I has finished."
+
+        ttft = {}
+        for overlap in (False, True):
+            cfg.config["overlap_setup"] = overlap
+            time.sleep(0.3)
+            _, trace, _ = self.run_workflow(cfg, services, capture=slow_capture)
+            stages = dict(trace.stages())
+            ttft[overlap] = stages["setup"] + stages["ttft"]
+            spans = [stage for stage, _, _ in trace.spans]
+            self.assertEqual("connect" in spans, overlap)
+        self.assertGreater(ttft[False], 0.2)
+        self.assertLess(ttft[True], 0.15)
+
+    def test_backup_winner_is_recorded_as_the_answering_model(self):
+        # 主服务迟迟没有首 token，备用服务抢先回答：模型和缓存键都记备用服务的
+        _, cfg = self.start_server(tokens=["slow"], first_token_delay=3.0)
+        backup = FakeOpenAIServer(tokens=ANSWER).start()
+        self.addCleanup(backup.stop)
+        cfg.config.update({"hedge_enabled": True, "hedge_delay_ms": 100, "cache_enabled": True,
+                           "providers": [{"base_url": backup.base_url, "model": "backup-model"}]})
+        cache = ResponseCache(os.path.join(self.tmp.name, "cache.db"))
+        self.addCleanup(cache.close)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests(), response_cache=cache)
+
+        workflow, trace, _ = self.run_workflow(cfg, services)
+        self.assertEqual(trace.outcome, "ok")
+        self.assertEqual(workflow.model, "backup-model")
+        prompt = cfg.get("prompt_grammar")
+        self.assertEqual(cache.get(cache_key("backup-model", backup.base_url, prompt, "I has finished.")),
+                         "".join(ANSWER))
+        self.assertIsNone(cache.get(cache_key("fake-model", cfg.get("base_url"), prompt, "I has finished.")))
+
+        # 再次选中同一句话时能查到备用服务的回答
+        _, trace, _ = self.run_workflow(cfg, services)
+        self.assertEqual(trace.stages()[-1][0], "cache")
+        self.assertEqual(len(backup.requests), 1)
+
+    def test_nothing_selected_reports_error(self):
+        _, cfg = self.start_server()
+        errors = []
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+        trace = MetricsRegistry().trace()
+        Workflow(cfg, Task(1, "translate", time.monotonic()), services, trace, on_error=errors.append,
+                 capture=lambda: None).run()
+        self.assertEqual(trace.outcome, "no_text")
+        self.assertEqual(len(errors), 1)
+
+    def test_replays_recording_with_chunking(self):
+        path = os.path.join(self.tmp.name, "rec.jsonl")
+        save_recording(path, [(0.05, "A"), (0.1, "B"), (0.2, "C")])
+        server, cfg = self.start_server(tokens=load_recording(path), chunk_size=2)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+
+        start = time.monotonic()
+        workflow, _, _ = self.run_workflow(cfg, services)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual(workflow.text, "ABC")
+        self.assertEqual(workflow.chunks_received, 2)
+
+    def test_stalled_stream_still_shows_held_back_tokens(self):
+        # B 和 A 同一帧到达被压住，之后上游卡了 0.6 秒：B 应在下一帧时间显示，而不是等到 C
+        path = os.path.join(self.tmp.name, "stall.jsonl")
+        save_recording(path, [(0.0, "A"), (0.01, "B"), (0.6, "C")])
+        _, cfg = self.start_server(tokens=load_recording(path))
+        cfg.config["stream_fps"] = 10
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+        shown = []
+        start = time.monotonic()
+        workflow = Workflow(cfg, Task(1, "translate", start), services, MetricsRegistry().trace(),
+                            on_delta=lambda delta: shown.append((time.monotonic() - start, delta)),
+                            capture=lambda: "hello")
+        workflow.run()
+
+        self.assertEqual("".join(delta for _, delta in shown), "ABC")
+        seen_b = next(at for at, delta in shown if "B" in delta)
+        seen_c = next(at for at, delta in shown if "C" in delta)
+        self.assertLess(seen_b, seen_c - 0.3)
+
+    def test_copy_waiting_for_capture_lock_does_not_stall_the_stream(self):
+        # <fixed> 一闭合就复制，但别的任务正在取词 (占着取词锁)：后面的 token 照常显示
+        _, cfg = self.start_server(tokens=["<fixed>I have finished.</fixed>", "\n\n说明", "。"], token_interval=0.1)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+        release = threading.Event()
+
+        def other_capture():
+            with services.capture_lock:
+                release.wait(2.0)
+
+        def capture():
+            threading.Thread(target=other_capture, daemon=True).start()
+            return "I has finished."
+
+        shown = []
+        workflow = Workflow(cfg, Task(1, "grammar", time.monotonic()), services, MetricsRegistry().trace(),
+                            on_delta=lambda delta: (shown.append(delta), "。" in delta and release.set()),
+                            capture=capture)
+        started = time.monotonic()
+        workflow.run()
+
+        self.assertTrue(release.is_set())  # 最后一个 token 在复制完成之前就显示了
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(self.clipboard.get_text(), "I have finished.")
+
+    def test_press_during_stalled_superseded_tasks_starts_immediately(self):
+        # 服务端迟迟不给首 token：连按三次热键，前两个任务被取代时正阻塞在网络读取上
+        _, cfg = self.start_server(tokens=ANSWER, first_token_delay=3.0)
+        services = WorkflowServices(self.clipboard, self.pool, InflightRequests())
+        threads, started = {}, {}
+
+        def start(task):
+            started[task.id] = time.monotonic()
+            workflow = Workflow(cfg, task, services, MetricsRegistry().trace(),
+                                capture=lambda: f"I has finished ({task.id}).")
+            threads[task.id] = threading.Thread(target=lambda: (workflow.run(), scheduler.finish(task)))
+            threads[task.id].start()
+
+        scheduler = TaskScheduler(start, policy="latest", max_running=2)
+        first = scheduler.submit("grammar")
+        second = scheduler.submit("grammar")
+        time.sleep(0.3)  # 两个请求都已发出并在等首 token
+        pressed = time.monotonic()
+        third = scheduler.submit("grammar")
+        self.assertLess(started[third.id] - pressed, 0.05)
+
+        # 被取代的任务不等首 token 或超时，读取被打断后很快退出
+        for task in (first, second):
+            threads[task.id].join(1.0)
+            self.assertFalse(threads[task.id].is_alive())
+        third.cancel()
+        threads[third.id].join(1.0)
+        self.assertFalse(threads[third.id].is_alive())
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+
+# 只依赖 QtCore / QtGui，不引入 QtWidgets
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+from PyQt6.QtGui import QGuiApplication
+
+from core.clipboard import EventClipboardBackend
+
+
+class _ClipboardBridge(QObject):
+    """生活在 GUI 线程，负责监听 dataChanged 和代替后台线程写剪贴板"""
+    set_requested = pyqtSignal(str, object)
+
+    def __init__(self, clipboard, backend):
+        super().__init__()
+        self.clipboard = clipboard
+        self.backend = backend
+        clipboard.dataChanged.connect(self.on_data_changed)
+        self.set_requested.connect(self.apply_text)
+
+    def on_data_changed(self):
+        self.backend._publish(self.clipboard.text())
+
+    def apply_text(self, text, done):
+        self.clipboard.setText(text)
+        if done is not None:
+            done.set()
+
+
+class QtClipboardBackend(EventClipboardBackend):
+    """
+    常驻进程内的剪贴板后端：由 QClipboard.dataChanged 通知变化，
+    后台线程只等待条件变量，不轮询、不启动子进程。
+    必须在 GUI 线程中创建。
+    """
+
+    def __init__(self, clipboard=None, set_timeout=1.0):
+        clipboard = clipboard or QGuiApplication.clipboard()
+        super().__init__(clipboard.text())
+        self.set_timeout = set_timeout
+        self._bridge = _ClipboardBridge(clipboard, self)
+
+    def set_text(self, text):
+        if QThread.currentThread() == self._bridge.thread():
+            self._bridge.apply_text(text, None)
+            return
+        # 后台线程：交给 GUI 线程写入并等待完成
+        done = threading.Event()
+        self._bridge.set_requested.emit(text, done)
+        done.wait(self.set_timeout)
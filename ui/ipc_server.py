@@ -0,0 +1,174 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtNetwork import QLocalServer
+
+from core.ipc_protocol import LEGACY_SHOW, TASKS, FrameDecoder, ProtocolError, encode_frame
+from core.scheduler import Task
+
+# 客户端不读数据时，待发送的数据超过这个量就断开它，避免撑爆内存
+MAX_PENDING_BYTES = 8 * 1024 * 1024
+
+
+class _Connection:
+    def __init__(self, connection_id, socket):
+        self.id = connection_id
+        self.socket = socket
+        self.decoder = FrameDecoder()
+        self.tasks = {}  # 请求 id -> core.scheduler.Task
+        self.first_read = True
+        self.closed = False
+
+
+class IpcServer(QObject):
+    """
+    单实例 socket 上的多客户端命令服务 (帧格式见 core.ipc_protocol)
+    socket 读写都在 GUI 线程里由信号驱动，不会阻塞；analyze 在线程池里执行，
+    结果帧通过排队信号送回 GUI 线程再写出。
+    :param analyze: analyze(task, text, on_delta)，在工作线程中阻塞执行，出错时抛异常
+    :param stats: 无参函数，返回 stats 命令附带的统计
+    """
+    show_requested = pyqtSignal()
+    _outgoing = pyqtSignal(int, bytes)  # (连接 id, 帧)
+    _finished = pyqtSignal(int, object, bool)  # (连接 id, 请求 id, 是否成功)
+
+    def __init__(self, name, analyze, stats=None, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.analyze = analyze
+        self.stats_provider = stats
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.handle_new_connection)
+        self._outgoing.connect(self.write_frame)
+        self._finished.connect(self.forget)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ipc")
+        self._connections = {}
+        self._connection_ids = itertools.count(1)
+        self._task_ids = itertools.count(1)
+        self.completed = 0
+        self.failed = 0
+
+    def listen(self):
+        QLocalServer.removeServer(self.name)
+        return self.server.listen(self.name)
+
+    def close(self):
+        self.server.close()
+        for connection in list(self._connections.values()):
+            self.drop(connection)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def client_count(self):
+        return len(self._connections)
+
+    @property
+    def active_count(self):
+        return sum(len(c.tasks) for c in self._connections.values())
+
+    def handle_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            connection = _Connection(next(self._connection_ids), socket)
+            self._connections[connection.id] = connection
+            socket.readyRead.connect(lambda c=connection: self.read_frames(c))
+            socket.disconnected.connect(lambda c=connection: self.drop(c))
+
+    def drop(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        self._connections.pop(connection.id, None)
+        # 客户端走了，它的请求不用再算
+        for task in connection.tasks.values():
+            task.cancel()
+        connection.socket.abort()
+        connection.socket.deleteLater()
+
+    def read_frames(self, connection):
+        data = connection.socket.readAll().data()
+        if connection.first_read:
+            connection.first_read = False
+            if data == LEGACY_SHOW:
+                # 兼容旧版本的第二个实例
+                self.show_requested.emit()
+                return
+        try:
+            messages = connection.decoder.feed(data)
+        except ProtocolError:
+            self.drop(connection)
+            return
+        for message in messages:
+            self.dispatch(connection, message)
+
+    def send(self, connection, message):
+        self.write_frame(connection.id, encode_frame(message))
+
+    def write_frame(self, connection_id, frame):
+        connection = self._connections.get(connection_id)
+        if connection is None:
+            return
+        if connection.socket.bytesToWrite() > MAX_PENDING_BYTES:
+            self.drop(connection)
+            return
+        connection.socket.write(frame)
+
+    def dispatch(self, connection, message):
+        request_id = message.get("id")
+        cmd = message.get("cmd")
+        if cmd == "analyze":
+            text = message.get("text")
+            task_type = message.get("task", "grammar")
+            if not isinstance(text, str) or not text.strip() or task_type not in TASKS:
+                self.send(connection, {"id": request_id, "event": "error", "message": "invalid analyze request"})
+                return
+            task = Task(next(self._task_ids), task_type, time.monotonic())
+            connection.tasks[request_id] = task
+            self._pool.submit(self.run_analyze, connection.id, request_id, task, text)
+        elif cmd == "cancel":
+            task = connection.tasks.get(message.get("target"))
+            if task is not None:
+                task.cancel()
+            self.send(connection, {"id": request_id, "event": "ok"})
+        elif cmd == "stats":
+            stats = {"clients": self.client_count, "active": self.active_count,
+                     "completed": self.completed, "failed": self.failed}
+            if self.stats_provider is not None:
+                stats.update(self.stats_provider())
+            self.send(connection, {"id": request_id, "event": "stats", "stats": stats})
+        elif cmd == "show":
+            self.show_requested.emit()
+            self.send(connection, {"id": request_id, "event": "ok"})
+        else:
+            self.send(connection, {"id": request_id, "event": "error", "message": f"unknown command: {cmd}"})
+
+    def run_analyze(self, connection_id, request_id, task, text):
+        # 工作线程：只编码帧，写 socket 交给 GUI 线程
+        chars = 0
+
+        def on_delta(delta):
+            nonlocal chars
+            chars += len(delta)
+            self._outgoing.emit(connection_id, encode_frame({"id": request_id, "event": "delta", "text": delta}))
+
+        try:
+            if not task.cancelled:
+                self.analyze(task, text, on_delta)
+            reply = {"id": request_id, "event": "done", "chars": chars}
+            if task.cancelled:
+                reply["cancelled"] = True
+        except Exception as e:
+            reply = {"id": request_id, "event": "error", "message": str(e)}
+        self._outgoing.emit(connection_id, encode_frame(reply))
+        self._finished.emit(connection_id, request_id, reply["event"] == "done")
+
+    def forget(self, connection_id, request_id, ok):
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        connection = self._connections.get(connection_id)
+        if connection is not None:
+            connection.tasks.pop(request_id, None)
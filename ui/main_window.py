@@ -1,13 +1,21 @@
+import html
 import sys
 import os
 import subprocess
+import time
 import winreg
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QGroupBox,
-                             QFormLayout, QTextEdit, QSystemTrayIcon, QMenu,
-                             QApplication, QCheckBox, QMessageBox, QTabWidget, QPlainTextEdit)
-from PyQt6.QtCore import Qt, pyqtSignal, QUrl
-from PyQt6.QtGui import QIcon, QAction, QKeyEvent, QKeySequence, QDesktopServices
+                             QFormLayout, QSystemTrayIcon,
+                             QApplication, QCheckBox, QMessageBox, QTabWidget, QPlainTextEdit,
+                             QFileDialog, QListWidget, QListWidgetItem, QSplitter, QTextBrowser)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QAction, QKeyEvent, QKeySequence
+
+from core.fixed_tags import strip_tags
+
+HISTORY_PAGE_SIZE = 50
+LOG_CONSOLE_LINES = 1000
 
 
 def resource_path(relative_path):
@@ -49,9 +57,18 @@ class HotKeyLineEdit(QLineEdit):
 class MainWindow(QMainWindow):
     config_updated = pyqtSignal(dict)
 
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, metrics=None, tray_icon=None, history=None, log_buffer=None,
+                 rate_limits=None):
         super().__init__()
         self.cfg = config_manager
+        self.metrics = metrics  # core.metrics.MetricsRegistry，为 None 时统计页不可用
+        self.history = history  # core.history.HistoryStore，为 None 时历史页不可用
+        self.log_buffer = log_buffer  # core.logbuffer.LogBuffer，为 None 时日志直接写控制台
+        self.rate_limits = rate_limits  # core.rate_limit.RateLimits，统计页附带各服务的限流状态
+        self.log_seq = 0  # 控制台已显示到的日志序号
+        self.history_last_id = None  # 已加载的最后一条 (最旧) 记录，滚动到底时从它之后继续加载
+        self.history_exhausted = False
+        self.tray_icon = tray_icon  # 托盘由应用常驻持有，设置窗口按需创建
         self.setWindowTitle("SyntaxLens v0.2.0 - 设置")
         self.resize(550, 600)  # 稍微加大一点
 
@@ -62,7 +79,6 @@ class MainWindow(QMainWindow):
 
         self.init_ui()
         self.load_config_to_ui()
-        self.init_tray()
         self.check_autostart_status()
 
     def init_ui(self):
@@ -143,6 +159,66 @@ class MainWindow(QMainWindow):
 
         self.tabs.addTab(tab_prompts, "AI 指令定制")
 
+        # --- Tab 3: 性能统计 ---
+        tab_stats = QWidget()
+        layout_stats = QVBoxLayout(tab_stats)
+        layout_stats.addWidget(QLabel("每个阶段的耗时 (毫秒)：排队 → 取词 → 准备请求 → 首 token → 流式输出 → 渲染"))
+        self.stats_view = QPlainTextEdit()
+        self.stats_view.setReadOnly(True)
+        self.stats_view.setStyleSheet("font-family: Consolas; font-size: 12px;")
+        layout_stats.addWidget(self.stats_view)
+
+        stats_btn_layout = QHBoxLayout()
+        btn_refresh_stats = QPushButton("🔄 刷新")
+        btn_refresh_stats.clicked.connect(self.refresh_stats)
+        btn_export_stats = QPushButton("📤 导出 (JSON / Prometheus)")
+        btn_export_stats.clicked.connect(self.export_stats)
+        stats_btn_layout.addWidget(btn_refresh_stats)
+        stats_btn_layout.addWidget(btn_export_stats)
+        layout_stats.addLayout(stats_btn_layout)
+
+        self.tab_stats = tab_stats
+        self.tabs.addTab(tab_stats, "性能统计")
+
+        # --- Tab 4: 历史记录 ---
+        tab_history = QWidget()
+        layout_history = QVBoxLayout(tab_history)
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("🔍 搜索原文或回答...")
+        layout_history.addWidget(self.history_search)
+
+        # 输入停顿后再搜索，避免每个按键都查一次库
+        self.history_search_timer = QTimer(self)
+        self.history_search_timer.setSingleShot(True)
+        self.history_search_timer.setInterval(150)
+        self.history_search_timer.timeout.connect(self.reload_history)
+        self.history_search.textChanged.connect(lambda text: self.history_search_timer.start())
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        self.history_list = QListWidget()
+        self.history_list.currentItemChanged.connect(self.show_history_entry)
+        self.history_list.verticalScrollBar().valueChanged.connect(self.on_history_scrolled)
+        self.history_detail = QTextBrowser()
+        splitter.addWidget(self.history_list)
+        splitter.addWidget(self.history_detail)
+        layout_history.addWidget(splitter)
+
+        history_btn_layout = QHBoxLayout()
+        btn_copy_history = QPushButton("📋 复制回答")
+        btn_copy_history.clicked.connect(self.copy_history_answer)
+        btn_delete_history = QPushButton("🗑️ 删除")
+        btn_delete_history.clicked.connect(self.delete_history_entry)
+        btn_clear_history = QPushButton("🧹 清空")
+        btn_clear_history.clicked.connect(self.clear_history)
+        history_btn_layout.addWidget(btn_copy_history)
+        history_btn_layout.addWidget(btn_delete_history)
+        history_btn_layout.addWidget(btn_clear_history)
+        layout_history.addLayout(history_btn_layout)
+
+        self.tab_history = tab_history
+        self.tabs.addTab(tab_history, "历史记录")
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+
         # 底部按钮
         btn_layout = QHBoxLayout()
         self.btn_save = QPushButton("💾 保存并应用")
@@ -159,9 +235,10 @@ class MainWindow(QMainWindow):
         btn_layout.addWidget(self.btn_toggle_log)
         main_layout.addLayout(btn_layout)
 
-        # 日志
-        self.log_console = QTextEdit()
+        # 日志 (只保留最近 LOG_CONSOLE_LINES 行，新日志由应用的定时器批量送来)
+        self.log_console = QPlainTextEdit()
         self.log_console.setReadOnly(True)
+        self.log_console.setMaximumBlockCount(LOG_CONSOLE_LINES)
         self.log_console.setVisible(False)
         self.log_console.setStyleSheet(
             "background-color: #f8f8f8; color: #555; font-family: Consolas; font-size: 11px;")
@@ -176,27 +253,6 @@ class MainWindow(QMainWindow):
     def toggle_log_console(self):
         self.log_console.setVisible(self.btn_toggle_log.isChecked())
 
-    def init_tray(self):
-        self.tray_icon = QSystemTrayIcon(self)
-        if os.path.exists(self.icon_path):
-            self.tray_icon.setIcon(QIcon(self.icon_path))
-        else:
-            from PyQt6.QtWidgets import QStyle
-            self.tray_icon.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
-        tray_menu = QMenu()
-        tray_menu.addAction("设置", self.show_window)
-        tray_menu.addAction("项目主页",
-                            lambda: QDesktopServices.openUrl(QUrl("https://github.com/Xie-free/SyntaxLens")))
-        tray_menu.addSeparator()
-        tray_menu.addAction("退出", self.quit_app)
-        self.tray_icon.setContextMenu(tray_menu)
-        self.tray_icon.show()
-        self.tray_icon.activated.connect(self.on_tray_activated)
-
-    def on_tray_activated(self, reason):
-        if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
-            self.show_window()
-
     def show_window(self):
         self.show()
         self.raise_()
@@ -220,7 +276,9 @@ class MainWindow(QMainWindow):
         self.append_log("配置已加载")
 
     def save_config(self):
-        new_conf = {
+        # 保留界面上没有的高级配置项 (例如 stream_fps)
+        new_conf = dict(self.cfg.config)
+        new_conf.update({
             "api_key": self.input_api_key.text().strip(),
             "model": self.input_model.text().strip(),
             "base_url": self.input_url.text().strip(),
@@ -231,7 +289,7 @@ class MainWindow(QMainWindow):
             # 保存提示词
             "prompt_grammar": self.input_prompt_gram.toPlainText().strip(),
             "prompt_translate": self.input_prompt_trans.toPlainText().strip()
-        }
+        })
         self.cfg.save_config(new_conf)
         self.config_updated.emit(new_conf)
         self.apply_autostart_setting()
@@ -240,7 +298,138 @@ class MainWindow(QMainWindow):
         self.btn_save.setFocus()
 
     def append_log(self, text):
-        self.log_console.append(text)
+        if self.log_buffer is not None:
+            self.log_buffer.log(text)
+        else:
+            self.log_console.appendPlainText(text)
+
+    def flush_logs(self):
+        if self.log_buffer is None:
+            return
+        records = self.log_buffer.since(self.log_seq)
+        if not records:
+            return
+        self.log_seq = records[-1].seq
+        # 整批一次追加
+        self.log_console.appendPlainText("\n".join(record.format() for record in records[-LOG_CONSOLE_LINES:]))
+
+    def refresh_stats(self):
+        if self.metrics is None:
+            self.stats_view.setPlainText("统计不可用")
+            return
+        text = self.metrics.format_table()
+        limits = self.rate_limits.format_table() if self.rate_limits is not None else ""
+        if limits:
+            text += "\n\n" + limits
+        self.stats_view.setPlainText(text)
+
+    def on_metrics_updated(self):
+        # 统计页正在显示时才刷新
+        if self.isVisible() and self.tabs.currentWidget() is self.tab_stats:
+            self.refresh_stats()
+
+    def export_stats(self):
+        if self.metrics is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "导出统计", "syntaxlens_metrics.json",
+                                              "JSON (*.json);;Prometheus (*.prom)")
+        if not path:
+            return
+        try:
+            self.metrics.export(path)
+            self.append_log(f"✅ 统计已导出: {path}")
+        except Exception as e:
+            QMessageBox.warning(self, "导出失败", str(e))
+
+    def on_tab_changed(self, index):
+        widget = self.tabs.widget(index)
+        # 切到统计页时刷新表格，其他页不用重建
+        if widget is self.tab_stats:
+            self.refresh_stats()
+        # 第一次切到历史页时才查库
+        elif widget is self.tab_history and self.history_list.count() == 0:
+            self.reload_history()
+
+    def on_history_updated(self):
+        # 有新记录：历史页正在显示时重新加载
+        if self.isVisible() and self.tabs.currentWidget() is self.tab_history:
+            self.reload_history()
+
+    def reload_history(self):
+        self.history_list.clear()
+        self.history_detail.clear()
+        self.history_last_id = None
+        self.history_exhausted = False
+        if self.history is None:
+            self.history_detail.setPlainText("历史记录不可用")
+            return
+        self.load_more_history()
+
+    def load_more_history(self):
+        if self.history is None or self.history_exhausted:
+            return
+        rows = self.history.search(self.history_search.text(), limit=HISTORY_PAGE_SIZE,
+                                   before_id=self.history_last_id)
+        if len(rows) < HISTORY_PAGE_SIZE:
+            self.history_exhausted = True
+        for row in rows:
+            when = time.strftime("%m-%d %H:%M", time.localtime(row["created"]))
+            task = "语法" if row["task"] == "grammar" else "翻译"
+            preview = " ".join(row["preview"].split())
+            item = QListWidgetItem(f"{when}  [{task}]  {preview}")
+            item.setData(Qt.ItemDataRole.UserRole, row["id"])
+            self.history_list.addItem(item)
+            self.history_last_id = row["id"]
+
+    def on_history_scrolled(self, value):
+        # 接近底部时加载下一页
+        if value >= self.history_list.verticalScrollBar().maximum() - 3:
+            self.load_more_history()
+
+    def selected_history_entry(self):
+        item = self.history_list.currentItem()
+        if item is None or self.history is None:
+            return None
+        return self.history.get(item.data(Qt.ItemDataRole.UserRole))
+
+    def show_history_entry(self, current, previous=None):
+        entry = self.selected_history_entry() if current is not None else None
+        if entry is None:
+            self.history_detail.clear()
+            return
+        answer = strip_tags(entry["answer"])
+        try:
+            import markdown2
+            from core.markdown_stream import MARKDOWN_EXTRAS
+
+            answer_html = markdown2.markdown(answer, extras=MARKDOWN_EXTRAS)
+        except ImportError:
+            answer_html = "<pre>" + html.escape(answer) + "</pre>"
+        timings = "  ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in entry["timings"].items())
+        self.history_detail.setHtml(
+            f"<p style='color:#888'>{html.escape(entry['model'])}  {timings}</p>"
+            f"<blockquote>{html.escape(entry['source'])}</blockquote>{answer_html}")
+
+    def copy_history_answer(self):
+        entry = self.selected_history_entry()
+        if entry is not None:
+            QApplication.clipboard().setText(strip_tags(entry["answer"]))
+            self.append_log("✅ 已复制历史回答")
+
+    def delete_history_entry(self):
+        item = self.history_list.currentItem()
+        if item is None or self.history is None:
+            return
+        self.history.delete(item.data(Qt.ItemDataRole.UserRole))
+        self.history_list.takeItem(self.history_list.row(item))
+
+    def clear_history(self):
+        if self.history is None:
+            return
+        reply = QMessageBox.question(self, "清空历史", "确定删除全部历史记录吗？")
+        if reply == QMessageBox.StandardButton.Yes:
+            self.history.clear()
+            self.reload_history()
 
     def get_startup_shortcut_path(self):
         startup_dir = os.path.join(os.environ["APPDATA"], r"Microsoft\Windows\Start Menu\Programs\Startup")
@@ -298,7 +487,8 @@ shortcut.Save
         if self.chk_close_to_tray.isChecked():
             event.ignore()
             self.hide()
-            self.tray_icon.showMessage("SyntaxLens", "已最小化到托盘", QSystemTrayIcon.MessageIcon.Information, 1000)
+            if self.tray_icon is not None:
+                self.tray_icon.showMessage("SyntaxLens", "已最小化到托盘", QSystemTrayIcon.MessageIcon.Information, 1000)
         else:
             event.accept()
             QApplication.instance().quit()
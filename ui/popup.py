@@ -1,8 +1,45 @@
 from PyQt6.QtWidgets import (QWidget, QLabel, QVBoxLayout, QHBoxLayout,
                              QGraphicsDropShadowEffect, QFrame, QPushButton,
-                             QApplication, QScrollArea, QSizePolicy, QSizeGrip)
+                             QApplication, QScrollArea, QSizePolicy, QSizeGrip, QTextBrowser)
 from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QColor, QCursor
+from PyQt6.QtGui import (QColor, QCursor, QTextCursor, QTextDocumentFragment,
+                         QTextBlockFormat, QTextCharFormat)
+
+# 深色模式 Markdown 样式 (流式文档只设置一次)
+# 正文颜色 / 字体由 QTextBrowser#content_view 的样式表提供
+MARKDOWN_CSS = """
+    h1, h2, h3 { color: #569cd6; margin-top: 10px; }
+    strong { color: #dcdcaa; }
+    /* 代码块样式优化 */
+    code {
+        background-color: #2d2d2d;
+        padding: 2px 5px;
+        border-radius: 4px;
+        color: #ce9178;
+        font-family: Consolas, monospace;
+    }
+    pre {
+        background-color: #1e1e1e;
+        border: 1px solid #333;
+        padding: 10px;
+        border-radius: 5px;
+        white-space: pre-wrap; /* 关键：强制代码块自动换行，不许出现横向滚动条 */
+        word-wrap: break-word;
+    }
+    pre code {
+        background-color: transparent;
+        border: none;
+        color: #9cdcfe;
+        padding: 0;
+    }
+    blockquote {
+        border-left: 4px solid #569cd6;
+        margin: 10px 0;
+        padding-left: 10px;
+        color: #808080;
+        background-color: #252526;
+    }
+"""
 
 
 class PopupResult(QWidget):
@@ -59,6 +96,13 @@ class PopupResult(QWidget):
                 font-family: 'Segoe UI', 'Microsoft YaHei';
                 font-size: 14px;
             }
+            QTextBrowser#content_view {
+                background: transparent;
+                border: none;
+                color: #d4d4d4;
+                font-family: 'Segoe UI', 'Microsoft YaHei', sans-serif;
+                font-size: 14px;
+            }
             QScrollArea {
                 border: none;
                 background: transparent;
@@ -143,6 +187,19 @@ class PopupResult(QWidget):
         self.scroll_area.setWidget(scroll_content)
         container_layout.addWidget(self.scroll_area)
 
+        # 2.1 流式内容区域：持久化的文档，只在末尾追加，样式表只设置一次
+        self.stream_view = QTextBrowser()
+        self.stream_view.setObjectName("content_view")
+        self.stream_view.setOpenExternalLinks(True)
+        self.stream_view.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.stream_view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.stream_view.document().setDefaultStyleSheet(MARKDOWN_CSS)
+        self.stream_view.setVisible(False)
+        container_layout.addWidget(self.stream_view)
+        self._stream_cursor = QTextCursor(self.stream_view.document())
+        self._stream_mark = 0  # 已冻结内容的末尾位置，之后是可被替换的尾部
+        self._streaming = False
+
         # 3. 底部右下角拖拽手柄
         bottom_layout = QHBoxLayout()
         bottom_layout.addStretch()  # 把手柄挤到最右边
@@ -156,10 +213,19 @@ class PopupResult(QWidget):
 
     def close_popup(self):
         self.hide()
+        self.release_content()
         self.closed_signal.emit()
 
+    def release_content(self):
+        """隐藏后不再留着上一次的回答 (文档、文字和排版缓存)，常驻托盘时内存不随回答长度累积"""
+        self._streaming = False
+        self._stream_mark = 0
+        self.stream_view.clear()
+        self.label.clear()
+
     def show_loading(self, title="AI 思考中"):
         self.title.setText(f"🤖 {title}")
+        self._show_label()
         self.label.setText("""
             <div style='text-align:center; margin-top:20px;'>
                 <span style='font-size:16px; color:#569cd6; font-weight:bold;'>🚀 正在分析...</span><br>
@@ -175,12 +241,53 @@ class PopupResult(QWidget):
         self.show()
         # 注意：不要调用 self.raise_() 或 self.activateWindow() ，这会强制抢夺焦点
 
+    def _show_label(self):
+        self._streaming = False
+        self.stream_view.setVisible(False)
+        self.scroll_area.setVisible(True)
+
+    def begin_stream(self):
+        self._streaming = True
+        self.stream_view.clear()
+        self._stream_mark = 0
+        self.scroll_area.setVisible(False)
+        self.stream_view.setVisible(True)
+        self.stream_view.verticalScrollBar().setValue(0)
+
+    def append_stream(self, frozen_html, tail_html):
+        """追加新冻结的 HTML，并替换末尾未完成的块；耗时只与增量大小有关"""
+        if not self._streaming:
+            self.begin_stream()
+
+        cursor = self._stream_cursor
+        cursor.setPosition(self._stream_mark)
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+
+        if frozen_html:
+            self._insert_html_block(frozen_html)
+            self._stream_mark = cursor.position()
+        if tail_html:
+            self._insert_html_block(tail_html)
+
+        self._fit_height(self.stream_view.document().size().height())
+
+    def _insert_html_block(self, html):
+        # insertHtml 会把片段并入当前段落，先另起一个空段落再插入
+        cursor = self._stream_cursor
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        if not self.stream_view.document().isEmpty():
+            cursor.insertBlock(QTextBlockFormat(), QTextCharFormat())
+        cursor.insertFragment(QTextDocumentFragment.fromHtml(html.strip(), self.stream_view.document()))
+
     def update_stream_content(self, html_content, is_finished=False):
-        self.label.setText(html_content)
+        """整篇替换 (非流式场景)"""
+        self.begin_stream()
+        self.append_stream(html_content, "")
 
+    def _fit_height(self, doc_height):
         # 自动长高
-        doc_height = self.label.sizeHint().height()
-        target_height = min(max(doc_height + 80, 180), 600)
+        target_height = min(max(int(doc_height) + 80, 180), 600)
 
         # 只调整高度，不改变当前宽度（因为用户可能手动拉宽了）
         current_width = self.width()
@@ -189,6 +296,7 @@ class PopupResult(QWidget):
             self.resize(current_width, target_height)
 
     def show_message(self, text):
+        self._show_label()
         self.label.setText(f"<div style='color:#ce9178'>{text}</div>")
         self.resize(320, 120)
         self.move_to_mouse()
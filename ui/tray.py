@@ -0,0 +1,34 @@
+import os
+
+from PyQt6.QtCore import QUrl
+from PyQt6.QtGui import QIcon, QDesktopServices
+from PyQt6.QtWidgets import QSystemTrayIcon, QMenu, QApplication, QStyle
+
+
+class TrayIcon(QSystemTrayIcon):
+    """
+    托盘图标 (常驻)，不依赖设置窗口
+    设置窗口只有在第一次打开时才创建
+    """
+
+    def __init__(self, icon_path, on_show, on_quit, on_profile=None, parent=None):
+        super().__init__(parent)
+        if os.path.exists(icon_path):
+            self.setIcon(QIcon(icon_path))
+        else:
+            self.setIcon(QApplication.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
+
+        # 菜单要一直持有引用，否则会被回收
+        self.menu = QMenu()
+        self.menu.addAction("设置", on_show)
+        if on_profile is not None:
+            self.menu.addAction("性能诊断 (记录接下来几次任务)", on_profile)
+        self.menu.addAction("项目主页",
+                            lambda: QDesktopServices.openUrl(QUrl("https://github.com/Xie-free/SyntaxLens")))
+        self.menu.addSeparator()
+        self.menu.addAction("退出", on_quit)
+        self.setContextMenu(self.menu)
+
+        self.activated.connect(lambda reason: on_show()
+                               if reason == QSystemTrayIcon.ActivationReason.DoubleClick else None)
+        self.show()